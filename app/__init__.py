@@ -1,7 +1,14 @@
+import os
 from flask import Flask, redirect, url_for
-from flask_migrate import Migrate
 from .models import db
 from .db_manager import DatabaseManager
+from .async_db import AsyncDatabaseManager
+from .profiler import RequestProfiler
+from .admission import AdmissionControl
+from .counters import init_window_counters
+from .jobs import init_jobs
+from .memo import init_memo
+from . import sketches  # keeps distinct-count sketches updated on event inserts
 
 def create_app(config_obj):
     app = Flask(__name__)
@@ -9,11 +16,67 @@ def create_app(config_obj):
 
     db.init_app(app)
     
-    # enables db migrations/metadata updates
-    Migrate(app, db)
+    # enables db migrations/metadata updates (`flask db ...`). Alembic is a large import that
+    # web workers never use, so it's only loaded under the flask command.
+    if os.environ.get("FLASK_RUN_FROM_CLI") == "true":
+        from flask_migrate import Migrate
+        Migrate(app, db)
 
     # Set up custom database manager for read/write session and engine handling
     app.db_manager = DatabaseManager(config_obj)
+    # Async engines for the concurrent read paths (created on first use)
+    app.async_db_manager = AsyncDatabaseManager(config_obj)
+
+    # Host-wide sliding-window event counters, rebuilt from the database at startup
+    if app.config.get("WINDOW_COUNTERS_PATH"):
+        init_window_counters(app)
+
+    # Background job runner threads (started on the first submitted job)
+    init_jobs(app)
+
+    # Request-scoped memo of repeated reads, see app/memo.py
+    init_memo(app)
+
+    # Per-endpoint concurrency limits and load shedding, see app/admission.py
+    AdmissionControl(app)
+
+    # Opt-in request profiling (signed header or sampling), see app/profiler.py
+    profiler = RequestProfiler(app)
+
+    @app.cli.command("profile-token")
+    def profile_token():
+        """Print a signed token for the request profiling header."""
+        print(f"{profiler.header}: {profiler.make_token()}")
+
+    @app.cli.command("rescore")
+    def rescore():
+        """Recompute stored customer health scores and segment aggregates."""
+        from app.scoring import rescore
+        print(f"Rescored {rescore(app.db_manager)} customers.")
+
+    @app.cli.command("run-jobs")
+    def run_jobs():
+        """Run queued background jobs until interrupted."""
+        from app.jobs import JobRunner
+        print("Running jobs, Ctrl+C to stop.")
+        JobRunner(app).run_forever()
+
+    @app.cli.command("rebuild-sketches")
+    def rebuild_sketches():
+        """Recreate the distinct-count sketches of every shard from the event tables."""
+        for shard in app.db_manager.shards:
+            with shard.write_engine.begin() as connection:
+                sketches.rebuild(connection)
+        print("Sketches rebuilt.")
+
+    @app.cli.command("rollup-sketches")
+    def rollup_sketches():
+        """Merge the sketches of days older than sketches.DAILY_DAYS into monthly rows (run daily)."""
+        months = 0
+        for shard in app.db_manager.shards:
+            with shard.write_engine.begin() as connection:
+                months += sketches.rollup(connection)
+        print(f"Rolled up {months} months.")
 
     @app.route('/')
     def root():
@@ -21,8 +84,18 @@ def create_app(config_obj):
 
     from app.routes.customer import customer_bp
     from app.routes.dashboard import dashboard_bp
+    from app.routes.admin import admin_bp
+    from app.routes.export import export_bp
+    from app.routes.segments import segments_bp
+    from app.routes.scoring_api import scoring_bp
+    from app.routes.jobs import jobs_bp
 
     app.register_blueprint(customer_bp)
     app.register_blueprint(dashboard_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(segments_bp)
+    app.register_blueprint(scoring_bp)
+    app.register_blueprint(jobs_bp)
 
     return app
@@ -0,0 +1,144 @@
+import fcntl
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import g, jsonify, request
+
+# Admission control for expensive endpoints: at most `concurrency` requests of an endpoint run at
+# once on a host (all workers) and at most `queue` more wait for a slot, for ADMISSION_QUEUE_TIMEOUT
+# seconds. Other requests are shed at once with a 503 and Retry-After, or get the last successful
+# response of the same URL seen by this worker when it is at most ADMISSION_STALE_TTL seconds old.
+# Slots are shared by the host, but the stale responses (and the stats) are per worker: a shed
+# request only gets a stale response when the worker it landed on served that URL before.
+#
+# Slots are byte-range locks (lockf) on one file per endpoint: run slots are bytes [0, concurrency),
+# queue slots the next `queue` bytes. The kernel drops the locks of a worker that dies. Record locks
+# don't exclude threads of the same process from each other, so each process also tracks its own.
+
+
+class EndpointGate:
+    def __init__(self, path, concurrency, queue):
+        self.path = path
+        self.concurrency = concurrency
+        self.queue = queue
+        self._lock = threading.Lock()
+        self._fd, self._pid = None, None
+
+    def _try(self, first, count):
+        # Locks the first free byte of [first, first + count), returns it or None
+        with self._lock:
+            if self._pid != os.getpid():
+                # Record locks aren't inherited: a forked worker starts with none held
+                self._fd, self._pid, self._held = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), os.getpid(), set()
+            for slot in range(first, first + count):
+                if slot in self._held:
+                    continue
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                except OSError:
+                    continue
+                self._held.add(slot)
+                return slot
+        return None
+
+    def release(self, slot):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, slot)
+            self._held.discard(slot)
+
+    def acquire(self, timeout, poll_interval=0.01):
+        # A run slot, None when the queue is full or no slot freed up within `timeout` seconds
+        slot = self._try(0, self.concurrency)
+        if slot is not None or not self.queue:
+            return slot
+        waiting = self._try(self.concurrency, self.queue)
+        if waiting is None:
+            return None
+        try:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                time.sleep(poll_interval)
+                slot = self._try(0, self.concurrency)
+                if slot is not None:
+                    return slot
+            return None
+        finally:
+            self.release(waiting)
+
+
+class AdmissionControl:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.limits = app.config.get("ADMISSION_LIMITS", {})
+        self.queue_timeout = app.config.get("ADMISSION_QUEUE_TIMEOUT", 5.0)
+        self.retry_after = app.config.get("ADMISSION_RETRY_AFTER", 5)
+        self.stale_ttl = app.config.get("ADMISSION_STALE_TTL", 300)
+        self.stale_entries = app.config.get("ADMISSION_STALE_ENTRIES", 100)
+        directory = app.config.get("ADMISSION_LOCK_DIR")
+        os.makedirs(directory, exist_ok=True)
+        self.gates = {
+            endpoint: EndpointGate(os.path.join(directory, f"{endpoint}.lock"), concurrency, queue)
+            for endpoint, (concurrency, queue) in self.limits.items()
+        }
+        self.stats = {endpoint: {"admitted": 0, "shed": 0, "stale": 0} for endpoint in self.gates}
+        self._responses = OrderedDict()  # URL -> (stored at, body, status, headers), LRU
+        self._lock = threading.Lock()
+
+        app.before_request(self._admit)
+        app.after_request(self._remember)
+        app.teardown_request(self._release)
+        app.extensions["admission"] = self
+
+    def _admit(self):
+        gate = self.gates.get(request.endpoint)
+        if gate is None:
+            return None
+        slot = gate.acquire(self.queue_timeout)
+        if slot is not None:
+            g.admission_slot = (gate, slot)
+            self._count("admitted")
+            return None
+
+        stale = self._stale_response()
+        if stale is not None:
+            self._count("stale")
+            return stale
+        self._count("shed")
+        response = jsonify({"message": "Too many concurrent requests for this endpoint, retry later"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(self.retry_after)
+        return response
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[request.endpoint][outcome] += 1
+
+    def _stale_response(self):
+        with self._lock:
+            stored = self._responses.get(request.full_path)
+        if stored is None or time.time() - stored[0] > self.stale_ttl:
+            return None
+        stored_at, body, status, headers = stored
+        return body, status, {**headers, "Age": str(int(time.time() - stored_at)), "X-Admission": "stale"}
+
+    def _remember(self, response):
+        # Last successful, non-streamed response of every URL of a limited endpoint
+        if request.endpoint in self.gates and response.status_code == 200 and not response.is_streamed \
+                and "X-Admission" not in response.headers:
+            entry = (time.time(), response.get_data(), response.status_code, {"Content-Type": response.content_type})
+            with self._lock:
+                self._responses[request.full_path] = entry
+                self._responses.move_to_end(request.full_path)
+                while len(self._responses) > self.stale_entries:
+                    self._responses.popitem(last=False)
+        return response
+
+    def _release(self, exc):
+        admitted = g.pop("admission_slot", None)
+        if admitted is not None:
+            gate, slot = admitted
+            gate.release(slot)
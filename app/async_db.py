@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from itertools import cycle
+from app.config import Config
+from app.db_manager import register_after_fork, shard_layout, sqlite_shard_path
+
+
+class AsyncDatabaseManager:
+    # Async counterpart of DatabaseManager for read fan-out: every coroutine passed to
+    # gather_reads() gets its own AsyncSession (its own pooled connection), and sessions
+    # rotate over the replicas, so independent queries run concurrently.
+    # Engines are bound to one event loop, so they live on a private background loop
+    # (started on first use, i.e. after gunicorn forks) and are shared by all requests.
+    def __init__(self, config: Config):
+        self.config = config
+        self.max_fanout = getattr(config, "ASYNC_MAX_FANOUT", 8)
+        self._loop = None
+        self._lock = threading.Lock()
+        self._read_sessionmakers = None
+        register_after_fork(self)
+
+    def after_fork(self):
+        # The background loop thread doesn't survive a fork: start a new one (and engines) on first use
+        self._loop = None
+        self._lock = threading.Lock()
+        self._read_sessionmakers = None
+
+    def _create_engines(self):
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        # Same shards as DatabaseManager, reading from each shard's replicas (or its primary)
+        if getattr(self.config, "SQLITE_PATH", ""):
+            shards = [[f'sqlite+aiosqlite:///{self.config.SQLITE_PATH}']]
+        elif getattr(self.config, "TESTING", False):
+            shards = [[f'sqlite+aiosqlite:///{sqlite_shard_path(self.config.TEST_DB, index)}']
+                      for index in range(getattr(self.config, "SHARD_COUNT", 1))]
+        else:
+            shards = [
+                [f"postgresql+asyncpg://{self.config.POSTGRES_USER}:{self.config.POSTGRES_PASSWORD}"
+                 f"@{host}:{self.config.POSTGRES_PORT}/{self.config.POSTGRES_DB_NAME}" for host in replicas or [primary]]
+                for primary, replicas in shard_layout(self.config)
+            ]
+        self._engines = []
+        self._read_sessionmakers = []
+        for urls in shards:
+            engines = [create_async_engine(url, pool_pre_ping=True) for url in urls]
+            self._engines.extend(engines)
+            self._read_sessionmakers.append(cycle([async_sessionmaker(e, expire_on_commit=False) for e in engines]))
+        self._fanout = asyncio.Semaphore(self.max_fanout)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name="async-db").start()
+                asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self._loop
+
+    async def _start(self):
+        self._create_engines()
+
+    @property
+    def shard_count(self):
+        if getattr(self.config, "SQLITE_PATH", ""):
+            return 1
+        if getattr(self.config, "TESTING", False):
+            return getattr(self.config, "SHARD_COUNT", 1)
+        return len(shard_layout(self.config))
+
+    def shard_for(self, customer_id):
+        return customer_id % self.shard_count
+
+    @asynccontextmanager
+    async def read_session(self, shard=0):
+        async with self._fanout:
+            async with next(self._read_sessionmakers[shard])() as session:
+                yield session
+
+    async def _read(self, fn, shard):
+        async with self.read_session(shard) as session:
+            return await fn(session)
+
+    async def _gather(self, fns, shard):
+        return await asyncio.gather(*(self._read(fn, shard) for fn in fns))
+
+    async def gather_reads(self, *fns, shard=0):
+        # Await from any event loop (e.g. an async Flask view): runs fn(session) for every
+        # fn concurrently on the background loop (against `shard`) and returns the results in order
+        future = asyncio.run_coroutine_threadsafe(self._gather(fns, shard), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    async def gather_shards(self, *fns):
+        # gather_reads(*fns) on every shard concurrently, one result list per shard
+        return await asyncio.gather(*(self.gather_reads(*fns, shard=shard) for shard in range(self.shard_count)))
+
+    def dispose(self):
+        if self._loop is not None:
+            async def close():
+                for engine in self._engines:
+                    await engine.dispose()
+            asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+
+
+# Query helpers for gather_reads(): each returns a coroutine function taking an AsyncSession
+
+def scalars_of(statement):
+    async def run(session):
+        return (await session.execute(statement)).scalars().all()
+    return run
+
+def rows_of(statement):
+    async def run(session):
+        return (await session.execute(statement)).all()
+    return run
+
+def scalar_of(statement):
+    async def run(session):
+        return (await session.execute(statement)).scalar()
+    return run
@@ -0,0 +1,172 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, has_app_context
+
+# Result cache shared by every worker process of a host: a SQLite file (WAL, ideally on tmpfs such
+# as /dev/shm) of pickled values with a TTL and tags. The total size of the values is kept under a
+# byte budget by evicting the least recently used entries. memoize() caches a function's results,
+# invalidate() drops every entry of a tag, e.g. the results about one customer after its events
+# changed. Off unless SHARED_CACHE_PATH is set: memoized functions then always run.
+
+MISSING = object()
+TOUCH_INTERVAL = 1.0  # seconds between access time updates of an entry (LRU order), fewer writes on hits
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,
+    expires_at REAL NOT NULL, accessed_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key));
+CREATE INDEX IF NOT EXISTS ix_tags_key ON tags (key);
+CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO usage VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_inserted AFTER INSERT ON entries
+    BEGIN UPDATE usage SET bytes = bytes + new.size; END;
+CREATE TRIGGER IF NOT EXISTS entries_updated AFTER UPDATE OF size ON entries
+    BEGIN UPDATE usage SET bytes = bytes + new.size - old.size; END;
+CREATE TRIGGER IF NOT EXISTS entries_deleted AFTER DELETE ON entries
+    BEGIN UPDATE usage SET bytes = bytes - old.size; DELETE FROM tags WHERE key = old.key; END;
+"""
+
+
+class SharedCache:
+    def __init__(self, path, max_bytes, default_ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connection(self):
+        # One connection per thread and process (connections don't survive a fork)
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.connection = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                                               check_same_thread=False)
+            local.connection.execute("PRAGMA journal_mode=WAL")
+            local.connection.execute("PRAGMA synchronous=OFF")
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, key):
+        # The value of `key`, MISSING when absent or expired
+        connection = self._connection()
+        row = connection.execute("SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or row[1] < now:
+            self.stats["misses"] += 1
+            return MISSING
+        if now - row[2] > TOUCH_INTERVAL:
+            connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        self.stats["hits"] += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None, tags=()):
+        value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        size = len(value) + len(key)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "value = excluded.value, size = excluded.size, expires_at = excluded.expires_at, "
+                "accessed_at = excluded.accessed_at",
+                (key, value, size, expires_at, now))
+            connection.executemany("INSERT OR IGNORE INTO tags VALUES (?, ?)", [(tag, key) for tag in tags])
+            self._evict(connection, now)
+        self.stats["sets"] += 1
+
+    def _evict(self, connection, now):
+        # Expired entries first, then the least recently used ones, until within budget
+        if self._used(connection) <= self.max_bytes:
+            return
+        connection.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        excess = self._used(connection) - self.max_bytes
+        evicted = []
+        for key, size in connection.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+
+    def _used(self, connection):
+        return connection.execute("SELECT bytes FROM usage").fetchone()[0]
+
+    @property
+    def used_bytes(self):
+        return self._used(self._connection())
+
+    def invalidate(self, *tags):
+        # Drops every entry tagged with one of `tags`
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                f"DELETE FROM entries WHERE key IN (SELECT key FROM tags WHERE tag IN ({', '.join('?' * len(tags))}))",
+                tags)
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM entries")
+
+
+def shared_cache(app=None):
+    # The app's shared cache (opened on first use), None when disabled or outside an app
+    if app is None:
+        if not has_app_context():
+            return None
+        app = current_app
+    path = app.config.get("SHARED_CACHE_PATH")
+    if not path:
+        return None
+    cache = app.extensions.get("shared_cache")
+    if cache is None:
+        cache = app.extensions.setdefault("shared_cache", SharedCache(
+            path, app.config.get("SHARED_CACHE_MAX_BYTES", 64 * 1024 * 1024), app.config.get("SHARED_CACHE_TTL", 60)))
+    return cache
+
+def invalidate(*tags):
+    cache = shared_cache()
+    if cache is not None:
+        cache.invalidate(*tags)
+
+def clear():
+    cache = shared_cache()
+    if cache is not None:
+        cache.clear()
+
+def memoize(ttl=None, key=None, tags=None):
+    # Caches the results of the decorated function in the shared cache (None results excepted).
+    # key(*args, **kwargs): what identifies a result (default: every argument, by repr);
+    # tags(*args, **kwargs): tags to invalidate it by.
+    def decorate(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = shared_cache()
+            if cache is None:
+                return fn(*args, **kwargs)
+            cache_key = f"{name}:{key(*args, **kwargs) if key else (args, sorted(kwargs.items()))!r}"
+            value = cache.get(cache_key)
+            if value is MISSING:
+                value = fn(*args, **kwargs)
+                if value is not None:
+                    cache.set(cache_key, value, ttl, tags(*args, **kwargs) if tags else ())
+            return value
+        return wrapper
+    return decorate
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,7 +16,27 @@ class Config:
     
     APP_PORT = os.getenv("APP_PORT", "8000")
     
-    SQLALCHEMY_DATABASE_URI = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_PRIMARY_HOST}:{POSTGRES_PORT}/{POSTGRES_DB_NAME}'
+    # Single-node mode without Postgres: every read and write goes to this SQLite file (WAL
+    # journal, one writer connection per worker and a pool of read-only connections)
+    SQLITE_PATH = os.getenv("SQLITE_PATH", "")
+    try:
+        SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))  # read connections per worker
+    except ValueError:
+        SQLITE_READ_POOL_SIZE = 8
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # FULL fsyncs every commit
+    SQLITE_WAL_AUTOCHECKPOINT = 1000  # pages written to the WAL between checkpoints (and fsyncs)
+    SQLITE_BUSY_TIMEOUT = 5000  # ms a writer waits for the write lock held by another worker
+    SQLITE_CACHE_KB = 64 * 1024  # page cache per connection
+    try:
+        SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))  # memory-map up to 256MB of the file
+    except ValueError:
+        SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+    if SQLITE_PATH:
+        SQLITE_PATH = os.path.abspath(SQLITE_PATH)
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{SQLITE_PATH}"
+    else:
+        SQLALCHEMY_DATABASE_URI = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_PRIMARY_HOST}:{POSTGRES_PORT}/{POSTGRES_DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     try:
@@ -23,6 +44,86 @@ class Config:
     except ValueError:
         READING_REPLICAS = 2
 
+    # Optional sharding of customer data by customer_id over several primaries, each with its
+    # own replicas: SHARDS="primary-db:read-replica-1,read-replica-2;primary-db-2:read-replica-2-1".
+    # Unset means a single shard: POSTGRES_PRIMARY_HOST with READING_REPLICAS replicas.
+    SHARDS = os.getenv("SHARDS", "")
+
+    # Distinct counts (feature adoption, endpoint diversity) merged from daily HyperLogLog
+    # sketches (app/sketches.py) instead of COUNT(DISTINCT) scans; approximate above ~100 values
+    HLL_SKETCHES = os.getenv("HLL_SKETCHES", "true").lower() == "true"
+
+    # Per-host shared-memory counters of logins/API calls per customer and day (app/counters.py),
+    # used by the login and API usage scores instead of the database. Off unless a path is set.
+    WINDOW_COUNTERS_PATH = os.getenv("WINDOW_COUNTERS_PATH", "")
+    try:
+        WINDOW_COUNTERS_CAPACITY = int(os.getenv("WINDOW_COUNTERS_CAPACITY", "100000"))  # customers per host
+    except ValueError:
+        WINDOW_COUNTERS_CAPACITY = 100000
+    WINDOW_COUNTERS_MAX_AGE = 300  # seconds a startup rebuild by another worker is reused
+
+    # JSON file overriding the Constants scoring weights/thresholds, reloaded on change (app/weights.py)
+    SCORING_SETTINGS_PATH = os.getenv("SCORING_SETTINGS_PATH", "")
+
+    # Background jobs (app/jobs.py): "thread" runs them on threads of the web workers (started on
+    # the first submit), anything else leaves them to `flask run-jobs` processes
+    JOB_RUNNER = os.getenv("JOB_RUNNER", "thread")
+    try:
+        JOB_THREADS = int(os.getenv("JOB_THREADS", "2"))  # jobs run at once by one runner
+        JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))  # jobs run at once by all runners
+    except ValueError:
+        JOB_THREADS = 2
+        JOB_CONCURRENCY = 2
+    JOB_POLL_INTERVAL = 1.0  # seconds between checks for queued jobs
+    JOB_STALE_AFTER = 300  # seconds without heartbeat after which a running job is failed
+
+    # Admission control (app/admission.py): endpoint -> (requests running at once, requests waiting)
+    # per host. Beyond both, requests get a 503 with Retry-After, or the last good response of the URL.
+    ADMISSION_LIMITS = {
+        "customers.list_customers": (2, 4),
+        "dashboard.dashboard": (2, 4),
+        "dashboard.dashboard_async": (2, 4),
+        "dashboard.at_risk_customers": (2, 4),
+        "export.export_customers": (1, 2),
+        "export.export_events": (1, 2),
+        "scoring.simulate_scoring": (1, 2),
+    }
+    ADMISSION_QUEUE_TIMEOUT = 5.0  # seconds a waiting request waits for a slot
+    ADMISSION_RETRY_AFTER = 5  # seconds, Retry-After of shed requests
+    ADMISSION_STALE_TTL = 300  # max age (seconds) of a last good response served instead of a 503
+    ADMISSION_STALE_ENTRIES = 100  # last good responses kept per worker
+    ADMISSION_LOCK_DIR = os.getenv("ADMISSION_LOCK_DIR", os.path.join(tempfile.gettempdir(), "auditale-admission"))
+
+    # Result cache shared by the workers of a host (app/cache.py), off unless a path is set,
+    # preferably on tmpfs: SHARED_CACHE_PATH=/dev/shm/auditale-cache.db
+    SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+    try:
+        SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    except ValueError:
+        SHARED_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    SHARED_CACHE_TTL = 60  # default seconds an entry is served
+
+    # Max events per POST /api/events/batch
+    INGEST_BATCH_MAX = 1000
+
+    # Rows fetched per server-side cursor batch by the streaming exports
+    EXPORT_BATCH_SIZE = 1000
+
+    # Max concurrent queries (connections) per async fan-out, see app/async_db.py
+    ASYNC_MAX_FANOUT = 8
+
+    # Request profiling: requests carrying a signed PROFILE_HEADER (see `flask profile-token`)
+    # are always profiled, others are sampled at PROFILE_SAMPLE_RATE (0.0 - 1.0)
+    PROFILE_DIR = os.path.abspath(os.getenv("PROFILE_DIR", "profiles"))
+    PROFILE_HEADER = "X-Auditale-Profile"
+    PROFILE_MODE = os.getenv("PROFILE_MODE", "pstats")  # "pstats" or "collapsed"
+    try:
+        PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    except ValueError:
+        PROFILE_SAMPLE_RATE = 0.0
+        PROFILE_MAX_FILES = 50
+
 class TestConfig(Config):
     FLASK_ENV = "testing"
     TEST_DB = os.path.abspath('test_temp.db')
@@ -30,4 +131,9 @@ class TestConfig(Config):
     TESTING = True
     POSTGRES_PRIMARY_HOST = ""
     POSTGRES_REPLICA_HOST = ""
-    READING_REPLICAS = 0
\ No newline at end of file
+    READING_REPLICAS = 0
+    SHARD_COUNT = 1  # simulated shards, one SQLite file each (TEST_DB, TEST_DB_shard1, ...)
+    SQLITE_READ_ONLY = False
+    PROFILE_DIR = os.path.abspath('test_profiles')
+    PROFILE_SAMPLE_RATE = 0.0
+    JOB_POLL_INTERVAL = 0.05
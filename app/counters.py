@@ -0,0 +1,220 @@
+import fcntl
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from .models import ApiUsage, Customer, LoginEvent
+
+# Sliding-window event counters shared by every worker process of a host: a memory-mapped file
+# holding, per customer, a ring of daily buckets (one counter per kind and day). Lookups sum at
+# most `days` buckets without a database round trip. Writers (increments, rebuilds) serialize on
+# an flock of the file, readers don't lock.
+#
+# Layout, in native uint32 words: header [MAGIC, VERSION, capacity, days, kinds, built_at, 0, 0],
+# then `capacity` slots of [customer_id + 1 (0 = empty), day stamp per bucket, counts per kind and bucket],
+# addressed by open addressing on customer_id.
+MAGIC = 0x41554443
+VERSION = 1
+HEADER_WORDS = 8
+BUILT_AT = 5
+
+# Counted kinds -> (model, time column)
+KINDS = {
+    "login": (LoginEvent, LoginEvent.timestamp),
+    "api": (ApiUsage, ApiUsage.timestamp),
+}
+
+
+def _day(value):
+    return (value.date() if isinstance(value, datetime) else value).toordinal()
+
+
+class WindowCounters:
+    def __init__(self, path, capacity, days=32):
+        self.path = path
+        self.capacity = capacity
+        self.days = days
+        self.kinds = list(KINDS)
+        self.slot_words = 1 + days + len(self.kinds) * days
+        # Max age (seconds) of the file accepted by the next ready_counters(), None once checked
+        self.pending_rebuild = None
+        self.rebuild_lock = threading.Lock()
+        size = (HEADER_WORDS + capacity * self.slot_words) * 4
+
+        self._fd, self._pid = os.open(path, os.O_RDWR | os.O_CREAT, 0o644), os.getpid()
+        with self.locked():
+            header = os.pread(self._fd, HEADER_WORDS * 4, 0)
+            expected = [MAGIC, VERSION, capacity, days, len(self.kinds)]
+            if os.fstat(self._fd).st_size != size or memoryview(header).cast("I")[:5].tolist() != expected:
+                # New file or another layout: start empty (built_at 0 marks it for a rebuild)
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                self._map = mmap.mmap(self._fd, size)
+                self._words = memoryview(self._map).cast("I")
+                for i, value in enumerate(expected):
+                    self._words[i] = value
+            else:
+                self._map = mmap.mmap(self._fd, size)
+                self._words = memoryview(self._map).cast("I")
+
+    @contextmanager
+    def locked(self):
+        # flock is per open file: processes forked after opening (gunicorn --preload) reopen
+        # the file so they don't share, and skip, each other's lock
+        if self._pid != os.getpid():
+            self._fd, self._pid = os.open(self.path, os.O_RDWR), os.getpid()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def built_at(self):
+        return self._words[BUILT_AT]
+
+    def _slot(self, customer_id, insert=False):
+        # Word offset of the customer's slot, None when absent (or the table is full)
+        key = customer_id + 1
+        start = (customer_id * 2654435761) % self.capacity
+        for probe in range(self.capacity):
+            offset = HEADER_WORDS + ((start + probe) % self.capacity) * self.slot_words
+            stored = self._words[offset]
+            if stored == key:
+                return offset
+            if stored == 0:
+                if not insert:
+                    return None
+                self._words[offset] = key
+                return offset
+        return None
+
+    def _add(self, offset, kind, day, count):
+        bucket = day % self.days
+        stamp = offset + 1 + bucket
+        if self._words[stamp] != day:
+            # Bucket still holds an older day of the ring: reuse it for `day`
+            self._words[stamp] = day
+            for k in range(len(self.kinds)):
+                self._words[offset + 1 + self.days * (k + 1) + bucket] = 0
+        counter = offset + 1 + self.days * (self.kinds.index(kind) + 1) + bucket
+        self._words[counter] += count
+
+    def increment(self, customer_id, kind, timestamp, count=1):
+        # Counts an event of a known customer, False when the customer isn't tracked
+        # (created after the last rebuild) or the event is outside the window
+        day, today = _day(timestamp), date.today().toordinal()
+        if not today - self.days < day <= today:
+            return False
+        with self.locked():
+            offset = self._slot(customer_id)
+            if offset is None:
+                return False
+            self._add(offset, kind, day, count)
+        return True
+
+    def count(self, customer_id, kind, since):
+        # Events of `kind` on day `since` and later (whole days), None when the customer isn't tracked
+        offset = self._slot(customer_id)
+        if offset is None:
+            return None
+        since_day = _day(since)
+        counts = offset + 1 + self.days * (self.kinds.index(kind) + 1)
+        return sum(self._words[counts + b] for b in range(self.days) if self._words[offset + 1 + b] >= since_day)
+
+    def daily(self, customer_id, kind, since):
+        # {day: count} of `kind` on day `since` and later, None when the customer isn't tracked or
+        # the window doesn't reach back to `since`. Days without events are absent.
+        since_day = _day(since)
+        if since_day <= date.today().toordinal() - self.days:
+            return None
+        offset = self._slot(customer_id)
+        if offset is None:
+            return None
+        counts = offset + 1 + self.days * (self.kinds.index(kind) + 1)
+        return {date.fromordinal(self._words[offset + 1 + b]): self._words[counts + b]
+                for b in range(self.days) if self._words[offset + 1 + b] >= since_day}
+
+    def rebuild(self, customer_ids, daily_counts):
+        # Replaces every slot (call inside locked()): customer_ids all get a (possibly empty)
+        # slot, daily_counts yields (customer_id, kind, day, count)
+        self._map[HEADER_WORDS * 4:] = bytes(len(self._map) - HEADER_WORDS * 4)
+        for customer_id in customer_ids:
+            self._slot(customer_id, insert=True)
+        for customer_id, kind, day, count in daily_counts:
+            offset = self._slot(customer_id)
+            if offset is not None:
+                self._add(offset, kind, _day(day), count)
+        self._words[BUILT_AT] = int(time.time())
+
+    def close(self):
+        self._words.release()
+        self._map.close()
+        os.close(self._fd)
+
+
+def daily_counts_from_db(db_manager, days):
+    # (customer ids, [(customer_id, kind, day, count)]) of every shard for the last `days` days
+    since = datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time())
+
+    def shard_counts(session):
+        customer_ids = [customer_id for (customer_id,) in session.execute(select(Customer.id))]
+        counts = []
+        for kind, (model, column) in KINDS.items():
+            rows = session.execute(
+                select(model.customer_id, func.date(column), func.count())
+                .where(column >= since)
+                .group_by(model.customer_id, func.date(column))
+            )
+            # func.date() gives a string on SQLite and a date on Postgres
+            counts.extend((customer_id, kind, date.fromisoformat(day) if isinstance(day, str) else day, count)
+                          for customer_id, day, count in rows)
+        return customer_ids, counts
+
+    results = db_manager.scatter_gather(shard_counts)
+    return [c for ids, _ in results for c in ids], [c for _, counts in results for c in counts]
+
+def rebuild_from_db(counters, db_manager, max_age=None):
+    # Rebuilds unless another worker did so within max_age seconds (workers of a host start together)
+    with counters.locked():
+        if max_age is not None and time.time() - counters.built_at <= max_age:
+            return False
+        counters.rebuild(*daily_counts_from_db(db_manager, counters.days))
+        return True
+
+def ready_counters(app):
+    # The app's window counters, rebuilt on first use in each process (not while the app is
+    # created, so workers boot and fork without touching the database); None when disabled
+    counters = app.extensions.get("window_counters")
+    if counters is not None and counters.pending_rebuild is not None:
+        with counters.rebuild_lock:
+            if counters.pending_rebuild is not None:
+                rebuild_from_db(counters, app.db_manager, max_age=counters.pending_rebuild)
+                counters.pending_rebuild = None
+    return counters
+
+def window_count(customer_id, kind, since):
+    # Count from the host's window counters when enabled and tracking the customer, None otherwise
+    counters = ready_counters(current_app)
+    return counters.count(customer_id, kind, since) if counters else None
+
+def window_daily(customer_id, kind, since):
+    # Daily counts since `since` from the host's window counters, None when they can't answer
+    counters = ready_counters(current_app)
+    return counters.daily(customer_id, kind, since) if counters else None
+
+def record(customer_id, kind, timestamp):
+    counters = ready_counters(current_app)
+    if counters:
+        counters.increment(customer_id, kind, timestamp)
+
+def init_window_counters(app):
+    counters = WindowCounters(app.config["WINDOW_COUNTERS_PATH"], app.config.get("WINDOW_COUNTERS_CAPACITY", 100_000))
+    # Rebuilt from the database by the first lookup, unless another worker did so within max_age seconds
+    counters.pending_rebuild = app.config.get("WINDOW_COUNTERS_MAX_AGE", 300)
+    app.extensions["window_counters"] = counters
+    return counters
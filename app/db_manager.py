@@ -1,47 +1,226 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, func
 from sqlalchemy.orm import sessionmaker
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from flask import current_app, has_app_context
 from app.config import Config
+from app.models import Customer
 from random import choice
+import os
+import threading
+import weakref
+
+_fork_aware = weakref.WeakSet()
+
+def register_after_fork(obj):
+    # obj.after_fork() runs in every child process forked afterwards (e.g. gunicorn --preload workers)
+    _fork_aware.add(obj)
+
+def _after_fork_in_child():
+    for obj in list(_fork_aware):
+        obj.after_fork()
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def sqlite_shard_path(path, index):
+    # SQLite file simulating shard `index`, shard 0 is `path` itself
+    if index == 0:
+        return path
+    base, extension = os.path.splitext(path)
+    return f"{base}_shard{index}{extension}"
+
+def shard_layout(config):
+    # [(primary host, [replica hosts])], from SHARDS="primary:replica,replica;primary-2:replica-2-1"
+    shards = []
+    for shard in filter(None, getattr(config, "SHARDS", "").split(";")):
+        primary, _, replicas = shard.partition(":")
+        shards.append((primary.strip(), [r.strip() for r in replicas.split(",") if r.strip()]))
+    if not shards:
+        replicas = [f'{config.POSTGRES_REPLICA_HOST}-{i}' for i in range(1, config.READING_REPLICAS + 1)]
+        shards.append((config.POSTGRES_PRIMARY_HOST, replicas))
+    return shards
+
+class Shard:
+    # One primary (writes) and its replicas (reads). Engines are created on first use, one per
+    # host (or SQLite file), so workers only build the ones they actually query.
+    def __init__(self, index, primary, replicas, engine_factory):
+        self.index = index
+        self.primary = primary
+        self.replicas = replicas
+        self._engine_factory = engine_factory
+        self._engines = {}
+        self._sessionmakers = {}
+        self._lock = threading.RLock()
+
+    def engine(self, host):
+        if host not in self._engines:
+            with self._lock:
+                if host not in self._engines:
+                    self._engines[host] = self._engine_factory(host)
+        return self._engines[host]
+
+    def sessionmaker(self, host):
+        if host not in self._sessionmakers:
+            with self._lock:
+                if host not in self._sessionmakers:
+                    self._sessionmakers[host] = sessionmaker(bind=self.engine(host))
+        return self._sessionmakers[host]
+
+    @property
+    def write_engine(self):
+        return self.engine(self.primary)
+
+    @property
+    def write_sessionmaker(self):
+        return self.sessionmaker(self.primary)
+
+    @property
+    def read_engines(self):
+        return [self.engine(replica) for replica in self.replicas]
+
+    @property
+    def read_sessionsmakers(self):
+        return [self.sessionmaker(replica) for replica in self.replicas]
+
+    def read_sessionmaker(self):
+        # Random replica, only its engine is created
+        return self.sessionmaker(choice(self.replicas))
+
+    def dispose(self, close=True):
+        for engine in list(self._engines.values()):
+            engine.dispose(close=close)
 
 class DatabaseManager:
     # Context-managed SQLAlchemy sessions:
     # get_write_session() for transactional writes with commit/rollback
     # get_read_session() for read-only queries from random replicas
+    # Customer data can be sharded by customer_id over several primaries (Config.SHARDS):
+    # pass the customer_id to route a session to its shard, use scatter_gather() for
+    # cross-customer reads. Without a customer_id sessions go to shard 0.
+    # With Config.SQLITE_PATH everything runs on one SQLite file instead (single-node mode).
     def __init__(self, config: Config):
         self.config = config
-        if getattr(config, "TESTING", False):
-            self.write_engine = create_engine(f'sqlite:///{config.TEST_DB}', pool_pre_ping=True)
-            self.write_sessionmaker = sessionmaker(bind=self.write_engine)
-            self.read_engines = [self.write_engine]
-            self.read_sessionsmakers = [self.write_sessionmaker]
+        if getattr(config, "SQLITE_PATH", ""):
+            # Single-node SQLite: the writer connection and the read-only pool are the shard's two "hosts"
+            engines = {"writer": self._create_sqlite_writer, "readers": self._create_sqlite_readers}
+            self.shards = [Shard(0, "writer", ["readers"], lambda host: engines[host](config, config.SQLITE_PATH))]
+        elif getattr(config, "TESTING", False):
+            # Every simulated shard is its own SQLite file, shard 0 is TEST_DB itself
+            self.shards = []
+            for index in range(getattr(config, "SHARD_COUNT", 1)):
+                path = sqlite_shard_path(config.TEST_DB, index)
+                self.shards.append(Shard(index, path, [path], lambda path: self._create_sqlite_engine(config, path)))
+        else:
+            self.shards = [
+                Shard(index, primary, replicas, self._create_postgres_engine)
+                for index, (primary, replicas) in enumerate(shard_layout(config))
+            ]
+        register_after_fork(self)
+
+    # Shard 0, kept for single-database callers (migrations, create_all, seeding)
+    @property
+    def write_engine(self):
+        return self.shards[0].write_engine
+
+    @property
+    def write_sessionmaker(self):
+        return self.shards[0].write_sessionmaker
+
+    @property
+    def read_engines(self):
+        return self.shards[0].read_engines
+
+    @property
+    def read_sessionsmakers(self):
+        return self.shards[0].read_sessionsmakers
+
+    @property
+    def shard_write_engines(self):
+        # Primary engine of every shard, in shard order (bulk seeding, maintenance)
+        return [shard.write_engine for shard in self.shards]
+
+    def after_fork(self):
+        # Pooled connections opened before a fork (gunicorn --preload) belong to the parent:
+        # drop them without closing, the child opens its own
+        for shard in self.shards:
+            shard.dispose(close=False)
+
+    def _create_sqlite_engine(self, config, path):
+        if getattr(config, "SQLITE_READ_ONLY", False):
+            # Shared snapshot file: never written, so open it read-only and immutable (no locking)
+            engine = create_engine(f'sqlite:///file:{path}?mode=ro&immutable=1&uri=true', pool_pre_ping=True)
         else:
-            self.write_engine = self._create_engine(config.POSTGRES_USER, 
-                                                    config.POSTGRES_PASSWORD, 
-                                                    config.POSTGRES_PRIMARY_HOST, 
-                                                    config.POSTGRES_PORT, 
-                                                    config.POSTGRES_DB_NAME)
-            self.write_sessionmaker = sessionmaker(bind=self.write_engine)
-            self.read_engines = self._create_read_engines()
-            self.read_sessionsmakers = [sessionmaker(bind=read_engine) for read_engine in self.read_engines]
+            engine = create_engine(f'sqlite:///{path}', pool_pre_ping=True)
+
+        mmap_size = getattr(config, "SQLITE_MMAP_SIZE", 0)
+        if mmap_size:
+            @event.listens_for(engine, "connect")
+            def set_mmap_size(dbapi_connection, connection_record):
+                dbapi_connection.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        return engine
+
+    def _set_sqlite_pragmas(self, engine, config, *pragmas):
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            for pragma in pragmas + (
+                f"busy_timeout={int(config.SQLITE_BUSY_TIMEOUT)}",
+                f"cache_size=-{int(config.SQLITE_CACHE_KB)}",
+                f"mmap_size={int(config.SQLITE_MMAP_SIZE)}",
+                "temp_store=MEMORY",
+            ):
+                dbapi_connection.execute(f"PRAGMA {pragma}")
+
+    def _create_sqlite_writer(self, config, path):
+        # The only writing connection of the worker: write sessions queue for it instead of
+        # failing with "database is locked", and take the write lock up front (BEGIN IMMEDIATE)
+        # so workers wait on busy_timeout rather than deadlock upgrading read transactions.
+        # WAL with synchronous=NORMAL commits without fsync, the WAL is synced once per
+        # checkpoint (every SQLITE_WAL_AUTOCHECKPOINT pages), i.e. for a batch of commits.
+        engine = create_engine(f'sqlite:///{path}', pool_size=1, max_overflow=0, pool_pre_ping=True)
+        self._set_sqlite_pragmas(engine, config, "journal_mode=WAL", f"synchronous={config.SQLITE_SYNCHRONOUS}",
+                                 f"wal_autocheckpoint={int(config.SQLITE_WAL_AUTOCHECKPOINT)}")
+
+        @event.listens_for(engine, "connect")
+        def disable_pysqlite_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def begin_immediate(connection):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        return engine
+
+    def _create_sqlite_readers(self, config, path):
+        # Read-only connections (query_only), which WAL never blocks behind the writer. Not opened
+        # with mode=ro: those can't create the WAL index when no writer has connected yet.
+        engine = create_engine(f'sqlite:///{path}', pool_size=config.SQLITE_READ_POOL_SIZE,
+                               max_overflow=config.SQLITE_READ_POOL_SIZE, pool_pre_ping=True)
+        self._set_sqlite_pragmas(engine, config, "query_only=1")
+        return engine
+
+    def _create_postgres_engine(self, host):
+        return self._create_engine(self.config.POSTGRES_USER,
+                                   self.config.POSTGRES_PASSWORD,
+                                   host,
+                                   self.config.POSTGRES_PORT,
+                                   self.config.POSTGRES_DB_NAME)
 
     def _create_engine(self, user, password, host, port, db_name):
         return create_engine(f"postgresql://{user}:{password}@{host}:{port}/{db_name}", pool_pre_ping=True)
 
-    def _create_read_engines(self):
-        read_engines = []
-        for i in range(1, self.config.READING_REPLICAS + 1):
-            read_engine = self._create_engine(self.config.POSTGRES_USER, 
-                                              self.config.POSTGRES_PASSWORD, 
-                                              f'{self.config.POSTGRES_REPLICA_HOST}-{i}', 
-                                              self.config.POSTGRES_PORT, 
-                                              self.config.POSTGRES_DB_NAME)
-            read_engines.append(read_engine)
-        return read_engines
+    @property
+    def shard_count(self):
+        return len(self.shards)
+
+    def shard_for(self, customer_id):
+        # Customer ids are allocated so that id % shard_count is the shard holding the customer
+        if customer_id is None:
+            return self.shards[0]
+        return self.shards[customer_id % len(self.shards)]
 
     @contextmanager
-    def get_write_session(self):
-        write_session = self.write_sessionmaker()
+    def get_write_session(self, customer_id=None, shard=None):
+        shard = self.shards[shard] if shard is not None else self.shard_for(customer_id)
+        write_session = shard.write_sessionmaker()
         try:
             yield write_session
             write_session.commit()
@@ -50,13 +229,43 @@ class DatabaseManager:
             raise
         finally:
             write_session.close()
-    
+
     @contextmanager
-    def get_read_session(self):
-        read_session = choice(self.read_sessionsmakers)()
+    def get_read_session(self, customer_id=None, shard=None):
+        shard = self.shards[shard] if shard is not None else self.shard_for(customer_id)
+        read_session = shard.read_sessionmaker()()
+        read_session.info["read_memo"] = {}  # repeated reads run once (app/memo.py)
         try:
             yield read_session
         except:
             raise
         finally:
-            read_session.close()
\ No newline at end of file
+            read_session.close()
+
+    def scatter_gather(self, fn):
+        # Runs fn(read_session) on every shard (concurrently when sharded), results in shard order.
+        def run(index):
+            with self.get_read_session(shard=index) as session:
+                return fn(session)
+
+        if len(self.shards) == 1:
+            return [run(0)]
+
+        # Worker threads get an app context of the caller's app, so fn can use current_app
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def run_in_app(index):
+            with app.app_context() if app else nullcontext():
+                return run(index)
+
+        with ThreadPoolExecutor(max_workers=len(self.shards)) as pool:
+            return list(pool.map(run_in_app, range(len(self.shards))))
+
+    def next_customer_ids(self, count, shard=None):
+        # `count` unused customer ids, all on `shard` when given (id % shard_count == shard).
+        # Not safe against concurrent allocation, meant for seeding and imports.
+        start = max(self.scatter_gather(lambda session: session.query(func.max(Customer.id)).scalar() or 0)) + 1
+        if shard is None:
+            return list(range(start, start + count))
+        start += (shard - start) % len(self.shards)
+        return list(range(start, start + count * len(self.shards), len(self.shards)))
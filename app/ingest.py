@@ -0,0 +1,44 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app import lookups, sketches
+
+# Idempotent event inserts. Events may carry a client-supplied event_id, unique per customer and
+# event table (ix_<table>_customer_event_id): insert_events() writes a batch with one
+# INSERT ... ON CONFLICT DO NOTHING (SQLite's INSERT OR IGNORE), so events retried or re-sent by
+# producers are dropped by the database without being looked up first. Events without an
+# event_id are always inserted.
+
+CONFLICT_COLUMNS = ["customer_id", "event_id"]
+
+
+def _insert_ignore(dialect, model):
+    table = model.__table__
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=CONFLICT_COLUMNS)
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=CONFLICT_COLUMNS)
+    return insert(table)
+
+def insert_events(session, model, rows):
+    # Inserts event row dicts of one model, all with the same keys (names as on the model, e.g.
+    # feature_name), in the session's transaction. Returns the rows inserted: without the ones
+    # whose event id is already stored or repeated in `rows`.
+    seen, unique = set(), []
+    for row in rows:
+        key = (row["customer_id"], row.get("event_id"))
+        if key[1] is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(row)
+    if not unique:
+        return []
+
+    connection = session.connection()
+    encoded = lookups.encode(connection, model, unique, session.info.setdefault("lookup_pending", {}))
+    statement = _insert_ignore(connection.dialect.name, model).returning(model.customer_id, model.event_id)
+    stored = {tuple(key) for key in connection.execute(statement, encoded) if key[1] is not None}
+    inserted = [row for row in unique if row.get("event_id") is None or (row["customer_id"], row["event_id"]) in stored]
+    # Core inserts aren't seen by the ORM flush listener that maintains the sketches
+    sketches.merge_events(connection, {model: inserted})
+    return inserted
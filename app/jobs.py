@@ -0,0 +1,269 @@
+import inspect
+import json
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select, update
+from . import cache
+from .db_manager import register_after_fork
+from .models import Job
+
+# Background jobs: long operations (seeding, rescoring, imports) are queued in the jobs table
+# (shard 0) by the web request, which returns the job id at once. JobRunner threads, in the web
+# workers (JOB_RUNNER = "thread") or in a `flask run-jobs` process, claim and run them; at most
+# JOB_CONCURRENCY run at once over all runners. Job functions report progress through
+# JobContext.progress(), which is also where a requested cancellation stops them.
+
+JOBS = {}  # kind -> function(app, job context, **params)
+FINISHED = ("succeeded", "failed", "cancelled")
+CLAIM_LOCK_KEY = 0x6A6F6273  # Postgres advisory lock serializing claims of all runners
+
+_claim_lock = threading.Lock()  # same for the runners of this process (SQLite)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job(kind):
+    # Registers a job function: @job("rescore") def run(app, job, **params)
+    def register(fn):
+        JOBS[kind] = fn
+        return fn
+    return register
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def submit(app, kind, **params):
+    # Queues a job, returns its id
+    if kind not in JOBS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    try:
+        inspect.signature(JOBS[kind]).bind(app, None, **params)
+    except TypeError as e:
+        raise ValueError(f"Invalid params for {kind} job: {e}")
+    with app.db_manager.get_write_session(shard=0) as session:
+        queued = Job(kind=kind, params=json.dumps(params))
+        session.add(queued)
+        session.flush()
+        job_id = queued.id
+    runner = app.extensions.get("job_runner")
+    if runner is not None:
+        runner.start()
+        runner.wakeup.set()
+    return job_id
+
+def get_job(app, job_id):
+    # The job as a dict, None when unknown
+    with app.db_manager.get_write_session(shard=0) as session:
+        found = session.get(Job, job_id)
+        return found.to_dict() if found else None
+
+def list_jobs(app, status=None, limit=50):
+    with app.db_manager.get_write_session(shard=0) as session:
+        statement = select(Job).order_by(Job.id.desc()).limit(limit)
+        if status:
+            statement = statement.where(Job.status == status)
+        return [j.to_dict() for j in session.execute(statement).scalars()]
+
+def cancel(app, job_id):
+    # Queued jobs are cancelled at once, running ones at their next progress report.
+    # Returns the job dict, None when unknown.
+    with app.db_manager.get_write_session(shard=0) as session:
+        found = session.get(Job, job_id, with_for_update=True)
+        if found is None:
+            return None
+        if found.status == "queued":
+            found.status, found.finished_at = "cancelled", _now()
+        elif found.status == "running":
+            found.cancel_requested = True
+        session.flush()
+        return found.to_dict()
+
+def claim(app, worker, concurrency, stale_after):
+    # Marks the oldest queued job running and returns (id, kind, params), None when there is
+    # none or `concurrency` jobs already run. Running jobs without a heartbeat for `stale_after`
+    # seconds (their runner died) are failed first, so they don't hold a slot forever.
+    with _claim_lock, app.db_manager.get_write_session(shard=0) as session:
+        if session.get_bind().dialect.name == "postgresql":
+            session.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK_KEY)))
+        now = _now()
+        session.execute(
+            update(Job)
+            .where(Job.status == "running", Job.heartbeat_at < now - timedelta(seconds=stale_after))
+            .values(status="failed", error="Job runner stopped responding", finished_at=now)
+        )
+        running = session.execute(select(func.count()).select_from(Job).where(Job.status == "running")).scalar()
+        if running >= concurrency:
+            return None
+        queued = session.execute(
+            select(Job).where(Job.status == "queued").order_by(Job.id).limit(1)
+        ).scalar_one_or_none()
+        if queued is None:
+            return None
+        queued.status, queued.worker = "running", worker
+        queued.started_at = queued.heartbeat_at = now
+        return queued.id, queued.kind, json.loads(queued.params)
+
+def _finish(app, job_id, **values):
+    with app.db_manager.get_write_session(shard=0) as session:
+        session.execute(update(Job).where(Job.id == job_id).values(finished_at=_now(), **values))
+
+
+class JobContext:
+    # Handed to job functions to report progress; raises JobCancelled once cancellation was requested
+    def __init__(self, app, job_id):
+        self.app = app
+        self.id = job_id
+
+    def progress(self, done, total=None, message=None):
+        values = {"progress_done": done, "heartbeat_at": _now()}
+        if total is not None:
+            values["progress_total"] = total
+        if message is not None:
+            values["message"] = message
+        with self.app.db_manager.get_write_session(shard=0) as session:
+            session.execute(update(Job).where(Job.id == self.id).values(**values))
+            cancel_requested = session.execute(select(Job.cancel_requested).where(Job.id == self.id)).scalar()
+        if cancel_requested:
+            raise JobCancelled()
+
+
+class JobRunner:
+    # Polls the jobs table and runs claimed jobs on a thread pool. Started on first use, and again
+    # in forked children (threads don't survive a fork).
+    def __init__(self, app):
+        self.app = app
+        self.threads = app.config.get("JOB_THREADS", 2)
+        self.concurrency = app.config.get("JOB_CONCURRENCY", 2)
+        self.poll_interval = app.config.get("JOB_POLL_INTERVAL", 1.0)
+        self.stale_after = app.config.get("JOB_STALE_AFTER", 300)
+        self.wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._reset()
+        register_after_fork(self)
+
+    def _reset(self):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = set()  # ids of the jobs this runner executes
+        self._stopped = threading.Event()
+        self._dispatcher = None
+        self._pool = None
+
+    def after_fork(self):
+        self._reset()
+
+    def start(self):
+        with self._lock:
+            if self._dispatcher is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="job")
+                self._dispatcher = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+                self._dispatcher.start()
+
+    def stop(self, wait=True):
+        self._stopped.set()
+        self.wakeup.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._pool.shutdown(wait=wait)
+        self._reset()
+
+    def run_forever(self):
+        # Foreground runner of `flask run-jobs`
+        self.start()
+        try:
+            self._dispatcher.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _dispatch(self):
+        while not self._stopped.is_set():
+            try:
+                self._heartbeat()
+                while len(self.running) < self.threads and not self._stopped.is_set():
+                    claimed = claim(self.app, self.worker, self.concurrency, self.stale_after)
+                    if claimed is None:
+                        break
+                    self.running.add(claimed[0])
+                    self._pool.submit(self._run, *claimed)
+            except Exception:
+                # e.g. database unavailable: retried at the next poll
+                self.app.logger.exception("Job dispatch failed")
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def _heartbeat(self):
+        if self.running:
+            with self.app.db_manager.get_write_session(shard=0) as session:
+                session.execute(update(Job).where(Job.id.in_(list(self.running))).values(heartbeat_at=_now()))
+
+    def _run(self, job_id, kind, params):
+        try:
+            with self.app.app_context():
+                result = JOBS[kind](self.app, JobContext(self.app, job_id), **params)
+            _finish(self.app, job_id, status="succeeded", result=json.dumps(result))
+        except JobCancelled:
+            _finish(self.app, job_id, status="cancelled")
+        except Exception:
+            _finish(self.app, job_id, status="failed", error=traceback.format_exc(limit=5))
+        finally:
+            self.running.discard(job_id)
+            self.wakeup.set()
+
+
+def init_jobs(app):
+    if app.config.get("JOB_RUNNER", "thread") == "thread":
+        app.extensions["job_runner"] = JobRunner(app)
+
+
+# Built-in jobs
+
+@job("seed")
+def seed_job(app, job):
+    from utils.seed_db import seed
+    seed(app, progress=job.progress)
+    return {"seeded": True}
+
+@job("rescore")
+def rescore_job(app, job):
+    from app.scoring import rescore
+    return {"scored": rescore(app.db_manager, progress=job.progress)}
+
+@job("bulk_seed")
+def bulk_seed_job(app, job, customers, events_per_customer=None, seed=0, truncate_first=False):
+    # Import of a synthetic dataset (utils/bulk_seed.py), then rescoring
+    from app.counters import rebuild_from_db
+    from app.scoring import rescore
+    from utils.bulk_seed import SeedSpec, bulk_seed
+    spec = SeedSpec(customers=customers, seed=seed,
+                    **({"events_per_customer": events_per_customer} if events_per_customer else {}))
+    rows = bulk_seed(app.db_manager.shard_write_engines, spec, truncate_first=truncate_first, progress=job.progress)
+    scored = rescore(app.db_manager)
+    if "window_counters" in app.extensions:
+        rebuild_from_db(app.extensions["window_counters"], app.db_manager)
+    cache.clear()
+    return {"rows": rows, "scored": scored}
+
+@job("rebuild_sketches")
+def rebuild_sketches_job(app, job):
+    from app import sketches
+    for shard in app.db_manager.shards:
+        with shard.write_engine.begin() as connection:
+            sketches.rebuild(connection)
+        job.progress(shard.index + 1, app.db_manager.shard_count)
+    return {"shards": app.db_manager.shard_count}
+
+@job("rollup_sketches")
+def rollup_sketches_job(app, job):
+    # Daily run: merges the sketches of days older than sketches.DAILY_DAYS into monthly rows
+    from app import sketches
+    months = 0
+    for shard in app.db_manager.shards:
+        with shard.write_engine.begin() as connection:
+            months += sketches.rollup(connection)
+        job.progress(shard.index + 1, app.db_manager.shard_count)
+    return {"months": months}
@@ -0,0 +1,109 @@
+import threading
+from weakref import WeakKeyDictionary
+from sqlalchemy import event, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from .models import lookup_names
+
+# Name -> id of the lookup tables (feature names, API endpoints, statuses) that event rows reference.
+# Ids are per database, so every engine has its own cache: names are resolved once per process,
+# then inserting an event costs no extra query. Names are added to a lookup table on first use;
+# ids inserted by an open transaction are only cached once it commits.
+
+_cache = WeakKeyDictionary()  # engine -> {lookup table name: {name: id}}
+_lock = threading.Lock()
+
+
+def _known(engine, lookup):
+    with _lock:
+        return _cache.setdefault(engine, {}).setdefault(lookup.__tablename__, {})
+
+def _insert_ignore(connection, lookup):
+    # INSERT of names that another writer may have added concurrently
+    table = lookup.__table__
+    if connection.dialect.name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=["name"])
+    if connection.dialect.name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=["name"])
+    return insert(table)
+
+def ids_for(connection, lookup, names, pending):
+    # {name: id} of `names` in the `lookup` table, inserting the missing ones. Ids not known to be
+    # committed go to `pending` ({(engine, table name): {name: id}}) for publish() after the commit.
+    known = _known(connection.engine, lookup)
+    uncommitted = pending.setdefault((connection.engine, lookup.__tablename__), {})
+    ids = {name: known.get(name, uncommitted.get(name)) for name in set(names)}
+    missing = [name for name, id_ in ids.items() if id_ is None]
+    if missing:
+        table = lookup.__table__
+        found = dict(connection.execute(select(table.c.name, table.c.id).where(table.c.name.in_(missing))).all())
+        new = [name for name in missing if name not in found]
+        if new:
+            connection.execute(_insert_ignore(connection, lookup), [{"name": name} for name in new])
+            inserted = dict(connection.execute(select(table.c.name, table.c.id).where(table.c.name.in_(new))).all())
+            uncommitted.update(inserted)
+            found.update(inserted)
+        with _lock:
+            known.update((name, id_) for name, id_ in found.items() if name not in uncommitted)
+        ids.update(found)
+    return ids
+
+def publish(pending):
+    # Caches the ids of ids_for() calls whose transaction committed
+    for (engine, table_name), ids in pending.items():
+        with _lock:
+            _cache.setdefault(engine, {}).setdefault(table_name, {}).update(ids)
+    pending.clear()
+
+def forget(engine):
+    # Drops the cached ids of a database whose lookup tables were emptied or replaced
+    with _lock:
+        _cache.pop(engine, None)
+
+def encode(connection, model, rows, pending):
+    # Event row dicts with names (e.g. "feature_name") -> rows with ids (e.g. "feature_id"), for Core inserts
+    names = lookup_names(model)
+    if not names or not rows:
+        return rows
+    encoded = [dict(row) for row in rows]
+    for attribute, name in names.items():
+        ids = ids_for(connection, name.lookup, [row.get(attribute, name.default) for row in encoded], pending)
+        for row in encoded:
+            row[name.foreign_key] = ids[row.pop(attribute, name.default)]
+    return encoded
+
+def id_of(lookup, name):
+    # Scalar subquery of the id of `name`, to filter events by name without a join
+    return select(lookup.id).where(lookup.name == name).scalar_subquery()
+
+
+@event.listens_for(Session, "before_flush")
+def resolve_names_on_flush(session, flush_context, instances):
+    # Sets the id columns of new and changed events from their assigned (or default) names
+    objects = [obj for obj in list(session.new) + list(session.dirty) if lookup_names(type(obj))]
+    if not objects:
+        return
+    connection = session.connection()
+    pending = session.info.setdefault("lookup_pending", {})
+    for model in {type(obj) for obj in objects}:
+        of_model = [obj for obj in objects if type(obj) is model]
+        for attribute, name in lookup_names(model).items():
+            assigned = []
+            for obj in of_model:
+                names = obj.__dict__.get("_lookup_names", {})
+                if attribute in names:
+                    assigned.append((obj, names[attribute]))
+                elif getattr(obj, name.foreign_key) is None and name.default is not None:
+                    assigned.append((obj, name.default))
+            if assigned:
+                ids = ids_for(connection, name.lookup, [value for _, value in assigned], pending)
+                for obj, value in assigned:
+                    setattr(obj, name.foreign_key, ids[value])
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    publish(session.info.get("lookup_pending", {}))
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session, previous_transaction):
+    session.info.get("lookup_pending", {}).clear()
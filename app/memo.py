@@ -0,0 +1,45 @@
+import threading
+from flask import g, has_request_context
+
+# Request-scoped memo of reads: a statement executed again with the same parameters on the same
+# database during one request (e.g. the customer row, loaded by get_customer and again by
+# calculate_customer_health) returns the buffered result of its first execution. The memo lives
+# on read sessions (session.info), which never outlive a request; write sessions always hit the
+# database. Hits and misses are counted per request (X-Read-Memo response header) and per
+# process (TOTALS).
+
+TOTALS = {"hits": 0, "misses": 0}
+_totals_lock = threading.Lock()  # TOTALS is updated by every request thread
+
+
+def execute(session, statement):
+    # session.execute(statement), memoized on read sessions
+    memo = session.info.get("read_memo")
+    if memo is None:
+        return session.execute(statement)
+    compiled = statement.compile(dialect=session.get_bind().dialect)
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+
+    frozen = memo.get(key)
+    if frozen is None:
+        frozen = memo[key] = session.execute(statement).freeze()
+        _count("misses")
+    else:
+        _count("hits")
+    return frozen()
+
+def _count(outcome):
+    with _totals_lock:
+        TOTALS[outcome] += 1
+    if not has_request_context():
+        return
+    stats = g.setdefault("read_memo_stats", {"hits": 0, "misses": 0})
+    stats[outcome] += 1
+
+def init_memo(app):
+    @app.after_request
+    def memo_header(response):
+        stats = g.get("read_memo_stats")
+        if stats:
+            response.headers["X-Read-Memo"] = f"hits={stats['hits']}; misses={stats['misses']}"
+        return response
@@ -1,10 +1,47 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timezone
-from sqlalchemy import func
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float
+from functools import cache
+from sqlalchemy import DDL, event, func, inspect
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Boolean, Float, Index, LargeBinary, Text
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm.attributes import flag_modified
 db = SQLAlchemy()
 
+class LookupName:
+    # Name attribute of an event whose value is stored as a small integer id into a lookup table
+    # (`foreign_key` -> `lookup`.id, the row loaded through `relationship`). Assigned names are
+    # resolved to ids when the session flushes (see app/lookups.py); unset ones use `default`.
+    def __init__(self, lookup, foreign_key, relationship, default=None):
+        self.lookup = lookup
+        self.foreign_key = foreign_key
+        self.relationship = relationship
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        pending = obj.__dict__.get("_lookup_names", {})
+        if self.name in pending:
+            return pending[self.name]
+        row = getattr(obj, self.relationship)
+        return row.name if row is not None else self.default
+
+    def __set__(self, obj, value):
+        obj.__dict__.setdefault("_lookup_names", {})[self.name] = value
+        if inspect(obj).persistent:
+            # Marks a stored event dirty so that the flush stores the new id
+            getattr(obj, self.foreign_key)
+            flag_modified(obj, self.foreign_key)
+
+@cache
+def lookup_names(model):
+    # {attribute name: LookupName} of an event model
+    return {name: value for name, value in vars(model).items() if isinstance(value, LookupName)}
+
 class Customer(db.Model):
     __tablename__ = "customers"
     id = Column(Integer, primary_key=True)
@@ -17,6 +54,10 @@ class Customer(db.Model):
     invoices = relationship("Invoice", back_populates="customer")
     api_usage = relationship("ApiUsage", back_populates="customer")
 
+    # Trigram index for name search on Postgres (a plain index elsewhere)
+    __table_args__ = (Index("ix_customers_name_trgm", "name", postgresql_using="gin",
+                            postgresql_ops={"name": "gin_trgm_ops"}),)
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -24,18 +65,51 @@ class Customer(db.Model):
             "segment": self.segment
         }
 
+event.listen(Customer.__table__, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+# Lookup tables of the repeated strings of event rows, which store their small integer ids
+
+class FeatureName(db.Model):
+    __tablename__ = "feature_names"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+class ApiEndpoint(db.Model):
+    __tablename__ = "api_endpoints"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+class TicketStatus(db.Model):
+    __tablename__ = "ticket_statuses"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+class InvoiceStatus(db.Model):
+    __tablename__ = "invoice_statuses"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
 class LoginEvent(db.Model):
     __tablename__ = "logins"
     id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
+    event_id = Column(String(64), nullable=True)  # optional client-supplied id, see app/ingest.py
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
     customer = relationship("Customer", back_populates="logins")
 
+    # Per-customer windowed counts and pages, newest events of all customers
+    __table_args__ = (Index("ix_logins_customer_timestamp", "customer_id", "timestamp"),
+                      Index("ix_logins_timestamp", "timestamp"),
+                      # Retried events (same client event id) are inserted once
+                      Index("ix_logins_customer_event_id", "customer_id", "event_id", unique=True))
+
     def to_dict(self):
         return {
             "id": self.id,
             "customer_id": self.customer_id,
+            "event_id": self.event_id,
             "timestamp": self.timestamp.isoformat()
         }
 
@@ -43,15 +117,27 @@ class FeatureUsage(db.Model):
     __tablename__ = "feature_usage"
     id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
-    feature_name = Column(String, nullable=False)
+    event_id = Column(String(64), nullable=True)  # optional client-supplied id, see app/ingest.py
+    feature_id = Column(Integer, ForeignKey("feature_names.id"), nullable=False)
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     customer = relationship("Customer", back_populates="features")
+    feature = relationship("FeatureName", lazy="joined")
+    feature_name = LookupName(FeatureName, "feature_id", "feature")
+
+    # Distinct features (per customer and in total), pages, newest events of all customers
+    __table_args__ = (Index("ix_feature_usage_customer_feature", "customer_id", "feature_id"),
+                      Index("ix_feature_usage_customer_timestamp", "customer_id", "timestamp"),
+                      Index("ix_feature_usage_feature", "feature_id"),
+                      Index("ix_feature_usage_timestamp", "timestamp"),
+                      # Retried events (same client event id) are inserted once
+                      Index("ix_feature_usage_customer_event_id", "customer_id", "event_id", unique=True))
 
     def to_dict(self):
         return {
             "id": self.id,
             "customer_id": self.customer_id,
+            "event_id": self.event_id,
             "feature_name": self.feature_name,
             "timestamp": self.timestamp.isoformat()
         }
@@ -60,16 +146,27 @@ class SupportTicket(db.Model):
     __tablename__ = "support_tickets"
     id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
-    status = Column(String, default="open")
+    event_id = Column(String(64), nullable=True)  # optional client-supplied id, see app/ingest.py
+    status_id = Column(Integer, ForeignKey("ticket_statuses.id"))
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     closed_at = Column(DateTime, nullable=True)
 
     customer = relationship("Customer", back_populates="tickets")
+    status_row = relationship("TicketStatus", lazy="joined")
+    status = LookupName(TicketStatus, "status_id", "status_row", default="open")
+
+    # Open tickets per customer, pages, newest tickets of all customers
+    __table_args__ = (Index("ix_support_tickets_customer_status", "customer_id", "status_id"),
+                      Index("ix_support_tickets_customer_created", "customer_id", "created_at"),
+                      Index("ix_support_tickets_created", "created_at"),
+                      # Retried events (same client event id) are inserted once
+                      Index("ix_support_tickets_customer_event_id", "customer_id", "event_id", unique=True))
 
     def to_dict(self):
         return {
             "id": self.id,
             "customer_id": self.customer_id,
+            "event_id": self.event_id,
             "status": self.status,
             "created_at": self.created_at.isoformat(),
             "closed_at": self.closed_at.isoformat() if self.closed_at else None
@@ -79,18 +176,29 @@ class Invoice(db.Model):
     __tablename__ = "invoices"
     id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
+    event_id = Column(String(64), nullable=True)  # optional client-supplied id, see app/ingest.py
     issued_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     due_date = Column(DateTime, nullable=False)
     paid_date = Column(DateTime, nullable=True)
     amount = Column(Float, nullable=False)
-    status = Column(String, default="unpaid")
+    status_id = Column(Integer, ForeignKey("invoice_statuses.id"))
 
     customer = relationship("Customer", back_populates="invoices")
+    status_row = relationship("InvoiceStatus", lazy="joined")
+    status = LookupName(InvoiceStatus, "status_id", "status_row", default="unpaid")
+
+    # Invoice counts by status per customer, pages, newest invoices of all customers
+    __table_args__ = (Index("ix_invoices_customer_status", "customer_id", "status_id"),
+                      Index("ix_invoices_customer_issued", "customer_id", "issued_at"),
+                      Index("ix_invoices_issued", "issued_at"),
+                      # Retried events (same client event id) are inserted once
+                      Index("ix_invoices_customer_event_id", "customer_id", "event_id", unique=True))
 
     def to_dict(self):
         return {
             "id": self.id,
             "customer_id": self.customer_id,
+            "event_id": self.event_id,
             "issued_at": self.issued_at.isoformat(),
             "due_date": self.due_date.isoformat(),
             "paid_date": self.paid_date.isoformat() if self.paid_date else None,
@@ -102,15 +210,129 @@ class ApiUsage(db.Model):
     __tablename__ = "api_usage"
     id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
+    event_id = Column(String(64), nullable=True)  # optional client-supplied id, see app/ingest.py
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    api_endpoint = Column(String, nullable=False)
+    endpoint_id = Column(Integer, ForeignKey("api_endpoints.id"), nullable=False)
 
     customer = relationship("Customer", back_populates="api_usage")
+    endpoint = relationship("ApiEndpoint", lazy="joined")
+    api_endpoint = LookupName(ApiEndpoint, "endpoint_id", "endpoint")
+
+    # Per-customer windowed counts and pages, newest calls of all customers
+    __table_args__ = (Index("ix_api_usage_customer_timestamp", "customer_id", "timestamp"),
+                      Index("ix_api_usage_timestamp", "timestamp"),
+                      # Retried events (same client event id) are inserted once
+                      Index("ix_api_usage_customer_event_id", "customer_id", "event_id", unique=True))
 
     def to_dict(self):
         return {
             "id": self.id,
             "customer_id": self.customer_id,
+            "event_id": self.event_id,
             "timestamp": self.timestamp.isoformat(),
             "api_endpoint": self.api_endpoint
-        }
\ No newline at end of file
+        }
+
+class Sketch(db.Model):
+    # HyperLogLog sketch (app/hll.py) of the distinct values of one kind (see app/sketches.py)
+    # seen on one day, for one customer or for all customers of the shard (customer_id NULL)
+    __tablename__ = "sketches"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True)
+    day = Column(Date, nullable=False)
+    registers = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (Index("ix_sketches_kind_customer_day", "kind", "customer_id", "day"),)
+
+class CustomerHealthScore(db.Model):
+    # Last computed health of every customer (see scoring.rescore), stored on the customer's shard
+    __tablename__ = "customer_health_scores"
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    segment = Column(String)
+    health_score = Column(Float, nullable=False)
+    logins = Column(Float, nullable=False)
+    feature_adoption = Column(Float, nullable=False)
+    support_tickets = Column(Float, nullable=False)
+    invoices = Column(Float, nullable=False)
+    api_usage = Column(Float, nullable=False)
+    scored_at = Column(DateTime, nullable=False)
+
+class SegmentHealth(db.Model):
+    # Per-segment aggregates of customer_health_scores over all shards, stored on shard 0
+    __tablename__ = "segment_health"
+    segment = Column(String, primary_key=True)
+    customers = Column(Integer, nullable=False)
+    at_risk = Column(Integer, nullable=False)
+    mean_health = Column(Float, nullable=False)
+    p10_health = Column(Float, nullable=False)
+    p25_health = Column(Float, nullable=False)
+    p50_health = Column(Float, nullable=False)
+    p75_health = Column(Float, nullable=False)
+    p90_health = Column(Float, nullable=False)
+    avg_logins = Column(Float, nullable=False)
+    avg_feature_adoption = Column(Float, nullable=False)
+    avg_support_tickets = Column(Float, nullable=False)
+    avg_invoices = Column(Float, nullable=False)
+    avg_api_usage = Column(Float, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "segment": self.segment,
+            "customers": self.customers,
+            "at_risk": self.at_risk,
+            "health_score": {
+                "mean": self.mean_health,
+                "p10": self.p10_health,
+                "p25": self.p25_health,
+                "p50": self.p50_health,
+                "p75": self.p75_health,
+                "p90": self.p90_health,
+            },
+            "scores": {
+                "logins": self.avg_logins,
+                "feature_adoption": self.avg_feature_adoption,
+                "support_tickets": self.avg_support_tickets,
+                "invoices": self.avg_invoices,
+                "api_usage": self.avg_api_usage,
+            },
+            "computed_at": self.computed_at.isoformat(),
+        }
+
+class Job(db.Model):
+    # Background job (see app/jobs.py): queued -> running -> succeeded/failed/cancelled, stored on shard 0
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    params = Column(Text, nullable=False, default="{}")  # JSON keyword arguments of the job function
+    status = Column(String, nullable=False, default="queued")
+    progress_done = Column(Integer, nullable=False, default=0)
+    progress_total = Column(Integer, nullable=True)
+    message = Column(String, nullable=True)
+    result = Column(Text, nullable=True)  # JSON return value
+    error = Column(Text, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    worker = Column(String, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # last sign of life while running
+
+    __table_args__ = (Index("ix_jobs_status_id", "status", "id"),)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": json.loads(self.params),
+            "status": self.status,
+            "progress": {"done": self.progress_done, "total": self.progress_total},
+            "message": self.message,
+            "result": json.loads(self.result) if self.result is not None else None,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
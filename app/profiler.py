@@ -0,0 +1,219 @@
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_TOKEN_SALT = "auditale-profile"
+
+
+class StackSampler:
+    # Samples the profiled thread's stack every `interval` seconds and counts
+    # identical stacks, which is the "collapsed stack" input of flamegraph.pl/speedscope
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.samples = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.samples.items():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    # Opt-in request profiling: a request is profiled when it carries a valid signed
+    # PROFILE_HEADER or gets picked by PROFILE_SAMPLE_RATE. Every capture is written to
+    # PROFILE_DIR as a profile file (pstats or collapsed stacks) plus a JSON file with
+    # route, timing, DB and template metadata; only PROFILE_MAX_FILES captures are kept.
+    def __init__(self, app=None):
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+        self.header = app.config.get("PROFILE_HEADER", "X-Auditale-Profile")
+        self.mode = app.config.get("PROFILE_MODE", "pstats")
+        self.directory = app.config.get("PROFILE_DIR")
+        self.max_files = app.config.get("PROFILE_MAX_FILES", 50)
+        self.token_max_age = app.config.get("PROFILE_TOKEN_MAX_AGE", 3600)
+        self._lock = threading.Lock()
+
+        app.before_request(self._start)
+        app.after_request(self._record_status)
+        # Teardown runs even when the view raises, which after_request doesn't
+        app.teardown_request(self._finish)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        app.extensions["profiler"] = self
+
+    def _serializer(self):
+        return URLSafeTimedSerializer(self.app.config["SECRET_KEY"], salt=PROFILE_TOKEN_SALT)
+
+    def make_token(self):
+        return self._serializer().dumps("profile")
+
+    def verify_token(self, token):
+        if not token or not self.app.config.get("SECRET_KEY"):
+            return False
+        try:
+            return self._serializer().loads(token, max_age=self.token_max_age) == "profile"
+        except BadSignature:
+            return False
+
+    def _trigger(self):
+        if self.verify_token(request.headers.get(self.header)):
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def _start(self):
+        if not self.directory or request.endpoint in (None, "static") or request.blueprint == "admin":
+            return
+        trigger = self._trigger()
+        if not trigger:
+            return
+
+        profiler = cProfile.Profile() if self.mode == "pstats" else StackSampler()
+        g._profile = {
+            "trigger": trigger,
+            "profiler": profiler,
+            "db_ms": 0.0,
+            "db_queries": 0,
+            "template_ms": 0.0,
+            "started": time.perf_counter(),
+        }
+        if self.mode == "pstats":
+            profiler.enable()
+        else:
+            profiler.start()
+
+    def _record_status(self, response):
+        if "_profile" in g:
+            g._profile["status"] = response.status_code
+        return response
+
+    def _finish(self, error=None):
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return
+
+        profiler = profile["profiler"]
+        if self.mode == "pstats":
+            profiler.disable()
+        else:
+            profiler.stop()
+        duration_ms = (time.perf_counter() - profile["started"]) * 1000
+
+        metadata = {
+            "route": request.url_rule.rule if request.url_rule else request.path,
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "status": profile.get("status", 500),
+            "error": type(error).__name__ if error else None,
+            "trigger": profile["trigger"],
+            "mode": self.mode,
+            "duration_ms": round(duration_ms, 2),
+            "db_ms": round(profile["db_ms"], 2),
+            "db_queries": profile["db_queries"],
+            "template_ms": round(profile["template_ms"], 2),
+            "captured_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._store(profiler, metadata)
+
+    def _store(self, profiler, metadata):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.time_ns()}-{metadata['endpoint'] or 'unknown'}-{os.getpid()}"
+        extension = "prof" if self.mode == "pstats" else "collapsed"
+        metadata["profile_file"] = f"{name}.{extension}"
+
+        if self.mode == "pstats":
+            profiler.dump_stats(os.path.join(self.directory, metadata["profile_file"]))
+        else:
+            profiler.dump(os.path.join(self.directory, metadata["profile_file"]))
+        with open(os.path.join(self.directory, f"{name}.json"), "w") as f:
+            json.dump(metadata, f)
+
+        with self._lock:
+            self._rotate()
+
+    def _rotate(self):
+        # Keep the newest max_files captures; file names start with a ns timestamp
+        captures = sorted(f for f in os.listdir(self.directory) if f.endswith(".json"))
+        for stale in captures[:max(len(captures) - self.max_files, 0)]:
+            metadata = self._read_metadata(stale)
+            for f in [stale, metadata.get("profile_file") if metadata else None]:
+                if f:
+                    try:
+                        os.remove(os.path.join(self.directory, f))
+                    except FileNotFoundError:
+                        pass
+
+    def _read_metadata(self, filename):
+        try:
+            with open(os.path.join(self.directory, filename)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def captures(self, limit=None):
+        # Captured requests, slowest first
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        captures = [self._read_metadata(f) for f in os.listdir(self.directory) if f.endswith(".json")]
+        captures = sorted((c for c in captures if c), key=lambda c: c["duration_ms"], reverse=True)
+        return captures[:limit] if limit else captures
+
+    def _template_started(self, sender, template, context, **extra):
+        if "_profile" in g:
+            g._profile.setdefault("template_stack", []).append(time.perf_counter())
+
+    def _template_finished(self, sender, template, context, **extra):
+        if "_profile" in g and g._profile.get("template_stack"):
+            g._profile["template_ms"] += (time.perf_counter() - g._profile["template_stack"].pop()) * 1000
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "_profile" in g:
+        conn.info.setdefault("_profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "_profile" in g and conn.info.get("_profile_query_start"):
+        g._profile["db_ms"] += (time.perf_counter() - conn.info["_profile_query_start"].pop()) * 1000
+        g._profile["db_queries"] += 1
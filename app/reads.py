@@ -0,0 +1,63 @@
+from collections import namedtuple
+from sqlalchemy import Date, DateTime, select
+from . import memo
+from .models import ApiUsage, Customer, FeatureUsage, Invoice, LoginEvent, SupportTicket, lookup_names
+
+# Read-only access without the ORM: Core selects of a model's columns mapped to immutable, slotted
+# namedtuples (no identity map, change tracking or relationship loaders). They have the same
+# attribute names as the models, so templates take either; as_dicts() serializes a batch of them.
+# Lookup id columns (e.g. feature_id) are read as the joined name (feature_name), like the models.
+
+
+def _columns(model):
+    # (field name, selected column) of every column of `model`, lookup ids replaced by their
+    # names, and the table to select them from (outer joined to the lookup tables)
+    by_key = {name.foreign_key: (attribute, name) for attribute, name in lookup_names(model).items()}
+    columns, source = [], model.__table__
+    for column in model.__table__.columns:
+        if column.key in by_key:
+            attribute, name = by_key[column.key]
+            lookup = name.lookup.__table__.alias(attribute)
+            source = source.outerjoin(lookup, lookup.c.id == column)
+            columns.append((attribute, lookup.c.name.label(attribute)))
+        else:
+            columns.append((column.key, column))
+    return columns, source
+
+def _row_type(model):
+    columns, _ = _columns(model)
+    row_type = namedtuple(f"{model.__name__}Row", [key for key, _ in columns])
+    # Positions of the date/time fields, ISO-formatted by as_dicts()
+    row_type.temporal = tuple(i for i, (_, column) in enumerate(columns) if isinstance(column.type, (Date, DateTime)))
+    return row_type
+
+ROW_TYPES = {model: _row_type(model) for model in (Customer, LoginEvent, FeatureUsage, SupportTicket, Invoice, ApiUsage)}
+
+
+def select_rows(model):
+    # Statement selecting every column of `model`, to pass to rows()
+    columns, source = _columns(model)
+    return select(*(column for _, column in columns)).select_from(source)
+
+def rows(model, result):
+    # Core result rows (of select_rows(model)) as the model's row type
+    make = ROW_TYPES[model]._make
+    return [make(row) for row in result]
+
+def fetch(session, model, statement=None):
+    # Rows of `statement` (a select_rows(model) with criteria, every row of the table by default)
+    return rows(model, memo.execute(session, select_rows(model) if statement is None else statement))
+
+def first(session, model, statement):
+    found = fetch(session, model, statement.limit(1))
+    return found[0] if found else None
+
+def as_dicts(records):
+    # Rows of one type as dicts (same shape as the models' to_dict()), converting column by column
+    if not records:
+        return []
+    fields = records[0]._fields
+    columns = list(zip(*records))
+    for i in records[0].temporal:
+        columns[i] = [value.isoformat() if value is not None else None for value in columns[i]]
+    return [dict(zip(fields, values)) for values in zip(*columns)]
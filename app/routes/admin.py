@@ -0,0 +1,32 @@
+from flask import Blueprint, abort, current_app, render_template, request, send_from_directory
+
+admin_bp = Blueprint('admin', __name__)
+
+def is_admin_request():
+    # Admin pages are open to the test suite (TESTING), otherwise they need a valid profile token,
+    # also in development: FLASK_ENV defaults to "development"
+    if current_app.config.get('TESTING'):
+        return True
+    profiler = current_app.extensions["profiler"]
+    return profiler.verify_token(request.headers.get(profiler.header) or request.args.get("token"))
+
+@admin_bp.before_request
+def require_admin():
+    if not is_admin_request():
+        abort(403)
+
+@admin_bp.route("/admin/profiles", methods=["GET"])
+def list_profiles():
+    profiler = current_app.extensions["profiler"]
+    return render_template(
+        "admin_profiles.html",
+        profiles=profiler.captures(limit=request.args.get("limit", 50, type=int)),
+        sample_rate=profiler.sample_rate,
+        mode=profiler.mode,
+        token=request.args.get("token"),
+    )
+
+@admin_bp.route("/admin/profiles/<path:filename>", methods=["GET"])
+def download_profile(filename):
+    profiler = current_app.extensions["profiler"]
+    return send_from_directory(profiler.directory, filename, as_attachment=True)
@@ -1,7 +1,10 @@
+import asyncio
 from functools import wraps
+from itertools import chain
 from flask import Blueprint, current_app, flash, make_response, redirect, request, jsonify, render_template, url_for
-from sqlalchemy import desc, func
-from app.constants import Constants
+from sqlalchemy import desc, func, select
+from app import cache, counters, ingest, reads, scoring, search, sketches, timeline, weights
+from app.async_db import scalar_of, rows_of
 from ..models import ApiUsage, FeatureUsage, Invoice, LoginEvent, SupportTicket, Customer
 from datetime import datetime, timedelta, timezone
 
@@ -19,41 +22,63 @@ def list_customers():
     if sort_by not in ["name", "health_score"]:
         sort_by = "name"
     
-    with current_app.db_manager.get_read_session() as session:
-        customers = session.query(Customer).all()
+    # Feature adoption is relative to the features used across every shard
+    total_features = scoring.global_total_features(current_app.db_manager)
+
+    def shard_customers_with_health(session):
+        customers = reads.fetch(session, Customer)
 
         customers_with_health = []
 
         for c in customers:
-            score = calculate_customer_health(session, c.id).get("health_score", 0)
+            score = calculate_customer_health(session, c.id, total_features).get("health_score", 0)
 
             customers_with_health.append({
-                **c.to_dict(),
+                **c._asdict(),
                 "health_score": score
             })
-        
-        if sort_by == "health_score":
-            customers_with_health.sort(key=lambda x: x["health_score"], reverse=(order=="desc"))
-        else:
-            customers_with_health.sort(key=lambda x: x["name"].lower(), reverse=(order=="desc"))
-
-        start = (customers_page - 1) * per_page
-        end = start + per_page
-        paginated_customers_with_health = customers_with_health[start:end]
-        total_pages = (len(customers_with_health) + per_page - 1) // per_page
-
-        return render_template(
-            "customers_list.html",
-            total_customers=len(customers),
-            avg_health=round(sum(c['health_score'] for c in customers_with_health) / len(customers_with_health), 2) if customers_with_health else 0,
-            customers=paginated_customers_with_health,
-            page=customers_page,
-            total_pages=total_pages,
-            sort_by=sort_by,
-            order=order,
-            constants=Constants
-        )
-        
+        return customers_with_health
+
+    customers_with_health = list(chain.from_iterable(
+        current_app.db_manager.scatter_gather(shard_customers_with_health)))
+
+    if sort_by == "health_score":
+        customers_with_health.sort(key=lambda x: x["health_score"], reverse=(order=="desc"))
+    else:
+        customers_with_health.sort(key=lambda x: x["name"].lower(), reverse=(order=="desc"))
+
+    start = (customers_page - 1) * per_page
+    end = start + per_page
+    paginated_customers_with_health = customers_with_health[start:end]
+    total_pages = (len(customers_with_health) + per_page - 1) // per_page
+
+    return render_template(
+        "customers_list.html",
+        total_customers=len(customers_with_health),
+        avg_health=round(sum(c['health_score'] for c in customers_with_health) / len(customers_with_health), 2) if customers_with_health else 0,
+        customers=paginated_customers_with_health,
+        page=customers_page,
+        total_pages=total_pages,
+        sort_by=sort_by,
+        order=order,
+        constants=weights.current()
+    )
+    
+@customer_bp.route('/customers/search', methods=['GET'])
+def search_customers():
+    # Ranked name matches with their stored health scores (see app/search.py)
+    query = request.args.get("q", "").strip()
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    if not query:
+        return jsonify({"message": "Missing search query (q)"}), 400
+    return jsonify({
+        "query": query,
+        "results": search.search_customers(current_app.db_manager, query, limit),
+    }), 200
+
+def event_count(session, model, customer_id):
+    return session.execute(select(func.count(model.id)).where(model.customer_id == customer_id)).scalar()
+
 @customer_bp.route('/customers/<int:customer_id>', methods=['GET'])
 def get_customer(customer_id):
     logins_page = request.args.get('logins_page', 1, type=int)
@@ -62,70 +87,61 @@ def get_customer(customer_id):
     api_page = request.args.get('api_page', 1, type=int)
     feature_page = request.args.get('feature_page', 1, type=int)
     per_page = 5  # items per page
+    total_feature_names = scoring.global_total_features(current_app.db_manager)
 
-    with current_app.db_manager.get_read_session() as session:
-        customer = session.query(Customer).filter_by(id=customer_id).first()
+    with current_app.db_manager.get_read_session(customer_id) as session:
+        customer = reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == customer_id))
         if not customer:
             return render_template("customer.html", customer=None, health=None), 404
         
         # Paginate logins
-        logins = (
-            session.query(LoginEvent)
-            .filter_by(customer_id=customer_id)
+        logins = reads.fetch(session, LoginEvent, reads.select_rows(LoginEvent)
+            .where(LoginEvent.customer_id == customer_id)
             .order_by(LoginEvent.timestamp.desc())
             .offset((api_page - 1) * per_page)
             .limit(per_page)
-            .all()
         )
-        total_logins = session.query(LoginEvent).filter_by(customer_id=customer_id).count()
+        total_logins = event_count(session, LoginEvent, customer_id)
 
         # Paginate invoices
-        invoices = (
-            session.query(Invoice)
-            .filter_by(customer_id=customer_id)
+        invoices = reads.fetch(session, Invoice, reads.select_rows(Invoice)
+            .where(Invoice.customer_id == customer_id)
             .order_by(Invoice.issued_at.desc())
             .offset((invoice_page - 1) * per_page)
             .limit(per_page)
-            .all()
         )
 
-        total_invoices = session.query(Invoice).filter_by(customer_id=customer_id).count()
+        total_invoices = event_count(session, Invoice, customer_id)
         
         # Paginate tickets
-        tickets = (
-            session.query(SupportTicket)
-            .filter_by(customer_id=customer_id)
+        tickets = reads.fetch(session, SupportTicket, reads.select_rows(SupportTicket)
+            .where(SupportTicket.customer_id == customer_id)
             .order_by(SupportTicket.created_at.desc())
             .offset((ticket_page - 1) * per_page)
             .limit(per_page)
-            .all()
         )
-        total_tickets = session.query(SupportTicket).filter_by(customer_id=customer_id).count()
+        total_tickets = event_count(session, SupportTicket, customer_id)
 
         # Paginate API calls
-        apis = (
-            session.query(ApiUsage)
-            .filter_by(customer_id=customer_id)
+        apis = reads.fetch(session, ApiUsage, reads.select_rows(ApiUsage)
+            .where(ApiUsage.customer_id == customer_id)
             .order_by(ApiUsage.timestamp.desc())
             .offset((api_page - 1) * per_page)
             .limit(per_page)
-            .all()
         )
-        total_apis = session.query(ApiUsage).filter_by(customer_id=customer_id).count()
+        total_apis = event_count(session, ApiUsage, customer_id)
         
         # Paginate feature usages
-        features = (
-            session.query(FeatureUsage)
-            .filter_by(customer_id=customer_id)
+        features = reads.fetch(session, FeatureUsage, reads.select_rows(FeatureUsage)
+            .where(FeatureUsage.customer_id == customer_id)
             .order_by(FeatureUsage.timestamp.desc())
             .offset((api_page - 1) * per_page)
             .limit(per_page)
-            .all()
         )
-        total_features = session.query(FeatureUsage).filter_by(customer_id=customer_id).count()
+        total_features = event_count(session, FeatureUsage, customer_id)
 
         # Calculate health
-        health_details = calculate_customer_health(session, customer_id)
+        health_details = calculate_customer_health(session, customer_id, total_feature_names)
 
         return render_template("customer.html", 
                                customer=customer,
@@ -147,103 +163,146 @@ def get_customer(customer_id):
                                total_features=total_features,
                                health=health_details), 200
 
-def calculate_login_score(session, customer_id, last_30d):
-    login_count = session.query(func.count(LoginEvent.id)) \
-                                .filter(LoginEvent.customer_id == customer_id,
-                                        LoginEvent.timestamp >= last_30d).scalar() or 0
-    return min(login_count * 10, 100)  # 10 logins or more == maximum points
-
-def calculate_feature_adoption_score(session, customer_id):
-    total_features = session.query(func.count(func.distinct(FeatureUsage.feature_name))).scalar() or 0
-
-    features_used = session.query(func.count(func.distinct(FeatureUsage.feature_name))) \
-                                 .filter(FeatureUsage.customer_id == customer_id).scalar() or 0
-    adoption_rate = features_used / total_features if total_features > 0 else 0
-    return min(int(adoption_rate * 100), 100)
-
-def calculate_tickets_score(session, customer_id):
-    open_tickets = session.query(func.count(SupportTicket.id)) \
-                                .filter(SupportTicket.customer_id == customer_id,
-                                        SupportTicket.status == "open").scalar() or 0
-    return max(100 - (open_tickets * 10), 0)  # 10 open tickets or more == minimum points
-
-def calculate_invoice_score(session, customer_id):
-    customer_invoices = session.query(Invoice).filter(Invoice.customer_id==customer_id).all()
-    if customer_invoices:
-        unpaid_or_late_invoices = [
-                invoice for invoice in customer_invoices if (invoice.status == 'unpaid' or (invoice.due_date and invoice.due_date > invoice.due_date))
-            ]
-        return int(((len(customer_invoices) - len(unpaid_or_late_invoices)) / len(customer_invoices)) * 100)  # unpaid or late invoices or more reduce points
-    else:
-        return 100
-
-def calculate_api_usage_score(session, customer_id, last_30d):
-    api_calls = session.query(func.count(ApiUsage.api_endpoint)) \
-                                .filter(ApiUsage.customer_id == customer_id,
-                                        ApiUsage.timestamp >= last_30d).scalar() or 0
-    return min(api_calls, 100)  # 100+ calls == maximum points
-
-def calculate_customer_health(session, customer_id):
-    customer = session.query(Customer).filter_by(id=customer_id).first()
-    if not customer:
-        return None
-    
+@customer_bp.route('/customers/<int:customer_id>/async', methods=['GET'])
+async def get_customer_async(customer_id):
+    # Same page as get_customer(), with every page, count and health query fanned out concurrently
+    pages = {
+        "logins": (LoginEvent, LoginEvent.timestamp, request.args.get('logins_page', 1, type=int)),
+        "invoices": (Invoice, Invoice.issued_at, request.args.get('invoice_page', 1, type=int)),
+        "tickets": (SupportTicket, SupportTicket.created_at, request.args.get('ticket_page', 1, type=int)),
+        "apis": (ApiUsage, ApiUsage.timestamp, request.args.get('api_page', 1, type=int)),
+        "features": (FeatureUsage, FeatureUsage.timestamp, request.args.get('feature_page', 1, type=int)),
+    }
+    per_page = 5  # items per page
     now = datetime.now()
-    last_30d = now - timedelta(days=30)
-
-    # Login frequency (last 30 days)
-    login_score = calculate_login_score(session, customer_id, last_30d)
-
-    # Feature adoption (unique features used / total features)
-    adoption_score = calculate_feature_adoption_score(session, customer_id)
-
-    # Support tickets (penalty for open tickets)
-    ticket_score = calculate_tickets_score(session, customer_id)
-
-    # Invoice payments (check paid and in time)
-    invoice_score = calculate_invoice_score(session, customer_id)
-
-    # API usage trends (last 30 days)
-    api_score = calculate_api_usage_score(session, customer_id, last_30d)
-
-    # Final weighted score
-    health_score = (
-        login_score * Constants.LOGIN_WEIGHT +
-        adoption_score * Constants.FEATURE_ADOPTION_WEIGHT +
-        ticket_score * Constants.SUPPORT_TICKET_WEIGHT +
-        invoice_score * Constants.INVOICE_WEIGHT +
-        api_score * Constants.API_USAGE_WEIGHT
+    component_statements = scoring.component_statements(now, [customer_id])
+
+    async_db_manager = current_app.async_db_manager
+    # The feature total is global: its rows come from every shard, concurrently with the page's
+    customer_reads = async_db_manager.gather_reads(
+        rows_of(reads.select_rows(Customer).filter_by(id=customer_id)),
+        *[rows_of(reads.select_rows(model).where(model.customer_id == customer_id).order_by(column.desc())
+                  .offset((page - 1) * per_page).limit(per_page))
+          for model, column, page in pages.values()],
+        *[scalar_of(select(func.count(model.id)).filter_by(customer_id=customer_id))
+          for model, _, _ in pages.values()],
+        *[rows_of(stmt) for stmt in component_statements.values()],
+        shard=async_db_manager.shard_for(customer_id),
     )
+    results, feature_rows = await asyncio.gather(
+        customer_reads, async_db_manager.gather_shards(rows_of(scoring.total_features_rows_statement())))
+    customer = reads.rows(Customer, results[0])[0] if results[0] else None
+    if not customer:
+        return render_template("customer.html", customer=None, health=None), 404
+
+    events = {key: reads.rows(model, rows) for (key, (model, _, _)), rows in zip(pages.items(), results[1:6])}
+    totals = dict(zip(pages, results[6:11]))
+    health = scoring.health_from_counts([customer_id], dict(zip(component_statements, results[11:])),
+                                        scoring.total_features_of(rows for (rows,) in feature_rows), now)
+
+    return render_template("customer.html",
+                           customer=customer,
+                           **events,
+                           logins_page=pages["logins"][2],
+                           invoice_page=pages["invoices"][2],
+                           ticket_page=pages["tickets"][2],
+                           api_page=pages["apis"][2],
+                           feature_page=pages["features"][2],
+                           per_page=per_page,
+                           total_logins=totals["logins"],
+                           total_invoices=totals["invoices"],
+                           total_tickets=totals["tickets"],
+                           total_apis=totals["apis"],
+                           total_features=totals["features"],
+                           health=health[customer_id]), 200
+
+def health_cache_key(session, customer_id, total_features=None):
+    # Health depends on the customer's events (tagged, see record_customer_event) and the weights
+    return customer_id, total_features, sorted(vars(weights.current()).items())
+
+@cache.memoize(key=health_cache_key, tags=lambda session, customer_id, total_features=None: [f"customer:{customer_id}"])
+def calculate_customer_health(session, customer_id, total_features=None):
+    # total_features: distinct features across all shards (see scoring.global_total_features),
+    # counted on this session's database when None
+    customer = reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == customer_id))
+    if not customer:
+        return None
 
-    return {
-        "customer_id": customer_id,
-        "scores": {
-            "logins": login_score,
-            "feature_adoption": adoption_score,
-            "support_tickets": ticket_score,
-            "invoices": invoice_score,
-            "api_usage": api_score,
-        },
-        "health_score": round(health_score, 2)
-    }
+    # Every scoring window (scoring.WINDOWS) with one grouped query per event table
+    return scoring.bulk_customer_health(session, [customer_id], datetime.now(), total_features)[customer_id]
 
 @customer_bp.route('/customers/<int:customer_id>/health', methods=['GET'])
 def get_customer_health(customer_id):
     if request.method == 'GET':
-        with current_app.db_manager.get_read_session() as session:
-            customer = session.query(Customer).filter_by(id=customer_id).first()
+        with current_app.db_manager.get_read_session(customer_id) as session:
+            customer = reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == customer_id))
         
         if not customer:
             return render_template("customer.html", customer=None, health=None), 404
 
-        customer_dict = customer.to_dict()
+        customer_dict = customer._asdict()
         
         # Calculate health
-        health = calculate_customer_health(session, customer_id)
+        health = calculate_customer_health(session, customer_id, scoring.global_total_features(current_app.db_manager))
         customer_dict['health'] = health if health else None
 
         return render_template("customer_health.html", customer=customer_dict, health=health), 200
 
+@customer_bp.route('/api/customers/<int:customer_id>/health', methods=['GET'])
+def get_customer_health_json(customer_id):
+    # Health of every scoring window, e.g. {"health_score": .., "scores": {..}, "windows": {"7d": {..}, ..}}
+    with current_app.db_manager.get_read_session(customer_id) as session:
+        health = calculate_customer_health(session, customer_id, scoring.global_total_features(current_app.db_manager))
+    if not health:
+        return jsonify({"message": "Customer does not exist"}), 404
+    return jsonify(health), 200
+
+@customer_bp.route('/api/customers/<int:customer_id>/diversity', methods=['GET'])
+def get_customer_diversity(customer_id):
+    # Distinct features and API endpoints used in the last `days` days (whole days, from sketches)
+    days = request.args.get("days", 30, type=int)
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    with current_app.db_manager.get_read_session(customer_id) as session:
+        if not reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == customer_id)):
+            return jsonify({"message": "Customer does not exist"}), 404
+        return jsonify({
+            "customer_id": customer_id,
+            "days": days,
+            "features": sketches.distinct_count(session, "feature", customer_id, since),
+            "api_endpoints": sketches.distinct_count(session, "api_endpoint", customer_id, since),
+        }), 200
+
+@customer_bp.route('/api/customers/<int:customer_id>/timeline', methods=['GET'])
+def get_customer_timeline(customer_id):
+    # Event counts per day/week/month, e.g. ?metric=logins&bucket=day&from=2024-01-01&to=2024-02-01
+    metric = request.args.get("metric", "logins")
+    bucket = request.args.get("bucket", "day")
+    if metric not in timeline.METRICS:
+        return jsonify({"message": f"Unknown metric, one of: {', '.join(timeline.METRICS)}"}), 400
+    if bucket not in timeline.DEFAULT_SPANS:
+        return jsonify({"message": f"Unknown bucket, one of: {', '.join(timeline.DEFAULT_SPANS)}"}), 400
+    try:
+        end = parse_iso_datetime(request.args.get("to")) or datetime.now()
+        start = parse_iso_datetime(request.args.get("from")) or end - timeline.DEFAULT_SPANS[bucket]
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if start >= end:
+        return jsonify({"message": "from must be before to"}), 400
+    if len(timeline.buckets(start, end, bucket)) > timeline.MAX_BUCKETS:
+        return jsonify({"message": f"At most {timeline.MAX_BUCKETS} buckets, use a larger bucket"}), 400
+
+    with current_app.db_manager.get_read_session(customer_id) as session:
+        if not reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == customer_id)):
+            return jsonify({"message": "Customer does not exist"}), 404
+        days, counts = timeline.timeline(session, customer_id, metric, bucket, start, end)
+    return jsonify({
+        "customer_id": customer_id,
+        "metric": metric,
+        "bucket": bucket,
+        "start": days[0].isoformat(),  # counts[i] is the bucket i buckets after start
+        "counts": counts,
+    }), 200
+
 def parse_iso_datetime(date_str):
     if not date_str:
         return None
@@ -254,154 +313,225 @@ def parse_iso_datetime(date_str):
 
 @customer_bp.route("/customers/<int:customer_id>/events/new", methods=['GET'])
 def new_customer_event(customer_id):
-    with current_app.db_manager.get_read_session() as session:
-        customer = session.query(Customer).filter_by(id=customer_id).first()
+    with current_app.db_manager.get_read_session(customer_id) as session:
+        customer = reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == customer_id))
         if not customer:
             return jsonify({"message": "Customer does not exist"}), 404
         return render_template("new_customer_event.html", customer=customer)
 
-@customer_bp.route('/customers/<int:customer_id>/events', methods=['POST'])
-def record_customer_event(customer_id):
-    with current_app.db_manager.get_write_session() as session:
-        customer = session.query(Customer).filter_by(id=customer_id).first()
-        if not customer:
-            flash("Customer does not exist.", "danger")
-            return redirect(url_for("dashboard.dashboard"))
-        
-        if request.is_json:
-            payload = request.get_json()
-        else:
-            # Convert form data into dict (like JSON shape you expect)
-            payload = request.form.to_dict()
-        
-        event_type = payload.get("event_type")
+# Ingested event types -> model
+EVENT_MODELS = {
+    "login": LoginEvent,
+    "feature": FeatureUsage,
+    "ticket": SupportTicket,
+    "invoice": Invoice,
+    "api": ApiUsage,
+}
+
+
+class InvalidEvent(Exception):
+    pass
+
+
+def event_row(customer_id, payload):
+    # (event type, row dict to insert) of an event payload. Raises InvalidEvent with the message
+    # for the client, or ValueError for unparsable values. Rows of a type always have the same keys.
+    event_type = payload.get("event_type")
+    if not event_type:
+        raise InvalidEvent("Event type is required.")
+    event_id = payload.get("event_id") or None
+    if event_id is not None and (not isinstance(event_id, str) or len(event_id) > 64):
+        raise InvalidEvent("event_id must be a string of at most 64 characters.")
+    row = {"customer_id": customer_id, "event_id": event_id}
+
+    # Login Event
+    if event_type == "login":
+        ts = payload.get("timestamp")
+        if not ts:
+            raise InvalidEvent("Timestamp is required for login event.")
+
+        timestamp = parse_iso_datetime(ts)
+        if timestamp > datetime.now():
+            raise InvalidEvent("Timestamp cannot be in the future.")
+        row["timestamp"] = timestamp
+
+    # Feature Usage Event
+    elif event_type == "feature":
+        fname = payload.get("feature_name")
+        ts = payload.get("timestamp")
+        if not fname or not ts:
+            raise InvalidEvent("Feature name and timestamp are required for feature event.")
+
+        timestamp = parse_iso_datetime(ts)
+
+        if timestamp > datetime.now():
+            raise InvalidEvent("Timestamp cannot be in the future.")
+        row.update(feature_name=fname, timestamp=timestamp)
+
+    # Support Ticket Event
+    elif event_type == "ticket":
+        created_at = payload.get("created_at")
+        closed_at = payload.get("closed_at")
+        if not created_at:
+            raise InvalidEvent("created_at is required for ticket event.")
+
+        created_dt = parse_iso_datetime(created_at)
+        closed_dt = parse_iso_datetime(closed_at) if closed_at else None
+
+        if closed_dt and closed_dt < created_dt:
+            raise InvalidEvent("closed_at cannot be before created_at.")
 
-        if not event_type:
-            flash("Event type is required.", "danger")
-            return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
+        if created_dt > datetime.now() or (closed_dt and closed_dt > datetime.now()):
+            raise InvalidEvent("created_at or closed_at cannot be in the future.")
+
+        row.update(status=payload.get("status", "open"), created_at=created_dt, closed_at=closed_dt)
+
+    # Invoice Event
+    elif event_type == "invoice":
+        required_fields = ["issued_at", "due_date", "amount"]
+        missing = [f for f in required_fields if f not in payload or payload[f] in [None, ""]]
+
+        if missing:
+            raise InvalidEvent(f"Missing required fields for invoice event: {', '.join(missing)}")
+
+        issued_at = parse_iso_datetime(payload.get("issued_at"))
+        due_date = parse_iso_datetime(payload.get("due_date"))
+
+        if issued_at > datetime.now():
+            raise InvalidEvent("issued_at cannot be in the future.")
+
+        if payload["due_date"] < payload["issued_at"]:
+            raise InvalidEvent("due_date cannot be before issued_at.")
 
         try:
-            # Login Event
-            if event_type == "login":
-                ts = payload.get("timestamp")
-                if not ts:
-                    flash("Timestamp is required for login event.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                
-                timestamp = parse_iso_datetime(ts)
-                if timestamp > datetime.now():
-                    flash("Timestamp cannot be in the future.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                event = LoginEvent(customer_id=customer.id, timestamp=timestamp)
-            
-            # Feature Usage Event
-            elif event_type == "feature":
-                fname = payload.get("feature_name")
-                ts = payload.get("timestamp")
-                if not fname or not ts:
-                    flash("Feature name and timestamp are required for feature event.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                
-                timestamp = parse_iso_datetime(ts)
-
-                if timestamp > datetime.now():
-                    flash("Timestamp cannot be in the future.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                
-                event = FeatureUsage(customer_id=customer.id, feature_name=fname, timestamp=timestamp)
-            
-            # Support Ticket Event
-            elif event_type == "ticket":
-                created_at = payload.get("created_at")
-                closed_at = payload.get("closed_at")
-                if not created_at:
-                    flash("created_at is required for ticket event.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-
-                created_dt = parse_iso_datetime(created_at)
-                closed_dt = parse_iso_datetime(closed_at) if closed_at else None
-                
-                if closed_dt and closed_dt < created_dt:
-                    flash("closed_at cannot be before created_at.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-
-                if created_dt > datetime.now() or (closed_dt and closed_dt > datetime.now()):
-                    flash("created_at or closed_at cannot be in the future.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-
-                event = SupportTicket(
-                    customer_id=customer.id,
-                    status=payload.get("status", "open"),
-                    created_at=created_dt,
-                    closed_at=closed_dt
-                )
-
-            # Invoice Event
-            elif event_type == "invoice":
-                required_fields = ["issued_at", "due_date", "amount"]
-                missing = [f for f in required_fields if f not in payload or payload[f] in [None, ""]]
-                
-                if missing:
-                    flash(f"Missing required fields for invoice event: {', '.join(missing)}", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                
-                issued_at = parse_iso_datetime(payload.get("issued_at"))
-                due_date = parse_iso_datetime(payload.get("due_date"))
-
-                if issued_at > datetime.now():
-                    flash("issued_at cannot be in the future.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                
-                if payload["due_date"] < payload["issued_at"]:
-                    flash("due_date cannot be before issued_at.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-
-                try:
-                    amount = float(payload["amount"])
-                    if amount < 0:
-                        flash("Amount must be positive", "danger")
-                        return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                except ValueError:
-                    flash("Amount must be a valid number.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-
-                event = Invoice(
-                    customer_id=customer.id,
-                    issued_at=issued_at,
-                    due_date=due_date,
-                    amount=amount,
-                    status=payload.get("status", "unpaid"),
-                    paid_date=parse_iso_datetime(payload.get("paid_date"))
-                )
-            
-            # API Usage Event
-            elif event_type == "api":
-                endpoint = payload.get("endpoint")
-                ts = payload.get("timestamp")
-                if not endpoint or not ts:
-                    flash("Endpoint and timestamp are required for API event.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                
-                if ts > datetime.now().isoformat():
-                    flash("Timestamp cannot be in the future.", "danger")
-                    return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-                
-                timestamp = parse_iso_datetime(ts)
-                event = ApiUsage(customer_id=customer.id, api_endpoint=endpoint, timestamp=timestamp)
-            else:
-                flash(f"Unknown event type: {event_type}", "danger")
-                return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-            
-            session.add(event)
-            session.commit()
+            amount = float(payload["amount"])
+        except ValueError:
+            raise InvalidEvent("Amount must be a valid number.")
+        if amount < 0:
+            raise InvalidEvent("Amount must be positive")
+
+        row.update(issued_at=issued_at, due_date=due_date, amount=amount, status=payload.get("status", "unpaid"),
+                   paid_date=parse_iso_datetime(payload.get("paid_date")))
+
+    # API Usage Event
+    elif event_type == "api":
+        endpoint = payload.get("endpoint")
+        ts = payload.get("timestamp")
+        if not endpoint or not ts:
+            raise InvalidEvent("Endpoint and timestamp are required for API event.")
+
+        if ts > datetime.now().isoformat():
+            raise InvalidEvent("Timestamp cannot be in the future.")
+
+        row.update(api_endpoint=endpoint, timestamp=parse_iso_datetime(ts))
+    else:
+        raise InvalidEvent(f"Unknown event type: {event_type}")
+    return event_type, row
+
+def after_events_recorded(recorded):
+    # Window counters and cached results of committed (event type, row) pairs
+    for event_type, row in recorded:
+        if event_type in counters.KINDS:
+            counters.record(row["customer_id"], event_type, row[counters.KINDS[event_type][1].key])
+    if recorded:
+        cache.invalidate(*{f"customer:{row['customer_id']}" for _, row in recorded}, "latest_actions")
+
+@customer_bp.route('/customers/<int:customer_id>/events', methods=['POST'])
+def record_customer_event(customer_id):
+    # Events with an event_id already recorded for the customer (client retries) are ignored
+    if request.is_json:
+        payload = request.get_json()
+    else:
+        # Convert form data into dict (like JSON shape you expect)
+        payload = request.form.to_dict()
+
+    try:
+        with current_app.db_manager.get_write_session(customer_id) as session:
+            customer = session.execute(select(Customer.id).where(Customer.id == customer_id)).first()
+            if not customer:
+                flash("Customer does not exist.", "danger")
+                return redirect(url_for("dashboard.dashboard"))
+
+            event_type, row = event_row(customer_id, payload)
+            inserted = ingest.insert_events(session, EVENT_MODELS[event_type], [row])
+        after_events_recorded([(event_type, r) for r in inserted])
+        if inserted:
             flash(f"{event_type.capitalize()} event recorded successfully.", "success")
-            return redirect(url_for("customers.get_customer", customer_id=customer_id))
-        except KeyError as e:
-            flash(f"Missing required field: {str(e)}", "danger")
-            return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
-        except ValueError as e:
-            flash(f"Invalid data format: {str(e)}", "danger")
-            return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
+        else:
+            flash(f"{event_type.capitalize()} event already recorded.", "info")
+        return redirect(url_for("customers.get_customer", customer_id=customer_id))
+    except InvalidEvent as e:
+        flash(str(e), "danger")
+        return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
+    except KeyError as e:
+        flash(f"Missing required field: {str(e)}", "danger")
+        return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
+    except ValueError as e:
+        flash(f"Invalid data format: {str(e)}", "danger")
+        return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
+    except Exception as e:
+        flash(f"An error occurred: {str(e)}", "danger")
+        return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
+
+@customer_bp.route('/api/events/batch', methods=['POST'])
+def record_events_batch():
+    # Body: {"events": [{"customer_id": .., "event_type": .., "event_id": .., ...}, ...]}. Every event
+    # is validated first: when one is invalid nothing is recorded and the errors are returned. Valid
+    # batches are recorded in one transaction per shard, so a failing shard doesn't undo the others:
+    # "shards" reports each one, with the batch indexes of the events it didn't record. Events whose
+    # event_id is already recorded are counted as duplicates, so a partly recorded batch can be re-sent.
+    payload = request.get_json(silent=True)
+    events = payload.get("events") if isinstance(payload, dict) else None
+    if not isinstance(events, list) or not events:
+        return jsonify({"message": "events must be a non-empty list"}), 400
+    max_events = current_app.config.get("INGEST_BATCH_MAX", 1000)
+    if len(events) > max_events:
+        return jsonify({"message": f"At most {max_events} events per batch"}), 400
+
+    db_manager = current_app.db_manager
+    parsed, errors = [], []
+    for index, event in enumerate(events):
+        try:
+            if not isinstance(event, dict):
+                raise InvalidEvent("Event must be an object.")
+            customer_id = event.get("customer_id")
+            if isinstance(customer_id, bool) or not isinstance(customer_id, int):
+                raise InvalidEvent("customer_id must be an integer.")
+            parsed.append((index, *event_row(customer_id, event)))
+        except (InvalidEvent, ValueError) as e:
+            errors.append({"index": index, "message": str(e)})
+
+    by_shard = {}
+    for index, event_type, row in parsed:
+        by_shard.setdefault(db_manager.shard_for(row["customer_id"]).index, []).append((index, event_type, row))
+    if not errors:
+        for shard, shard_events in by_shard.items():
+            with db_manager.get_read_session(shard=shard) as session:
+                existing = set(session.execute(select(Customer.id).where(
+                    Customer.id.in_({row["customer_id"] for _, _, row in shard_events}))).scalars())
+            errors.extend({"index": index, "message": f"Customer {row['customer_id']} does not exist"}
+                          for index, _, row in shard_events if row["customer_id"] not in existing)
+    if errors:
+        errors.sort(key=lambda error: error["index"])
+        return jsonify({"message": "Invalid events, none recorded", "errors": errors}), 400
+
+    recorded, shards = [], []
+    for shard, shard_events in sorted(by_shard.items()):
+        try:
+            shard_recorded = []
+            with db_manager.get_write_session(shard=shard) as session:
+                for event_type, model in EVENT_MODELS.items():
+                    rows = [row for _, t, row in shard_events if t == event_type]
+                    shard_recorded.extend((event_type, row) for row in ingest.insert_events(session, model, rows))
         except Exception as e:
-            flash(f"An error occurred: {str(e)}", "danger")
-            return redirect(url_for("customers.new_customer_event", customer_id=customer_id))
\ No newline at end of file
+            current_app.logger.exception("Events of shard %s not recorded", shard)
+            shards.append({"shard": shard, "status": "failed", "events": len(shard_events), "message": str(e),
+                           "indexes": [index for index, _, _ in shard_events]})
+            continue
+        recorded.extend(shard_recorded)
+        shards.append({"shard": shard, "status": "recorded", "events": len(shard_events)})
+    after_events_recorded(recorded)
+    failed = sum(shard["events"] for shard in shards if shard["status"] == "failed")
+    return jsonify({"received": len(events), "inserted": len(recorded),
+                    "duplicates": len(events) - failed - len(recorded), "failed": failed,
+                    "shards": shards}), 500 if failed else 200
\ No newline at end of file
@@ -1,60 +1,209 @@
+import heapq
+import random
+from contextlib import ExitStack
 from functools import wraps
-from flask import Blueprint, current_app, flash, jsonify, redirect, render_template, url_for
-from app.routes.customer import calculate_customer_health
-from ..models import ApiUsage, FeatureUsage, Invoice, LoginEvent, SupportTicket, Customer
-from ..constants import Constants
+from datetime import datetime
+from itertools import islice
+from flask import Blueprint, current_app, flash, jsonify, redirect, render_template, request, url_for
+from sqlalchemy import func, select
+from app import cache, jobs, reads, scoring, weights
+from app.async_db import rows_of, scalar_of
+from ..models import ApiUsage, FeatureUsage, Invoice, LoginEvent, SupportTicket, Customer, CustomerHealthScore
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Latest events tables of the dashboard: key -> (model, time column name)
+LATEST_ACTIONS = {
+    "logins": (LoginEvent, "timestamp"),
+    "tickets": (SupportTicket, "created_at"),
+    "invoices": (Invoice, "issued_at"),
+    "api_calls": (ApiUsage, "timestamp"),
+    "feature_usages": (FeatureUsage, "timestamp"),
+}
+RISKY_PER_PAGE = 20
+RISKY_MAX_PER_PAGE = 100
+RISKY_BATCH_SIZE = 1000  # customers scored per batch while streaming a shard
+# At-risk ranks scored live (bounding the per-shard heap); deeper pages read the stored scores
+RISKY_LIVE_RANKS = 1000
+
 @dashboard_bp.route("/dashboard")
 def dashboard():
-    with current_app.db_manager.get_read_session() as session:
-        latest = latest_actions()
-        risky = risky_customers()
-
-        return render_template(
-            "dashboard.html",
-            latest_actions=latest,
-            risky_customers=risky,
-            health_score_risk_threshold=Constants.AT_RISK_THRESHOLD,
-            testing=True if current_app.config.get('FLASK_ENV') in ['testing', 'development'] else False,
-        )
+    latest = latest_actions()
+    page = max(request.args.get("risk_page", 1, type=int), 1)
+    risky, risky_total = risky_customers(page)
+
+    return render_template(
+        "dashboard.html",
+        latest_actions=latest,
+        risky_customers=risky,
+        risky_total=risky_total,
+        risk_page=page,
+        risk_pages=-(-risky_total // RISKY_PER_PAGE),
+        health_score_risk_threshold=weights.current().AT_RISK_THRESHOLD,
+        testing=True if current_app.config.get('FLASK_ENV') in ['testing', 'development'] else False,
+    )
+
+@dashboard_bp.route("/dashboard/async")
+async def dashboard_async():
+    # Same page as dashboard(), but every query (latest events and grouped health
+    # components) runs concurrently on its own connection
+    latest_statements = {
+        key: reads.select_rows(model).order_by(getattr(model, column).desc()).limit(5)
+        for key, (model, column) in LATEST_ACTIONS.items()
+    }
+    now = datetime.now()
+    component_statements = scoring.component_statements(now)
+
+    shard_results = await current_app.async_db_manager.gather_shards(
+        *[rows_of(stmt) for stmt in latest_statements.values()],
+        rows_of(reads.select_rows(Customer)),
+        rows_of(scoring.total_features_rows_statement()),
+        *[rows_of(stmt) for stmt in component_statements.values()],
+    )
+    latest_count = len(latest_statements)
+    # Feature adoption is relative to the distinct features of all shards
+    total_features = scoring.total_features_of([results[latest_count + 1] for results in shard_results])
+
+    latest = merge_latest_actions([
+        {key: reads.rows(LATEST_ACTIONS[key][0], events) for key, events in zip(latest_statements, results)}
+        for results in shard_results
+    ])
+
+    threshold = weights.current().AT_RISK_THRESHOLD
+    page = max(request.args.get("risk_page", 1, type=int), 1)
+    if page * RISKY_PER_PAGE > RISKY_LIVE_RANKS:
+        risky, risky_total = stored_risky_customers(page, RISKY_PER_PAGE)
+    else:
+        lowest, risky_total = [], 0
+        for results in shard_results:
+            customers = reads.rows(Customer, results[latest_count])
+            counts = dict(zip(component_statements, results[latest_count + 2:]))
+            health = scoring.health_from_counts([c.id for c in customers], counts, total_features, now)
+            for c in customers:
+                if health[c.id]["health_score"] <= threshold:
+                    risky_total += 1
+                    keep_lowest(lowest, page * RISKY_PER_PAGE, health[c.id]["health_score"], c)
+        risky = risky_page(lowest, page, RISKY_PER_PAGE)
+
+    return render_template(
+        "dashboard.html",
+        latest_actions=latest,
+        risky_customers=risky,
+        risky_total=risky_total,
+        risk_page=page,
+        risk_pages=-(-risky_total // RISKY_PER_PAGE),
+        health_score_risk_threshold=threshold,
+        testing=True if current_app.config.get('FLASK_ENV') in ['testing', 'development'] else False,
+    )
 
 @dashboard_bp.route("/dashboard/seed", methods=["POST"])
 def seed_database():
-    from utils.seed_db import seed
-    seed(current_app)
-    flash("Database seeded successfully.", "success")
+    # Seeding runs as a background job, the request only queues it. The bulk seeder writes
+    # seed_db.NEW_CUSTOMERS customers of a new random dataset, replacing the data like seed_db does.
+    from utils import seed_db
+    job_id = jobs.submit(current_app._get_current_object(), "bulk_seed", customers=seed_db.NEW_CUSTOMERS,
+                         seed=random.randrange(2 ** 31),
+                         truncate_first=seed_db.TRUNCATE_FIRST or current_app.config["TESTING"])
+    status_url = url_for("jobs.get_job", job_id=job_id)
+    if request.accept_mimetypes.best_match(["application/json", "text/html"]) == "application/json":
+        return jsonify({"job_id": job_id, "status_url": status_url}), 202, {"Location": status_url}
+    flash(f"Seeding started as job {job_id}, see {status_url}", "success")
     return redirect(url_for("dashboard.dashboard"))
 
+@cache.memoize(tags=lambda: ["latest_actions"])
 def latest_actions():
-    with current_app.db_manager.get_read_session() as session:
-        latest_logins = session.query(LoginEvent).order_by(LoginEvent.timestamp.desc()).limit(5).all()
-        latest_tickets = session.query(SupportTicket).order_by(SupportTicket.created_at.desc()).limit(5).all()
-        latest_invoices = session.query(Invoice).order_by(Invoice.issued_at.desc()).limit(5).all()
-        latest_apis = session.query(ApiUsage).order_by(ApiUsage.timestamp.desc()).limit(5).all()
-        latest_features = session.query(FeatureUsage).order_by(FeatureUsage.timestamp.desc()).limit(5).all()
-
+    def shard_latest_actions(session):
         return {
-            "logins": [l.to_dict() for l in latest_logins],
-            "tickets": [t.to_dict() for t in latest_tickets],
-            "invoices": [i.to_dict() for i in latest_invoices],
-            "api_calls": [a.to_dict() for a in latest_apis],
-            "feature_usages": [f.to_dict() for f in latest_features]
+            key: reads.fetch(session, model, reads.select_rows(model).order_by(getattr(model, column).desc()).limit(5))
+            for key, (model, column) in LATEST_ACTIONS.items()
         }
 
-def risky_customers():
-    with current_app.db_manager.get_read_session() as session:
-        customers = session.query(Customer).all()
-        risky_customers_list = []
-        
-        for c in customers:
-            health = calculate_customer_health(session, c.id)
-            if health and health.get("health_score") <= Constants.AT_RISK_THRESHOLD:
-                risky_customers_list.append({
-                    **c.to_dict(),
-                    "health_score": health.get("health_score", 0),
-                    "css_class": "table-danger"
-                })
-
-        return risky_customers_list
\ No newline at end of file
+    return merge_latest_actions(current_app.db_manager.scatter_gather(shard_latest_actions))
+
+def merge_latest_actions(shard_latest):
+    # Newest 5 events of every kind over the per-shard newest 5, as dicts
+    latest = {}
+    for key, (model, column) in LATEST_ACTIONS.items():
+        events = [event for shard in shard_latest for event in shard[key]]
+        if len(shard_latest) > 1:
+            events = sorted(events, key=lambda e: getattr(e, column), reverse=True)[:5]
+        latest[key] = reads.as_dicts(events)
+    return latest
+
+def keep_lowest(heap, size, score, customer):
+    # Adds a customer to `heap`, which keeps the `size` lowest scores (ties: lowest ids) and
+    # has the highest kept one on top
+    item = (-score, -customer.id, customer)
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+def risky_page(heap, page, per_page):
+    # Rows of `page` of keep_lowest() items (of one or more heaps), lowest health first
+    ranked = sorted(heap, reverse=True)[(page - 1) * per_page:page * per_page]
+    return [{**c._asdict(), "health_score": -score, "css_class": "table-danger"} for score, _, c in ranked]
+
+def risky_customers(page=1, per_page=RISKY_PER_PAGE):
+    # (at-risk customers of `page`, lowest health first, number of at-risk customers). Shards stream
+    # their customers in batches, scored with grouped queries, through a heap bounded to the
+    # page * per_page lowest scores: memory doesn't grow with the number of customers. Pages
+    # past RISKY_LIVE_RANKS come from the stored scores.
+    if page * per_page > RISKY_LIVE_RANKS:
+        return stored_risky_customers(page, per_page)
+    total_features = scoring.global_total_features(current_app.db_manager)
+    threshold = weights.current().AT_RISK_THRESHOLD
+    now = datetime.now()
+
+    def shard_risky_customers(session):
+        lowest, at_risk = [], 0
+        result = session.execute(reads.select_rows(Customer).order_by(Customer.id)
+                                 .execution_options(stream_results=True, yield_per=RISKY_BATCH_SIZE))
+        for batch in result.partitions():
+            customers = reads.rows(Customer, batch)
+            health = scoring.bulk_customer_health(session, [c.id for c in customers], now, total_features)
+            for c in customers:
+                if health[c.id]["health_score"] <= threshold:
+                    at_risk += 1
+                    keep_lowest(lowest, page * per_page, health[c.id]["health_score"], c)
+        return lowest, at_risk
+
+    shards = current_app.db_manager.scatter_gather(shard_risky_customers)
+    return risky_page([item for lowest, _ in shards for item in lowest], page, per_page), \
+        sum(at_risk for _, at_risk in shards)
+
+def stored_risky_customers(page, per_page):
+    # Like risky_customers(), from customer_health_scores (as of the last scoring.rescore): every
+    # shard streams its at-risk customers in score order and the streams are merged, skipping the
+    # earlier pages without keeping them
+    threshold = weights.current().AT_RISK_THRESHOLD
+    at_risk = CustomerHealthScore.health_score <= threshold
+    statement = reads.select_rows(Customer).add_columns(CustomerHealthScore.health_score) \
+        .join(CustomerHealthScore, CustomerHealthScore.customer_id == Customer.id) \
+        .where(at_risk) \
+        .order_by(CustomerHealthScore.health_score, Customer.id) \
+        .execution_options(stream_results=True, yield_per=RISKY_BATCH_SIZE)
+    db_manager = current_app.db_manager
+    with ExitStack() as stack:
+        sessions = [stack.enter_context(db_manager.get_read_session(shard=shard))
+                    for shard in range(db_manager.shard_count)]
+        total = sum(session.execute(select(func.count()).select_from(CustomerHealthScore).where(at_risk)).scalar()
+                    for session in sessions)
+        ranked = heapq.merge(*[session.execute(statement) for session in sessions],
+                             key=lambda row: (row.health_score, row.id))
+        rows = list(islice(ranked, (page - 1) * per_page, page * per_page))
+    return [{**reads.rows(Customer, [row[:-1]])[0]._asdict(), "health_score": row.health_score,
+             "css_class": "table-danger"} for row in rows], total
+
+@dashboard_bp.route("/api/customers/at-risk", methods=["GET"])
+def at_risk_customers():
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", RISKY_PER_PAGE, type=int), 1), RISKY_MAX_PER_PAGE)
+    customers, total = risky_customers(page, per_page)
+    return jsonify({
+        "customers": [{key: value for key, value in c.items() if key != "css_class"} for c in customers],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "threshold": weights.current().AT_RISK_THRESHOLD,
+    }), 200
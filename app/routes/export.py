@@ -0,0 +1,135 @@
+import csv
+import io
+import json
+from datetime import datetime
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import literal, select
+from app import reads, scoring
+from app.routes.customer import parse_iso_datetime
+from ..models import ApiUsage, FeatureUsage, Invoice, LoginEvent, SupportTicket, Customer
+
+export_bp = Blueprint('export', __name__)
+
+# Exported event types (same names as event ingestion) -> (model, time column used for from/to)
+EVENT_TYPES = {
+    "login": (LoginEvent, LoginEvent.timestamp),
+    "feature": (FeatureUsage, FeatureUsage.timestamp),
+    "ticket": (SupportTicket, SupportTicket.created_at),
+    "invoice": (Invoice, Invoice.issued_at),
+    "api": (ApiUsage, ApiUsage.timestamp),
+}
+EVENT_COLUMNS = ["event_type", "id", "customer_id", "timestamp", "feature_name", "api_endpoint", "status",
+                 "created_at", "closed_at", "issued_at", "due_date", "paid_date", "amount"]
+CUSTOMER_COLUMNS = ["id", "name", "segment", "health_score", "logins", "feature_adoption",
+                    "support_tickets", "invoices", "api_usage"]
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _encode(rows, columns, export_format):
+    # One chunk of output for a batch of row dicts
+    if export_format == "ndjson":
+        return "".join(json.dumps({c: _serialize(row.get(c)) for c in columns}) + "\n" for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([[_serialize(row.get(c)) for c in columns] for row in rows])
+    return buffer.getvalue()
+
+def _header(columns, export_format):
+    if export_format == "csv":
+        return ",".join(columns) + "\r\n"
+    return ""
+
+def _stream(generate, export_format, filename):
+    response = Response(stream_with_context(generate()), mimetype=FORMATS[export_format])
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}.{export_format}"
+    response.headers["X-Accel-Buffering"] = "no"  # let nginx pass chunks through unbuffered
+    return response
+
+def _partitions(session, statement):
+    # Server-side cursor (psycopg2 named cursor) fetched in EXPORT_BATCH_SIZE batches
+    batch_size = current_app.config.get("EXPORT_BATCH_SIZE", 1000)
+    result = session.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+    return result.mappings().partitions()
+
+def _shards(db_manager, customer_id=None):
+    # Shards to stream from one after the other: only the customer's own one when filtered
+    if customer_id:
+        return [db_manager.shard_for(customer_id).index]
+    return range(db_manager.shard_count)
+
+
+@export_bp.route('/api/export/customers', methods=['GET'])
+def export_customers():
+    export_format = request.args.get("format", "csv")
+    segment = request.args.get("segment")
+    customer_id = request.args.get("customer_id", type=int)
+    if export_format not in FORMATS:
+        return jsonify({"message": f"Unknown format: {export_format}"}), 400
+
+    db_manager = current_app.db_manager
+    statement = select(Customer.id, Customer.name, Customer.segment).order_by(Customer.id)
+    if segment:
+        statement = statement.where(Customer.segment == segment)
+    if customer_id:
+        statement = statement.where(Customer.id == customer_id)
+
+    def generate():
+        yield _header(CUSTOMER_COLUMNS, export_format)
+        now = datetime.now()
+        total_features = scoring.global_total_features(db_manager)
+        for shard in _shards(db_manager, customer_id):
+            with db_manager.get_read_session(shard=shard) as session:
+                for customers in _partitions(session, statement):
+                    # Health of the whole batch with one grouped query per component
+                    health = scoring.bulk_customer_health(
+                        session, [c["id"] for c in customers], now, total_features)
+                    yield _encode([
+                        {**c, "health_score": health[c["id"]]["health_score"], **health[c["id"]]["scores"]}
+                        for c in customers
+                    ], CUSTOMER_COLUMNS, export_format)
+
+    return _stream(generate, export_format, "customers")
+
+
+@export_bp.route('/api/export/events', methods=['GET'])
+def export_events():
+    export_format = request.args.get("format", "csv")
+    event_type = request.args.get("type")
+    customer_id = request.args.get("customer_id", type=int)
+    if export_format not in FORMATS:
+        return jsonify({"message": f"Unknown format: {export_format}"}), 400
+    if event_type and event_type not in EVENT_TYPES:
+        return jsonify({"message": f"Unknown event type: {event_type}"}), 400
+    try:
+        start = parse_iso_datetime(request.args.get("from"))
+        end = parse_iso_datetime(request.args.get("to"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    statements = []
+    for name in [event_type] if event_type else EVENT_TYPES:
+        model, time_column = EVENT_TYPES[name]
+        # Lookup ids are exported as their names (reads.select_rows)
+        statement = reads.select_rows(model).add_columns(literal(name).label("event_type")).order_by(model.id)
+        if customer_id:
+            statement = statement.where(model.customer_id == customer_id)
+        if start:
+            statement = statement.where(time_column >= start)
+        if end:
+            statement = statement.where(time_column < end)
+        statements.append(statement)
+
+    db_manager = current_app.db_manager
+
+    def generate():
+        yield _header(EVENT_COLUMNS, export_format)
+        for shard in _shards(db_manager, customer_id):
+            with db_manager.get_read_session(shard=shard) as session:
+                for statement in statements:
+                    for events in _partitions(session, statement):
+                        yield _encode(events, EVENT_COLUMNS, export_format)
+
+    return _stream(generate, export_format, f"{event_type or 'all'}_events")
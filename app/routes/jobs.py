@@ -0,0 +1,49 @@
+from flask import Blueprint, abort, current_app, jsonify, request, url_for
+from app import jobs
+from app.routes.admin import is_admin_request
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Background jobs (app/jobs.py): submit, follow progress, cancel. Same access as the admin pages.
+
+@jobs_bp.before_request
+def require_admin():
+    if not is_admin_request():
+        abort(403)
+
+@jobs_bp.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    return jsonify({"jobs": jobs.list_jobs(current_app, request.args.get("status"), limit)}), 200
+
+@jobs_bp.route('/api/jobs', methods=['POST'])
+def submit_job():
+    payload = request.get_json(silent=True) or {}
+    kind = payload.get("kind")
+    params = payload.get("params") or {}
+    if kind not in jobs.JOBS:
+        return jsonify({"message": f"Unknown job kind: {kind}", "kinds": sorted(jobs.JOBS)}), 400
+    if not isinstance(params, dict):
+        return jsonify({"message": "params must be an object"}), 400
+    try:
+        job_id = jobs.submit(current_app._get_current_object(), kind, **params)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    status_url = url_for("jobs.get_job", job_id=job_id)
+    return jsonify({"job_id": job_id, "status_url": status_url}), 202, {"Location": status_url}
+
+@jobs_bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get_job(current_app, job_id)
+    if job is None:
+        return jsonify({"message": "Job not found"}), 404
+    return jsonify(job), 200
+
+@jobs_bp.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = jobs.get_job(current_app, job_id)
+    if job is None:
+        return jsonify({"message": "Job not found"}), 404
+    if job["status"] in jobs.FINISHED:
+        return jsonify({"message": f"Job already {job['status']}", "job": job}), 409
+    return jsonify(jobs.cancel(current_app, job_id)), 200
@@ -0,0 +1,38 @@
+from flask import Blueprint, current_app, jsonify, request
+from app import scoring, weights
+
+scoring_bp = Blueprint('scoring', __name__)
+
+MAX_CANDIDATES = 200
+
+@scoring_bp.route('/api/scoring/settings', methods=['GET'])
+def scoring_settings():
+    return jsonify(weights.as_dict(weights.current())), 200
+
+@scoring_bp.route('/api/scoring/simulate', methods=['POST'])
+def simulate_scoring():
+    # Body: {"weights": {...}, "thresholds": {...}} or {"candidates": [{...}, ...]}, each
+    # overriding the current settings; "limit" caps the customer ids listed per at-risk change
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"message": "JSON body required"}), 400
+    candidates = payload.get("candidates", [payload])
+    if not isinstance(candidates, list) or not candidates:
+        return jsonify({"message": "candidates must be a non-empty list"}), 400
+    if len(candidates) > MAX_CANDIDATES:
+        return jsonify({"message": f"At most {MAX_CANDIDATES} candidates per request"}), 400
+
+    limit = payload.get("limit", 100)
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 0:
+        return jsonify({"message": "limit must be a non-negative integer"}), 400
+
+    baseline = weights.current()
+    try:
+        candidates = [weights.parse(candidate, baseline) for candidate in candidates]
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    customer_ids, components = scoring.stored_components(current_app.db_manager)
+    if not customer_ids:
+        return jsonify({"message": "No stored scores yet, run `flask rescore`"}), 409
+    return jsonify(scoring.simulate(customer_ids, components, candidates, baseline, limit)), 200
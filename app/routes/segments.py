@@ -0,0 +1,32 @@
+from flask import Blueprint, abort, current_app, jsonify, url_for
+from app import cache, jobs
+from app.routes.admin import is_admin_request
+from ..models import SegmentHealth
+
+segments_bp = Blueprint('segments', __name__)
+
+@segments_bp.route('/api/segments/health', methods=['GET'])
+def segments_health():
+    return jsonify(segments_payload()), 200
+
+@cache.memoize(tags=lambda: ["segments"])
+def segments_payload():
+    # Reads the aggregates precomputed by scoring.rescore(): one row per segment,
+    # whatever the number of customers
+    with current_app.db_manager.get_read_session(shard=0) as session:
+        segments = session.query(SegmentHealth).order_by(SegmentHealth.segment).all()
+        computed_at = max((s.computed_at for s in segments), default=None)
+        return {
+            "segments": [segment.to_dict() for segment in segments],
+            "computed_at": computed_at.isoformat() if computed_at else None,
+        }
+
+@segments_bp.route('/api/segments/health/refresh', methods=['POST'])
+def refresh_segments_health():
+    if not is_admin_request():
+        abort(403)
+    # Full rescoring runs as a background job, its result has the number of customers scored
+    job_id = jobs.submit(current_app._get_current_object(), "rescore")
+    status_url = url_for("jobs.get_job", job_id=job_id)
+    return jsonify({"message": "Rescoring queued", "job_id": job_id, "status_url": status_url}), 202, \
+        {"Location": status_url}
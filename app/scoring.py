@@ -0,0 +1,369 @@
+import math
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+from datetime import datetime, timedelta, timezone
+from flask import current_app, has_app_context
+from sqlalchemy import case, delete, func, insert, select
+from app import cache, counters, hll, memo, sketches, weights
+from app.lookups import id_of
+from .models import (ApiUsage, FeatureName, FeatureUsage, Invoice, InvoiceStatus, LoginEvent, SupportTicket,
+                     TicketStatus, Customer, CustomerHealthScore, SegmentHealth)
+
+SCORE_COMPONENTS = ["logins", "feature_adoption", "support_tickets", "invoices", "api_usage"]
+HEALTH_PERCENTILES = [10, 25, 50, 75, 90]
+# Health is scored over several windows of recent activity (days): short ones catch declining
+# accounts early. Logins and API calls are counted per window, the other components don't depend
+# on it. PRIMARY_WINDOW is the health of at-risk lists, stored scores and segment aggregates.
+WINDOWS = (7, 30, 90)
+PRIMARY_WINDOW = 30
+
+# Component score formulas, shared by per-customer and bulk (grouped) scoring
+
+def login_score(login_count):
+    return min(login_count * 10, 100)  # 10 logins or more == maximum points
+
+def feature_adoption_score(features_used, total_features):
+    adoption_rate = features_used / total_features if total_features > 0 else 0
+    return min(int(adoption_rate * 100), 100)
+
+def tickets_score(open_tickets):
+    return max(100 - (open_tickets * 10), 0)  # 10 open tickets or more == minimum points
+
+def invoice_score(total_invoices, unpaid_invoices):
+    if total_invoices:
+        return int(((total_invoices - unpaid_invoices) / total_invoices) * 100)
+    return 100
+
+def api_usage_score(api_calls):
+    return min(api_calls, 100)  # 100+ calls == maximum points
+
+def health_from_scores(customer_id, login, adoption, tickets, invoices, api, settings=None):
+    settings = settings or weights.current()
+    health_score = (
+        login * settings.LOGIN_WEIGHT +
+        adoption * settings.FEATURE_ADOPTION_WEIGHT +
+        tickets * settings.SUPPORT_TICKET_WEIGHT +
+        invoices * settings.INVOICE_WEIGHT +
+        api * settings.API_USAGE_WEIGHT
+    )
+    return {
+        "customer_id": customer_id,
+        "scores": {
+            "logins": login,
+            "feature_adoption": adoption,
+            "support_tickets": tickets,
+            "invoices": invoices,
+            "api_usage": api,
+        },
+        "health_score": round(health_score, 2)
+    }
+
+# Bulk scoring: one grouped query per component instead of one query per customer and component
+
+def sketches_enabled():
+    # Distinct counts from HyperLogLog sketches (app/sketches.py) instead of COUNT(DISTINCT) scans
+    return has_app_context() and current_app.config.get("HLL_SKETCHES", False)
+
+def total_features_statement():
+    return select(func.count(func.distinct(FeatureUsage.feature_id)))
+
+def shard_total_features(session):
+    if sketches_enabled():
+        return sketches.distinct_count(session, "feature")
+    return memo.execute(session, total_features_statement()).scalar() or 0
+
+def customer_features_used(session, customer_id):
+    if sketches_enabled():
+        return sketches.distinct_count(session, "feature", customer_id)
+    return session.execute(select(func.count(func.distinct(FeatureUsage.feature_id)))
+                           .where(FeatureUsage.customer_id == customer_id)).scalar() or 0
+
+def used_feature_names():
+    # Names of the features used on a shard (lookup ids differ between shards, names don't)
+    return select(FeatureName.name).where(
+        select(FeatureUsage.id).where(FeatureUsage.feature_id == FeatureName.id).exists())
+
+def total_features_rows_statement():
+    # Rows of one shard to pass to total_features_of(): its feature sketches, or its used names
+    return sketches.sketch_statement("feature") if sketches_enabled() else used_feature_names()
+
+def total_features_of(shard_rows):
+    # Distinct feature names across shards, from total_features_rows_statement() rows of each shard
+    if sketches_enabled():
+        return hll.HyperLogLog.union(registers for rows in shard_rows for _, registers in rows).count()
+    return len({name for rows in shard_rows for (name,) in rows})
+
+def global_total_features(db_manager):
+    # Distinct feature names across all shards. None when unsharded and counted exactly:
+    # the shard's own count is then the global one and scoring queries compute it themselves.
+    if not sketches_enabled() and db_manager.shard_count == 1:
+        return None
+    return total_features_of(db_manager.scatter_gather(
+        lambda session: session.execute(total_features_rows_statement()).all()))
+
+def windowed_counts(model, column, now):
+    # select(customer_id, count per window) over the longest window, in one scan: conditional
+    # aggregation, COUNT(...) FILTER (WHERE column >= window start)
+    return select(model.customer_id,
+                  *[func.count(model.id).filter(column >= now - timedelta(days=days)) for days in WINDOWS]) \
+        .where(column >= now - timedelta(days=max(WINDOWS))) \
+        .group_by(model.customer_id)
+
+def component_statements(now, customer_ids=None):
+    # {component: select(customer_id, *counts) grouped by customer}, optionally restricted to customer_ids
+    statements = {
+        "logins": windowed_counts(LoginEvent, LoginEvent.timestamp, now),
+        "features_used": select(FeatureUsage.customer_id, func.count(func.distinct(FeatureUsage.feature_id)))
+            .group_by(FeatureUsage.customer_id),
+        "open_tickets": select(SupportTicket.customer_id, func.count(SupportTicket.id))
+            .where(SupportTicket.status_id == id_of(TicketStatus, "open"))
+            .group_by(SupportTicket.customer_id),
+        "invoices": select(Invoice.customer_id,
+                           func.count(Invoice.id),
+                           func.sum(case((Invoice.status_id == id_of(InvoiceStatus, "unpaid"), 1), else_=0)))
+            .group_by(Invoice.customer_id),
+        "api_calls": windowed_counts(ApiUsage, ApiUsage.timestamp, now),
+    }
+    if customer_ids is not None:
+        models = {"logins": LoginEvent, "features_used": FeatureUsage, "open_tickets": SupportTicket,
+                  "invoices": Invoice, "api_calls": ApiUsage}
+        statements = {name: stmt.where(models[name].customer_id.in_(customer_ids))
+                      for name, stmt in statements.items()}
+    if sketches_enabled():
+        # (customer_id, registers) rows, merged per customer by health_from_counts()
+        statements["features_used"] = sketches.sketch_statement("feature", customer_ids, all_customers=True)
+    return statements
+
+def per_30_days(count, days):
+    # A window's count scaled to 30 days, so every window is scored with the same formulas
+    return count if days == 30 else round(count * 30 / days)
+
+# Windowed components counted by the host's window counters (app/counters.py) -> their kind
+COUNTED_COMPONENTS = {"logins": "login", "api_calls": "api"}
+
+def use_window_counters(by_component, customer_ids, now):
+    # Replaces the windowed counts of the customers tracked by the window counters, when enabled,
+    # for the windows their ring covers (whole days): the same counts without the database
+    window_counters = counters.ready_counters(current_app) if has_app_context() else None
+    if window_counters is None:
+        return
+    covered = [(i, now - timedelta(days=days)) for i, days in enumerate(WINDOWS) if days < window_counters.days]
+    for name, kind in COUNTED_COMPONENTS.items():
+        component = by_component[name]
+        for customer_id in customer_ids:
+            windows = list(component.get(customer_id, (0,) * len(WINDOWS)))
+            for i, since in covered:
+                count = window_counters.count(customer_id, kind, since)
+                if count is None:
+                    break
+                windows[i] = count
+            else:
+                component[customer_id] = tuple(windows)
+
+def health_from_counts(customer_ids, counts, total_features, now=None):
+    # counts: {component: rows of component_statements(now)}; returns {customer_id: health dict} of
+    # PRIMARY_WINDOW, with the health of every window under "windows" ("7d", "30d", "90d")
+    by_component = {name: {row[0]: row[1:] for row in rows} for name, rows in counts.items()}
+    if sketches_enabled():
+        by_component["features_used"] = sketches.distinct_counts(counts["features_used"])
+    if now is not None:
+        use_window_counters(by_component, customer_ids, now)
+    settings = weights.current()
+    no_events = (0,) * len(WINDOWS)
+    health = {}
+    for customer_id in customer_ids:
+        total_invoices, unpaid_invoices = by_component["invoices"].get(customer_id, (0, 0))
+        adoption = feature_adoption_score(by_component["features_used"].get(customer_id, (0,))[0], total_features or 0)
+        tickets = tickets_score(by_component["open_tickets"].get(customer_id, (0,))[0])
+        invoices = invoice_score(total_invoices, unpaid_invoices or 0)
+        logins = by_component["logins"].get(customer_id, no_events)
+        api_calls = by_component["api_calls"].get(customer_id, no_events)
+        windows = {
+            days: health_from_scores(customer_id,
+                                     login_score(per_30_days(logins[i], days)),
+                                     adoption,
+                                     tickets,
+                                     invoices,
+                                     api_usage_score(per_30_days(api_calls[i], days)),
+                                     settings)
+            for i, days in enumerate(WINDOWS)
+        }
+        health[customer_id] = {
+            **windows[PRIMARY_WINDOW],
+            "windows": {f"{days}d": {"health_score": w["health_score"], "scores": w["scores"]}
+                        for days, w in windows.items()},
+        }
+    return health
+
+def bulk_customer_health(session, customer_ids, now=None, total_features=None):
+    # Health for many customers (of one shard), every window, with one grouped query per component
+    now = now or datetime.now()
+    statements = component_statements(now, customer_ids)
+    counts = {name: session.execute(stmt).all() for name, stmt in statements.items()}
+    if total_features is None:
+        total_features = shard_total_features(session)
+    return health_from_counts(customer_ids, counts, total_features, now)
+
+# Precomputed scores: rescore() stores every customer's health (customer_health_scores, on the
+# customer's shard) and refreshes the per-segment aggregates read by /api/segments/health
+
+def rescore(db_manager, batch_size=1000, progress=None):
+    # Returns the number of customers scored. progress(done shards, shards) is called after each shard.
+    now = datetime.now()
+    scored_at = datetime.now(timezone.utc)
+    total_features = global_total_features(db_manager)
+    scored = 0
+    for shard in range(db_manager.shard_count):
+        with db_manager.get_write_session(shard=shard) as session:
+            customers = session.execute(select(Customer.id, Customer.segment).order_by(Customer.id)).all()
+            if total_features is None:
+                total_features = shard_total_features(session)
+            session.execute(delete(CustomerHealthScore))
+            for start in range(0, len(customers), batch_size):
+                batch = customers[start:start + batch_size]
+                health = bulk_customer_health(session, [c.id for c in batch], now, total_features)
+                session.execute(insert(CustomerHealthScore), [
+                    {"customer_id": c.id, "segment": c.segment, "health_score": health[c.id]["health_score"],
+                     **health[c.id]["scores"], "scored_at": scored_at}
+                    for c in batch
+                ])
+            scored += len(customers)
+        if progress:
+            progress(shard + 1, db_manager.shard_count)
+    refresh_segment_health(db_manager)
+    return scored
+
+def percentile_from_counts(value_counts, percentile):
+    # Nearest-rank percentile of a {value: occurrences} distribution
+    rank = max(1, math.ceil(percentile / 100 * sum(value_counts.values())))
+    seen = 0
+    for value in sorted(value_counts):
+        seen += value_counts[value]
+        if seen >= rank:
+            return value
+    return None
+
+def segment_statements():
+    # Grouped per segment, mergeable across shards: sums, and the distribution of health
+    # scores (rounded to 2 decimals, so at most 10001 rows per segment) for percentiles
+    score = CustomerHealthScore
+    return {
+        "totals": select(score.segment,
+                         func.count(),
+                         func.sum(score.health_score),
+                         func.sum(case((score.health_score <= weights.current().AT_RISK_THRESHOLD, 1), else_=0)),
+                         *[func.sum(getattr(score, component)) for component in SCORE_COMPONENTS])
+            .group_by(score.segment),
+        "distribution": select(score.segment, score.health_score, func.count())
+            .group_by(score.segment, score.health_score),
+    }
+
+def refresh_segment_health(db_manager):
+    # Recomputes segment_health from customer_health_scores of every shard
+    statements = segment_statements()
+    shard_results = db_manager.scatter_gather(
+        lambda session: {name: session.execute(stmt).all() for name, stmt in statements.items()})
+
+    totals = {}
+    distributions = {}
+    for results in shard_results:
+        for segment, *sums in results["totals"]:
+            merged = totals.setdefault(segment or "Unassigned", [0] * len(sums))
+            totals[segment or "Unassigned"] = [a + (b or 0) for a, b in zip(merged, sums)]
+        for segment, health_score, count in results["distribution"]:
+            distributions.setdefault(segment or "Unassigned", Counter())[health_score] += count
+
+    computed_at = datetime.now(timezone.utc)
+    rows = []
+    for segment, (customers, health_sum, at_risk, *component_sums) in totals.items():
+        rows.append({
+            "segment": segment,
+            "customers": customers,
+            "at_risk": at_risk,
+            "mean_health": round(health_sum / customers, 2),
+            **{f"p{p}_health": percentile_from_counts(distributions[segment], p) for p in HEALTH_PERCENTILES},
+            **{f"avg_{c}": round(total / customers, 2) for c, total in zip(SCORE_COMPONENTS, component_sums)},
+            "computed_at": computed_at,
+        })
+
+    with db_manager.get_write_session(shard=0) as session:
+        session.execute(delete(SegmentHealth))
+        if rows:
+            session.execute(insert(SegmentHealth), rows)
+    cache.invalidate("segments")
+    return rows
+
+# What-if scoring: health of every customer recomputed from the stored component scores
+# (customer_health_scores) for candidate weights, without querying events
+
+def stored_components(db_manager):
+    # (customer ids, {component: array of scores}) of every shard, cached per app until the next rescore
+    fingerprint = tuple(db_manager.scatter_gather(lambda session: tuple(session.execute(
+        select(func.count(), func.max(CustomerHealthScore.scored_at))).one())))
+    cached = current_app.extensions.get("stored_components")
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    columns = [CustomerHealthScore.customer_id, *[getattr(CustomerHealthScore, c) for c in SCORE_COMPONENTS]]
+    customer_ids = array("q")
+    components = {component: array("d") for component in SCORE_COMPONENTS}
+    for rows in db_manager.scatter_gather(lambda session: session.execute(select(*columns)).all()):
+        for customer_id, *scores in rows:
+            customer_ids.append(customer_id)
+            for component, score in zip(SCORE_COMPONENTS, scores):
+                components[component].append(score)
+    current_app.extensions["stored_components"] = (fingerprint, (customer_ids, components))
+    return customer_ids, components
+
+def weighted_health(components, settings):
+    # Unrounded health score of every customer for `settings` weights
+    w0, w1, w2, w3, w4 = [getattr(settings, weights.WEIGHTS[component]) for component in SCORE_COMPONENTS]
+    return [login * w0 + adoption * w1 + tickets * w2 + invoices * w3 + api * w4
+            for login, adoption, tickets, invoices, api in zip(*(components[c] for c in SCORE_COMPONENTS))]
+
+def score_distribution(scores):
+    ordered = sorted(scores)
+    if not ordered:
+        return {"mean": None, **{f"p{p}": None for p in HEALTH_PERCENTILES}, "histogram": [0] * 10}
+    # Customers per 10 points: [0, 10), [10, 20), ... [90, 100]
+    bounds = [0] + [bisect_left(ordered, 10 * i) for i in range(1, 10)] + [len(ordered)]
+    return {
+        "mean": round(sum(ordered) / len(ordered), 2),
+        **{f"p{p}": round(ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1], 2) for p in HEALTH_PERCENTILES},
+        "histogram": [high - low for low, high in zip(bounds, bounds[1:])],
+    }
+
+def simulate(customer_ids, components, candidates, baseline, limit=100):
+    # Distribution and at-risk changes (against `baseline` settings) for every candidate settings
+    def at_risk(scores, settings):
+        # Same decision as on the 2-decimals rounded score of health_from_scores()
+        limit = settings.AT_RISK_THRESHOLD + 0.005
+        return {customer_ids[i] for i, score in enumerate(scores) if score < limit}
+
+    baseline_scores = weighted_health(components, baseline)
+    baseline_at_risk = at_risk(baseline_scores, baseline)
+    results = []
+    for settings in candidates:
+        scores = weighted_health(components, settings)
+        candidate_at_risk = at_risk(scores, settings)
+        added = sorted(candidate_at_risk - baseline_at_risk)
+        removed = sorted(baseline_at_risk - candidate_at_risk)
+        results.append({
+            **weights.as_dict(settings),
+            "health_score": score_distribution(scores),
+            "at_risk": len(candidate_at_risk),
+            "at_risk_changes": {
+                "added_count": len(added),
+                "removed_count": len(removed),
+                "added": added[:limit],
+                "removed": removed[:limit],
+            },
+        })
+    return {
+        "customers": len(customer_ids),
+        "baseline": {**weights.as_dict(baseline), "health_score": score_distribution(baseline_scores),
+                     "at_risk": len(baseline_at_risk)},
+        "candidates": results,
+    }
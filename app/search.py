@@ -0,0 +1,159 @@
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from math import ceil
+from flask import current_app
+from sqlalchemy import func, select
+from .models import Customer, CustomerHealthScore
+
+# Customer name search: prefix matches first, then fuzzy (trigram similarity) matches, with the
+# stored health scores (customer_health_scores). Only the customers and score tables are read.
+# Postgres uses the pg_trgm GIN index on customers.name, SQLite an in-memory index per shard.
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm's default for the % operator
+
+_build_lock = threading.Lock()
+
+
+def trigrams(text):
+    # Trigrams as computed by pg_trgm: lowercased alphanumeric words padded with two spaces in front, one behind
+    grams = set()
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def similarity(a, b):
+    # pg_trgm similarity() of two trigram sets
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+class NameIndex:
+    # Sorted lowercase names (prefix lookups by bisection) and trigram -> customer ids postings
+    def __init__(self, rows):
+        self.names, self.sizes = {}, {}
+        postings = {}
+        for customer_id, name in rows:
+            grams = trigrams(name)
+            self.names[customer_id], self.sizes[customer_id] = name, len(grams)
+            for gram in grams:
+                postings.setdefault(gram, array("q")).append(customer_id)
+        self.postings = postings
+        ordered = sorted((name.lower(), customer_id) for customer_id, name in self.names.items())
+        self.keys = [key for key, _ in ordered]
+        self.ids = [customer_id for _, customer_id in ordered]
+
+    def prefix(self, query, limit):
+        query = query.lower()
+        matches = []
+        for i in range(bisect_left(self.keys, query), len(self.keys)):
+            if len(matches) == limit or not self.keys[i].startswith(query):
+                break
+            matches.append(self.ids[i])
+        return matches
+
+    def fuzzy(self, query, limit, exclude=(), threshold=SIMILARITY_THRESHOLD):
+        # Best `limit` {customer id: similarity} of names at least `threshold` similar to the query.
+        # Postings are scanned rarest first. A name first seen in the j-th of them lacks the trigrams
+        # of the j before, so it shares at most |query trigrams| - j with the query: names that can't
+        # beat the worst of the best `limit` matches so far are skipped without being compared, and
+        # the scan stops once no name can (the common trigrams are mostly never read). Among names
+        # tied with the limit-th best, the first found are kept.
+        grams = trigrams(query)
+        size = len(grams)
+        ordered = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        best, matches, seen = [], {}, set(exclude)
+        worst = threshold - 1e-9  # matches must score above it, the limit-th best once there are enough
+        for scanned, gram in enumerate(ordered):
+            most = size - scanned
+            if most / size <= worst:
+                break
+            for customer_id in self.postings.get(gram, ()):
+                if customer_id in seen:
+                    continue
+                shared = min(most, self.sizes[customer_id])
+                if shared / (size + self.sizes[customer_id] - shared) <= worst:
+                    continue
+                seen.add(customer_id)
+                score = similarity(grams, trigrams(self.names[customer_id]))
+                if score <= worst:
+                    continue
+                matches[customer_id] = score
+                if len(best) < limit:
+                    heapq.heappush(best, score)
+                else:
+                    heapq.heapreplace(best, score)
+                if len(best) == limit:
+                    worst = best[0]
+        return dict(sorted(matches.items(), key=lambda item: (-item[1], self.names[item[0]].lower()))[:limit])
+
+    def search(self, query, limit):
+        # [(customer id, is prefix match, similarity)], best first
+        grams = trigrams(query)
+        prefix = self.prefix(query, limit)
+        ranked = sorted(((customer_id, True, similarity(grams, trigrams(self.names[customer_id])))
+                         for customer_id in prefix), key=lambda match: (-match[2], self.names[match[0]].lower()))
+        if len(ranked) < limit:
+            ranked += [(customer_id, False, score)
+                       for customer_id, score in self.fuzzy(query, limit - len(ranked), exclude=prefix).items()]
+        return ranked
+
+
+def name_index(session):
+    # In-memory index of the shard's customer names, rebuilt when customers are added or removed
+    shard = str(session.get_bind().url)
+    fingerprint = tuple(session.execute(select(func.count(), func.max(Customer.id))).one())
+    indexes = current_app.extensions.setdefault("customer_name_index", {})
+    cached = indexes.get(shard)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+    with _build_lock:
+        cached = indexes.get(shard)
+        if not cached or cached[0] != fingerprint:
+            cached = indexes[shard] = (fingerprint, NameIndex(session.execute(select(Customer.id, Customer.name))))
+    return cached[1]
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_shard(session, query, limit):
+    # Best `limit` matches of one shard as dicts, best first
+    if session.get_bind().dialect.name == "postgresql":
+        # Both conditions are answered by the gin_trgm_ops index (ix_customers_name_trgm)
+        is_prefix = Customer.name.ilike(_escape_like(query) + "%", escape="\\")
+        score = func.similarity(Customer.name, query)
+        rows = session.execute(
+            select(Customer.id, Customer.name, Customer.segment, CustomerHealthScore.health_score, is_prefix, score)
+            .outerjoin(CustomerHealthScore, CustomerHealthScore.customer_id == Customer.id)
+            .where(is_prefix | Customer.name.op("%")(query))
+            .order_by(is_prefix.desc(), score.desc(), func.lower(Customer.name))
+            .limit(limit)
+        ).all()
+    else:
+        ranked = name_index(session).search(query, limit)
+        ids = [customer_id for customer_id, _, _ in ranked]
+        found = {row.id: row for row in session.execute(
+            select(Customer.id, Customer.name, Customer.segment, CustomerHealthScore.health_score)
+            .outerjoin(CustomerHealthScore, CustomerHealthScore.customer_id == Customer.id)
+            .where(Customer.id.in_(ids))
+        )}
+        rows = [(*found[customer_id], is_prefix, score) for customer_id, is_prefix, score in ranked
+                if customer_id in found]
+
+    return [{
+        "id": customer_id,
+        "name": name,
+        "segment": segment,
+        "health_score": health_score,
+        "match": "prefix" if is_prefix else "fuzzy",
+        "similarity": round(score, 3),
+    } for customer_id, name, segment, health_score, is_prefix, score in rows]
+
+def search_customers(db_manager, query, limit=20):
+    # Best `limit` matches over every shard
+    results = db_manager.scatter_gather(lambda session: search_shard(session, query, limit))
+    matches = [match for shard_matches in results for match in shard_matches]
+    matches.sort(key=lambda m: (m["match"] != "prefix", -m["similarity"], m["name"].lower()))
+    return matches[:limit]
@@ -0,0 +1,243 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import and_, bindparam, delete, event, extract, func, insert, or_, select
+from sqlalchemy.orm import Session
+from app import memo
+from app.hll import HyperLogLog
+from .models import ApiUsage, FeatureUsage, Sketch
+
+# Distinct counts kept as daily HyperLogLog sketches: kind -> (event model, counted column).
+# Sketches are maintained on every ORM insert of these events (update_sketches_on_flush), by
+# event ingestion (merge_events) and by the bulk seeder, and merged at read time over any
+# range of days. Days older than DAILY_DAYS are rolled up (rollup()) into one row per month,
+# dated on the month's first day, so full-history reads merge a row per month, not per day.
+SKETCHED = {
+    "feature": (FeatureUsage, "feature_name"),
+    "api_endpoint": (ApiUsage, "api_endpoint"),
+}
+
+table = Sketch.__table__
+SHARD_WIDE_MAX_ROWS = 32  # shard-wide rows of a kind and day before they are merged into one
+DAILY_DAYS = 120  # days kept at daily resolution, longer than the scoring windows
+
+
+def group_values(events):
+    # {kind: [(customer_id, value, timestamp)]} -> {(kind, customer_id, day): {values}},
+    # per customer and for all customers (customer_id None)
+    values = defaultdict(set)
+    for kind, triples in events.items():
+        for customer_id, value, timestamp in triples:
+            day = (timestamp or datetime.now(timezone.utc)).date()
+            values[(kind, customer_id, day)].add(value)
+            values[(kind, None, day)].add(value)
+    return values
+
+def sketch_rows(values):
+    # Rows of the sketches table for group_values() output
+    return [
+        {"kind": kind, "customer_id": customer_id, "day": day, "registers": HyperLogLog().update(v).to_bytes()}
+        for (kind, customer_id, day), v in values.items()
+    ]
+
+def _event_values(rows):
+    # group_values() of {model: [event row dicts]} (names, not lookup ids)
+    return group_values({
+        kind: [(row["customer_id"], row[column], row.get("timestamp")) for row in rows.get(model, [])]
+        for kind, (model, column) in SKETCHED.items()
+    })
+
+def rows_from_events(rows):
+    # Sketch rows for {model: [event row dicts]}, as generated by utils/bulk_seed.py
+    return sketch_rows(_event_values(rows))
+
+def merge_events(connection, rows):
+    # Adds {model: [event row dicts]} inserted with Core (app/ingest.py) into the stored sketches
+    values = _event_values(rows)
+    if values:
+        merge_values(connection, values)
+
+def merge_values(connection, values):
+    # Adds group_values() output into the stored sketches. Customer rows are read-modify-written,
+    # locked on Postgres so concurrent ingests don't lose values. Shard-wide rows (customer_id
+    # None), which every ingest touches, are appended as deltas without reading or locking:
+    # readers union every row of a day, and compact_shard_wide() merges them when they pile up.
+    updates, inserts = [], []
+    for kind in {key[0] for key in values}:
+        keys = [key for key in values if key[0] == kind and key[1] is not None]
+        existing = connection.execute(
+            select(table.c.id, table.c.customer_id, table.c.day, table.c.registers)
+            .where(table.c.kind == kind,
+                   table.c.day.in_({day for _, _, day in keys}),
+                   table.c.customer_id.in_({c for _, c, _ in keys}))
+            .with_for_update()
+        ).all() if keys else []
+        stored = {}
+        for row in existing:
+            stored.setdefault((kind, row.customer_id, row.day), row)
+
+        for key in keys:
+            sketch = HyperLogLog().update(values[key])
+            if key in stored:
+                sketch.merge(HyperLogLog.from_bytes(stored[key].registers))
+                updates.append({"sketch_id": stored[key].id, "registers": sketch.to_bytes()})
+            else:
+                inserts.append({"kind": kind, "customer_id": key[1], "day": key[2], "registers": sketch.to_bytes()})
+
+    shard_wide = [key for key in values if key[1] is None]
+    for kind, _, day in shard_wide:
+        inserts.append({"kind": kind, "customer_id": None, "day": day,
+                        "registers": HyperLogLog().update(values[(kind, None, day)]).to_bytes()})
+    if updates:
+        connection.execute(
+            table.update().where(table.c.id == bindparam("sketch_id")).values(registers=bindparam("registers")),
+            updates)
+    if inserts:
+        connection.execute(insert(table), inserts)
+    if shard_wide:
+        compact_shard_wide(connection, shard_wide)
+
+def compact_shard_wide(connection, keys):
+    # Merges the shard-wide rows of the (kind, None, day) keys that have more than SHARD_WIDE_MAX_ROWS.
+    # Rows locked by another compaction are skipped (Postgres), so ingests never wait on each other.
+    crowded = connection.execute(
+        select(table.c.kind, table.c.day)
+        .where(table.c.customer_id.is_(None),
+               or_(*(and_(table.c.kind == kind, table.c.day == day) for kind, _, day in keys)))
+        .group_by(table.c.kind, table.c.day)
+        .having(func.count() > SHARD_WIDE_MAX_ROWS)
+    ).all()
+    for kind, day in crowded:
+        rows = connection.execute(
+            select(table.c.id, table.c.registers)
+            .where(table.c.kind == kind, table.c.customer_id.is_(None), table.c.day == day)
+            .order_by(table.c.id)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if len(rows) > 1:
+            merged = HyperLogLog.union(row.registers for row in rows)
+            connection.execute(table.update().where(table.c.id == rows[0].id).values(registers=merged.to_bytes()))
+            connection.execute(delete(table).where(table.c.id.in_([row.id for row in rows[1:]])))
+
+@event.listens_for(Session, "after_flush")
+def update_sketches_on_flush(session, flush_context):
+    # session.new still lists the inserted objects here, with their ids and defaults set
+    events = defaultdict(list)
+    for obj in session.new:
+        for kind, (model, column) in SKETCHED.items():
+            if isinstance(obj, model):
+                events[kind].append((obj.customer_id, getattr(obj, column), obj.timestamp))
+    if events:
+        merge_values(session.connection(), group_values(events))
+
+def compact(connection):
+    # Merges rows of the same (kind, customer_id, day) into one, e.g. the per-chunk
+    # all-customers sketches written by the bulk seeder
+    duplicates = connection.execute(
+        select(table.c.kind, table.c.customer_id, table.c.day)
+        .group_by(table.c.kind, table.c.customer_id, table.c.day)
+        .having(func.count() > 1)
+    ).all()
+    for kind, customer_id, day in duplicates:
+        rows = connection.execute(
+            select(table.c.id, table.c.registers)
+            .where(table.c.kind == kind, table.c.customer_id.is_not_distinct_from(customer_id), table.c.day == day)
+            .order_by(table.c.id)
+        ).all()
+        merged = HyperLogLog.union(row.registers for row in rows)
+        connection.execute(table.update().where(table.c.id == rows[0].id).values(registers=merged.to_bytes()))
+        connection.execute(delete(table).where(table.c.id.in_([row.id for row in rows[1:]])))
+
+def rebuild(connection):
+    # Recreates every sketch from the event tables (one grouped scan per kind),
+    # for databases populated before sketches existed
+    connection.execute(delete(table))
+    for kind, (model, column) in SKETCHED.items():
+        # Names are hashed, not the per-shard lookup ids
+        name = getattr(model, column)
+        lookup = name.lookup
+        rows = connection.execute(
+            select(model.customer_id, lookup.name, func.date(model.timestamp))
+            .join(lookup, lookup.id == getattr(model, name.foreign_key))
+            .group_by(model.customer_id, lookup.name, func.date(model.timestamp))
+        ).all()
+        triples = [(customer_id, v, _as_datetime(day)) for customer_id, v, day in rows]
+        sketch = sketch_rows(group_values({kind: triples}))
+        if sketch:
+            connection.execute(insert(table), sketch)
+    rollup(connection)
+
+def rolled_before(today=None):
+    # First day kept at daily resolution: months before it are rolled up
+    first_daily = (today or date.today()) - timedelta(days=DAILY_DAYS)
+    return first_daily.replace(day=1)
+
+def rollup(connection, today=None):
+    # Merges the daily rows of every month before rolled_before() into one row per (kind,
+    # customer_id, month), dated on the month's first day. Rows added to a rolled month later
+    # (late events) are merged by the next run. Returns the number of months rolled up.
+    cutoff = rolled_before(today)
+    days = connection.execute(
+        select(table.c.day).distinct().where(table.c.day < cutoff, extract("day", table.c.day) != 1)
+    ).scalars()
+    months = sorted({day.replace(day=1) for day in map(_as_date, days)})
+    for month in months:
+        next_month = (month + timedelta(days=31)).replace(day=1)
+        rows = connection.execute(
+            select(table.c.id, table.c.kind, table.c.customer_id, table.c.registers)
+            .where(table.c.day >= month, table.c.day < next_month)
+            .order_by(table.c.id)
+            .with_for_update()
+        ).all()
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[(row.kind, row.customer_id)].append(row)
+        if not rows:
+            continue
+        # Rows inserted since the select (higher ids) are left to the next run
+        connection.execute(delete(table).where(table.c.day >= month, table.c.day < next_month,
+                                               table.c.id <= rows[-1].id))
+        connection.execute(insert(table), [
+            {"kind": kind, "customer_id": customer_id, "day": month,
+             "registers": HyperLogLog.union(row.registers for row in group).to_bytes()}
+            for (kind, customer_id), group in grouped.items()
+        ])
+    return len(months)
+
+def _as_date(day):
+    # func.date() and DISTINCT dates give strings on SQLite and dates on Postgres
+    return date.fromisoformat(day) if isinstance(day, str) else day
+
+def _as_datetime(day):
+    day = _as_date(day)
+    return datetime(day.year, day.month, day.day)
+
+
+def sketch_statement(kind, customer_ids=None, since=None, all_customers=False):
+    # (customer_id, registers) rows of `kind`: of customer_ids, of every customer (all_customers)
+    # or the shard-wide sketches (default), from day `since` on (from its month's first day when
+    # `since` is in the rolled-up months)
+    statement = select(table.c.customer_id, table.c.registers).where(table.c.kind == kind)
+    if customer_ids is not None:
+        statement = statement.where(table.c.customer_id.in_(customer_ids))
+    elif all_customers:
+        statement = statement.where(table.c.customer_id.is_not(None))
+    else:
+        statement = statement.where(table.c.customer_id.is_(None))
+    if since is not None:
+        since = since.date()
+        if since < rolled_before():
+            since = since.replace(day=1)
+        statement = statement.where(table.c.day >= since)
+    return statement
+
+def distinct_counts(rows):
+    # {customer_id: (approximate distinct count,)} of sketch_statement() rows
+    by_customer = defaultdict(list)
+    for customer_id, registers in rows:
+        by_customer[customer_id].append(registers)
+    return {customer_id: (HyperLogLog.union(registers).count(),) for customer_id, registers in by_customer.items()}
+
+def distinct_count(session, kind, customer_id=None, since=None):
+    # Approximate distinct values of `kind` for a customer, or for the session's whole shard
+    statement = sketch_statement(kind, None if customer_id is None else [customer_id], since)
+    return HyperLogLog.union(registers for _, registers in memo.execute(session, statement)).count()
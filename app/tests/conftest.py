@@ -0,0 +1,76 @@
+import os
+import time
+from flask import Flask
+import pytest
+from app import create_app
+from app.models import db
+from app.config import TestConfig
+from app.db_manager import sqlite_shard_path
+from app.jobs import FINISHED
+from utils.snapshots import restore_snapshot, build_snapshot, snapshot_config
+
+TEST_DB = TestConfig.TEST_DB
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app(config_obj=TestConfig)
+    db_manager = app.db_manager
+
+    with app.app_context():
+        for shard in db_manager.shards:
+            db.metadata.create_all(bind=shard.write_engine)
+
+    yield app
+
+    # Clean up
+    stop_job_runner(app)
+    with app.app_context():
+        db.session.remove()
+        for shard in db_manager.shards:
+            db.metadata.drop_all(bind=shard.write_engine)
+            shard.write_engine.dispose()
+            path = sqlite_shard_path(TestConfig.TEST_DB, shard.index)
+            if os.path.exists(path):
+                os.remove(path)
+
+@pytest.fixture(scope='session')
+def client(app: Flask):
+    with app.app_context():
+        with app.test_client() as client:
+            yield client
+
+@pytest.fixture
+def snapshot_app(tmp_path):
+    # Factory for an app on a seeded dataset: snapshot_app(SeedSpec(customers=1000, seed=1)).
+    # The dataset is built once per spec and schema (cached in .snapshots/), each test gets a
+    # private copy, or with read_only=True the cached file itself, opened immutable and mmapped.
+    apps = []
+
+    def make_app(spec, read_only=False, **config_overrides):
+        if read_only:
+            path = build_snapshot(spec)
+        else:
+            path = restore_snapshot(spec, str(tmp_path / f"snapshot-{spec.customers}-{spec.seed}.db"))
+        apps.append(create_app(config_obj=snapshot_config(path, read_only=read_only, **config_overrides)))
+        return apps[-1]
+    yield make_app
+
+    for app in apps:
+        stop_job_runner(app)
+
+@pytest.fixture
+def wait_for_job():
+    # wait_for_job(client, response of a submit): polls the job's status URL until it finished
+    def wait(client, response, timeout=30):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = client.get(response.headers["Location"]).get_json()
+            if job["status"] in FINISHED or time.monotonic() > deadline:
+                return job
+            time.sleep(0.02)
+    return wait
+
+def stop_job_runner(app):
+    runner = app.extensions.get("job_runner")
+    if runner is not None:
+        runner.stop()
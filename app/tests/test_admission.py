@@ -0,0 +1,64 @@
+import multiprocessing
+import threading
+import time
+from app.admission import EndpointGate
+from utils.bulk_seed import SeedSpec
+
+
+def try_acquire(path, result):
+    result.put(EndpointGate(path, 1, 0).acquire(timeout=0))
+
+def test_gate_limits_running_and_waiting_requests(tmp_path):
+    path = str(tmp_path / "endpoint.lock")
+    gate = EndpointGate(path, concurrency=1, queue=1)
+    slot = gate.acquire(timeout=0)
+    assert slot == 0
+
+    # One request may wait, the next one is shed at once
+    waited = []
+    waiter = threading.Thread(target=lambda: waited.append(gate.acquire(timeout=0.5)))
+    waiter.start()
+    while 1 not in gate._held:
+        time.sleep(0.001)  # until the waiter holds the queue slot
+    assert gate.acquire(timeout=0.5) is None
+    gate.release(slot)
+    waiter.join()
+    assert waited == [0]
+
+    # Other processes (workers) see the slot taken
+    result = multiprocessing.get_context("fork").Queue()
+    child = multiprocessing.get_context("fork").Process(target=try_acquire, args=(path, result))
+    child.start()
+    child.join()
+    assert result.get() is None
+    gate.release(0)
+
+def test_overloaded_endpoint_sheds_or_serves_stale(snapshot_app, tmp_path):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=3),
+                       ADMISSION_LIMITS={"customers.list_customers": (1, 0)},
+                       ADMISSION_LOCK_DIR=str(tmp_path / "admission"))
+    client = app.test_client()
+    gate = app.extensions["admission"].gates["customers.list_customers"]
+
+    slot = gate.acquire(timeout=0)  # a request in progress
+    response = client.get('/customers?page=1')
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    # Cheap endpoints are not limited
+    assert client.post('/customers/1/events', json={"event_type": "login"}).status_code == 302
+    gate.release(slot)
+
+    fresh = client.get('/customers?page=1')
+    assert fresh.status_code == 200 and "X-Admission" not in fresh.headers
+
+    slot = gate.acquire(timeout=0)
+    stale = client.get('/customers?page=1')
+    assert stale.status_code == 200
+    assert stale.headers["X-Admission"] == "stale"
+    assert stale.get_data() == fresh.get_data()
+    # Only the same URL has a last good response
+    assert client.get('/customers?page=2').status_code == 503
+    gate.release(slot)
+
+    stats = app.extensions["admission"].stats["customers.list_customers"]
+    assert stats == {"admitted": 1, "shed": 2, "stale": 1}
@@ -0,0 +1,64 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models import Customer, LoginEvent, SupportTicket
+from app.routes.customer import calculate_customer_health
+
+
+def test_async_customer_detail_matches_sync(client):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Async Detail Customer", segment="SMB")
+        session.add(customer)
+        session.commit()
+        customer_id = customer.id
+        for days in range(3):
+            session.add(LoginEvent(customer_id=customer_id, timestamp=datetime.now() - timedelta(days=days)))
+        session.add(SupportTicket(customer_id=customer_id, status="open", created_at=datetime.now(timezone.utc)))
+
+    response = client.get(f'/customers/{customer_id}/async')
+    assert response.status_code == 200
+    assert b'Async Detail Customer' in response.data
+
+    with current_app.db_manager.get_read_session() as session:
+        expected = calculate_customer_health(session, customer_id)
+    assert f"<strong>Health Score:</strong> {expected['health_score']}".encode() in response.data
+
+    assert client.get('/customers/99999/async').status_code == 404
+
+def test_async_dashboard_lists_risky_customers(client):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Async Risky Customer", segment="Startup")
+        session.add(customer)
+        session.commit()
+        for _ in range(8):
+            session.add(SupportTicket(customer_id=customer.id, status="open", created_at=datetime.now(timezone.utc)))
+
+    sync_response = client.get('/dashboard')
+    async_response = client.get('/dashboard/async')
+
+    assert async_response.status_code == 200
+    assert b'<td>Async Risky Customer</td>' in async_response.data
+    assert b'Latest Logins' in async_response.data
+    assert sync_response.data.count(b'table-danger') == async_response.data.count(b'table-danger')
+
+def test_async_views_run_no_sync_queries(client):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Async Only Customer", segment="SMB")
+        session.add(customer)
+        session.flush()
+        customer_id = customer.id
+    threads = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        threads.append(threading.current_thread().name)
+
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        for path in [f'/customers/{customer_id}/async', '/dashboard/async']:
+            assert client.get(path).status_code == 200
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+    # Feature totals included: every query ran on the async engines' loop
+    assert threads and set(threads) == {"async-db"}
@@ -0,0 +1,22 @@
+from benchmarks.common import percentiles
+from benchmarks.endpoints import benchmark_endpoints
+
+
+def test_percentiles():
+    summary = percentiles([float(v) for v in range(1, 101)])
+    assert summary["count"] == 100
+    assert summary["p50"] == 50.0
+    assert summary["p99"] == 99.0
+    assert summary["max"] == 100.0
+
+def test_endpoint_benchmark_reports_latency_and_queries(app):
+    results = benchmark_endpoints(app, customers=1, iterations=2, warmup=0,
+                                  only=["dashboard", "customers_by_name", "dashboard_async"])
+
+    assert set(results) == {"dashboard", "customers_by_name", "dashboard_async"}
+    for result in results.values():
+        assert result["latency_ms"]["count"] == 2
+        assert result["queries_per_request"] > 0
+        assert result["statuses"] == {200: 2}
+    # Queries of async views run on the async engines' loop thread, and are counted too
+    assert results["dashboard_async"]["queries_per_request"] >= 5
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from sqlalchemy import create_engine, func, select
+from app import create_app
+from app.config import TestConfig
+from app.lookups import id_of
+from app.models import db, Customer, LoginEvent, FeatureUsage, Invoice, InvoiceStatus, SupportTicket
+from utils.bulk_seed import SeedSpec, bulk_seed
+
+
+def seeded_engine(path, spec, workers=1):
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(bind=engine)
+    bulk_seed(engine, spec, workers=workers)
+    return engine
+
+def dump(engine):
+    with engine.connect() as connection:
+        return {
+            model: connection.execute(select(model.__table__).order_by(model.id)).all()
+            for model in [Customer, LoginEvent, FeatureUsage, Invoice]
+        }
+
+def test_bulk_seed_is_reproducible(tmp_path):
+    spec = SeedSpec(customers=25, events_per_customer=40, seed=7, chunk_size=10, anchor_date="2026-01-01")
+
+    first = dump(seeded_engine(tmp_path / "first.db", spec))
+    second = dump(seeded_engine(tmp_path / "second.db", spec))
+
+    assert len(first[Customer]) == 25
+    assert len(first[LoginEvent]) > 0
+    assert first == second
+
+    other = dump(seeded_engine(tmp_path / "other.db", SeedSpec(customers=25, events_per_customer=40, seed=8,
+                                                                chunk_size=10, anchor_date="2026-01-01")))
+    assert other[LoginEvent] != first[LoginEvent]
+
+def test_bulk_seed_appends_after_existing_customers(tmp_path):
+    spec = SeedSpec(customers=5, events_per_customer=10, seed=1)
+    engine = seeded_engine(tmp_path / "append.db", spec)
+    bulk_seed(engine, spec)
+
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count(Customer.id))).scalar() == 10
+        assert connection.execute(select(func.max(Customer.id))).scalar() == 10
+
+def test_bulk_seed_writes_customers_to_their_shards(tmp_path):
+    path = str(tmp_path / "sharded.db")
+    app = create_app(type("ShardedConfig", (TestConfig,), {"TEST_DB": path, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+                                                           "SHARD_COUNT": 2}))
+    engines = app.db_manager.shard_write_engines
+    for engine in engines:
+        db.metadata.create_all(bind=engine)
+    spec = SeedSpec(customers=15, events_per_customer=10, seed=2, chunk_size=4)
+    bulk_seed(engines, spec)
+    bulk_seed(engines, spec)
+
+    ids = []
+    for shard, engine in enumerate(engines):
+        with engine.connect() as connection:
+            customers = connection.execute(select(Customer.id)).scalars().all()
+            event_customers = set(connection.execute(select(LoginEvent.customer_id)).scalars())
+        assert customers and all(customer_id % 2 == shard for customer_id in customers)
+        assert event_customers <= set(customers)
+        ids.extend(customers)
+    assert len(set(ids)) == len(ids) == 30
+
+def test_bulk_seed_generates_no_future_events(tmp_path):
+    engine = seeded_engine(tmp_path / "past.db", SeedSpec(customers=300, events_per_customer=40, seed=4))
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with engine.connect() as connection:
+        for column in [LoginEvent.timestamp, FeatureUsage.timestamp, Invoice.issued_at, Invoice.paid_date,
+                       SupportTicket.closed_at]:
+            assert connection.execute(select(func.max(column))).scalar() <= now
+        # Late invoices were paid after their due date
+        assert connection.execute(select(func.count()).select_from(Invoice).where(
+            Invoice.status_id == id_of(InvoiceStatus, "late"), Invoice.paid_date <= Invoice.due_date)).scalar() == 0
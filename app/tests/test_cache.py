@@ -0,0 +1,71 @@
+import multiprocessing
+import time
+from app import cache
+from app.cache import MISSING, SharedCache
+from utils.bulk_seed import SeedSpec
+
+
+def set_in_child(path):
+    SharedCache(path, 1024 * 1024, 60).set("from-child", {"pid": "child"}, tags=["child"])
+
+def test_get_set_ttl_and_tags(tmp_path):
+    shared = SharedCache(str(tmp_path / "cache.db"), 1024 * 1024, 60)
+    assert shared.get("a") is MISSING
+    shared.set("a", [1, 2, 3], tags=["customer:1"])
+    shared.set("b", "expired", ttl=-1)
+    shared.set("c", "kept", tags=["customer:2"])
+    assert shared.get("a") == [1, 2, 3]
+    assert shared.get("b") is MISSING
+
+    shared.invalidate("customer:1")
+    assert shared.get("a") is MISSING
+    assert shared.get("c") == "kept"
+    assert shared.stats["hits"] == 2 and shared.stats["misses"] == 3
+
+def test_lru_eviction_keeps_the_byte_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "TOUCH_INTERVAL", 0)
+    shared = SharedCache(str(tmp_path / "cache.db"), 10_000, 60)
+    value = "x" * 1000
+    for i in range(8):
+        shared.set(f"key{i}", value)
+        time.sleep(0.001)
+    shared.get("key0")  # recently used again
+    for i in range(8, 12):
+        shared.set(f"key{i}", value)
+        time.sleep(0.001)
+
+    assert shared.used_bytes <= 10_000
+    assert shared.stats["evictions"] > 0
+    assert shared.get("key0") is not MISSING
+    assert shared.get("key1") is MISSING
+    assert shared.get("key11") is not MISSING
+    # Values above the budget are not stored
+    shared.set("huge", "x" * 20_000)
+    assert shared.get("huge") is MISSING
+
+def test_shared_between_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    shared = SharedCache(path, 1024 * 1024, 60)
+    shared.get("from-child")  # connection opened before the fork
+    child = multiprocessing.get_context("fork").Process(target=set_in_child, args=(path,))
+    child.start()
+    child.join()
+    assert shared.get("from-child") == {"pid": "child"}
+
+def test_recorded_events_invalidate_memoized_health(snapshot_app, tmp_path):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=4),
+                       SHARED_CACHE_PATH=str(tmp_path / "cache.db"))
+    client = app.test_client()
+    shared = cache.shared_cache(app)
+
+    first = client.get('/customers/1/health').get_data()
+    hits = shared.stats["hits"]
+    assert client.get('/customers/1/health').get_data() == first
+    assert shared.stats["hits"] == hits + 1
+
+    # A new event drops the customer's cached results
+    response = client.post('/customers/1/events', json={
+        "event_type": "ticket", "created_at": "2024-01-01T00:00:00", "status": "open"})
+    assert response.status_code == 302
+    client.get('/customers/1/health')
+    assert shared.stats["hits"] == hits + 1
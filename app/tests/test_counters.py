@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select
+from app import scoring
+from app.counters import WindowCounters, ready_counters, rebuild_from_db
+from app.models import LoginEvent
+from utils.bulk_seed import SeedSpec
+
+
+def test_window_counters_ring(tmp_path):
+    path = str(tmp_path / "counters.bin")
+    counters = WindowCounters(path, capacity=8, days=4)
+    today = datetime.now()
+    with counters.locked():
+        counters.rebuild([1, 2], [(1, "login", today.date(), 3), (1, "api", today.date() - timedelta(days=2), 5)])
+
+    assert counters.built_at > 0
+    assert counters.count(1, "login", today - timedelta(days=1)) == 3
+    assert counters.count(1, "api", today - timedelta(days=1)) == 0
+    assert counters.count(1, "api", today - timedelta(days=3)) == 5
+    assert counters.count(2, "login", today) == 0
+    assert counters.count(3, "login", today) is None  # not tracked: callers fall back to the database
+
+    assert counters.increment(2, "login", today)
+    assert not counters.increment(3, "login", today)
+    assert not counters.increment(2, "login", today - timedelta(days=4))  # outside the ring
+
+    # Another worker mapping the same file shares the counts
+    other = WindowCounters(path, capacity=8, days=4)
+    assert other.count(2, "login", today) == 1
+    other.increment(2, "login", today)
+    assert counters.count(2, "login", today) == 2
+
+    # A bucket holding an older day of the ring is reset before it is reused
+    with counters.locked():
+        counters._add(counters._slot(1), "login", date.today().toordinal() + 2, 1)
+    assert counters.count(1, "api", today - timedelta(days=3)) == 0
+
+    # Another layout starts from an empty, not yet built file
+    assert WindowCounters(path, capacity=16, days=4).built_at == 0
+
+def test_scores_use_window_counters(snapshot_app, tmp_path):
+    app = snapshot_app(SeedSpec(customers=20, events_per_customer=60, seed=4),
+                       WINDOW_COUNTERS_PATH=str(tmp_path / "counters.bin"))
+    # Nothing is read from the database until the counters are first used
+    assert app.extensions["window_counters"].built_at == 0
+    counters = ready_counters(app)
+    assert counters.built_at > 0
+    since = datetime.combine(date.today() - timedelta(days=30), datetime.min.time())
+
+    logins = {}
+    with app.db_manager.get_read_session() as session:
+        for customer_id in range(1, 21):
+            logins[customer_id] = session.execute(select(func.count()).select_from(LoginEvent).where(
+                LoginEvent.customer_id == customer_id, LoginEvent.timestamp >= since)).scalar()
+            assert counters.count(customer_id, "login", since) == logins[customer_id]
+
+    # A customer whose login score isn't capped yet
+    customer_id = min(logins, key=logins.get)
+    before = logins[customer_id]
+    assert before < 8
+    client = app.test_client()
+    client.post(f'/customers/{customer_id}/events', json={"event_type": "login", "timestamp": datetime.now().isoformat()})
+    assert counters.count(customer_id, "login", since) == before + 1
+
+    # Scores read the counters: a login written behind their back isn't seen until the next rebuild
+    def login_scores():
+        with app.db_manager.get_read_session() as session:
+            health = scoring.bulk_customer_health(session, [customer_id], datetime.now())[customer_id]
+        return health["scores"]["logins"], health["windows"]["90d"]["scores"]["logins"]
+
+    with app.app_context():
+        with app.db_manager.get_write_session() as session:
+            session.add(LoginEvent(customer_id=customer_id, timestamp=datetime.now()))
+        score, score_90d = login_scores()
+        assert score == scoring.login_score(before + 1)
+        # The 90-day window is longer than the ring: counted by the database
+        assert app.extensions["window_counters"].days < 90
+        rebuild_from_db(counters, app.db_manager)
+        assert login_scores() == (scoring.login_score(before + 2), score_90d)
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import Customer, FeatureUsage, LoginEvent
+
+
+def create_customer_with_events(name):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name=name, segment="Export")
+        session.add(customer)
+        session.commit()
+        session.add(LoginEvent(customer_id=customer.id, timestamp=datetime.now() - timedelta(days=40)))
+        session.add(LoginEvent(customer_id=customer.id, timestamp=datetime.now() - timedelta(days=1)))
+        session.add(FeatureUsage(customer_id=customer.id, feature_name="Reports", timestamp=datetime.now()))
+        return customer.id
+
+def test_export_customers_csv(client):
+    customer_id = create_customer_with_events("Export Customer")
+
+    response = client.get('/api/export/customers?segment=Export')
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.is_streamed
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["id"] for row in rows] == [str(customer_id)]
+    assert rows[0]["name"] == "Export Customer"
+    assert rows[0]["logins"] == "10"
+    assert float(rows[0]["health_score"]) > 0
+
+def test_export_events_ndjson_with_filters(client):
+    customer_id = create_customer_with_events("Export Events Customer")
+
+    response = client.get(f'/api/export/events?format=ndjson&type=login&customer_id={customer_id}'
+                          f'&from={(datetime.now() - timedelta(days=7)).isoformat()}')
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(events) == 1
+    assert events[0]["event_type"] == "login"
+    assert events[0]["customer_id"] == customer_id
+
+    response = client.get(f'/api/export/events?format=ndjson&customer_id={customer_id}')
+    assert sorted(e["event_type"] for e in map(json.loads, response.get_data(as_text=True).splitlines())) == \
+        ["feature", "login", "login"]
+
+def test_export_rejects_invalid_filters(client):
+    assert client.get('/api/export/events?type=unknown').status_code == 400
+    assert client.get('/api/export/events?from=yesterday').status_code == 400
+    assert client.get('/api/export/customers?format=xml').status_code == 400
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models import ApiUsage, Customer, LoginEvent
+from utils.bulk_seed import SeedSpec
+
+
+def test_health_of_every_window(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=7))
+    client = app.test_client()
+    now = datetime.now()
+    with app.db_manager.get_write_session() as session:
+        customer = Customer(name="Windowed Customer", segment="SMB")
+        session.add(customer)
+        session.flush()
+        customer_id = customer.id
+        for days, logins in [(2, 1), (20, 2), (60, 3), (120, 5)]:
+            session.add_all([LoginEvent(customer_id=customer_id, timestamp=now - timedelta(days=days))
+                             for _ in range(logins)])
+        session.add_all([ApiUsage(customer_id=customer_id, api_endpoint="windows", timestamp=now - timedelta(days=50))
+                         for _ in range(30)])
+
+    login_selects = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM logins" in statement:
+            login_selects.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        health = client.get(f'/api/customers/{customer_id}/health').get_json()
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+
+    # One scan of the logins for all windows
+    assert len(login_selects) == 1
+    windows = [health["windows"][window] for window in ("7d", "30d", "90d")]
+    assert len(health["windows"]) == 3
+    # Counts scaled to 30 days: 1 login in 7 days ~ 4, 3 in 30, 6 in 90 ~ 2
+    assert [w["scores"]["logins"] for w in windows] == [40, 30, 20]
+    assert [w["scores"]["api_usage"] for w in windows] == [0, 0, 10]
+    # The top level health is the 30 days window's
+    assert health["health_score"] == windows[1]["health_score"]
+    assert health["scores"] == windows[1]["scores"]
+    assert windows[0]["health_score"] > windows[1]["health_score"]
+
+    page = client.get(f'/customers/{customer_id}/health').get_data(as_text=True)
+    assert "Last 7 days" in page and "Last 90 days" in page
+    assert client.get('/api/customers/999999/health').status_code == 404
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from app import sketches
+from app.models import ApiUsage, Customer, FeatureUsage, Invoice, LoginEvent
+
+
+def add_customer(name):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name=name, segment="SMB")
+        session.add(customer)
+        session.flush()
+        return customer.id
+
+def count(model, customer_id):
+    with current_app.db_manager.get_read_session() as session:
+        return session.execute(select(func.count()).select_from(model).where(model.customer_id == customer_id)).scalar()
+
+def test_retried_events_are_recorded_once(client):
+    customer_id = add_customer("Retrying Customer")
+    event = {"event_type": "feature", "feature_name": "Retries", "event_id": "feature-1",
+             "timestamp": (datetime.now() - timedelta(hours=1)).isoformat()}
+
+    first = client.post(f'/customers/{customer_id}/events', json=event, follow_redirects=True)
+    assert b'event recorded successfully' in first.data
+    retry = client.post(f'/customers/{customer_id}/events', json=event, follow_redirects=True)
+    assert b'event already recorded' in retry.data
+    assert count(FeatureUsage, customer_id) == 1
+
+    # Ids are per customer and event type; events without an id are always recorded
+    other_id = add_customer("Other Retrying Customer")
+    client.post(f'/customers/{other_id}/events', json=event)
+    client.post(f'/customers/{customer_id}/events', json={**event, "event_type": "login"})
+    for _ in range(2):
+        client.post(f'/customers/{customer_id}/events', json={**event, "event_id": ""})
+    assert count(FeatureUsage, other_id) == 1
+    assert count(LoginEvent, customer_id) == 1
+    assert count(FeatureUsage, customer_id) == 3
+
+def test_batches_can_be_resent(client):
+    first_id, second_id = add_customer("Batch Customer"), add_customer("Other Batch Customer")
+    now = datetime.now() - timedelta(minutes=5)
+    events = [
+        {"customer_id": first_id, "event_type": "login", "event_id": "l-1", "timestamp": now.isoformat()},
+        {"customer_id": first_id, "event_type": "api", "event_id": "a-1", "endpoint": "batch", "timestamp": now.isoformat()},
+        {"customer_id": second_id, "event_type": "feature", "event_id": "f-1", "feature_name": "Batching",
+         "timestamp": now.isoformat()},
+        {"customer_id": second_id, "event_type": "feature", "event_id": "f-2", "feature_name": "Resending",
+         "timestamp": now.isoformat()},
+        # Repeated within the batch
+        {"customer_id": second_id, "event_type": "feature", "event_id": "f-2", "feature_name": "Resending",
+         "timestamp": now.isoformat()},
+        {"customer_id": second_id, "event_type": "invoice", "event_id": "i-1", "issued_at": now.isoformat(),
+         "due_date": (now + timedelta(days=30)).isoformat(), "amount": "120.5"},
+    ]
+
+    response = client.post('/api/events/batch', json={"events": events})
+    assert response.status_code == 200
+    shards = [{"shard": 0, "status": "recorded", "events": 6}]
+    assert response.get_json() == {"received": 6, "inserted": 5, "duplicates": 1, "failed": 0, "shards": shards}
+    resent = client.post('/api/events/batch', json={"events": events}).get_json()
+    assert resent == {"received": 6, "inserted": 0, "duplicates": 6, "failed": 0, "shards": shards}
+
+    assert count(LoginEvent, first_id) == count(ApiUsage, first_id) == 1
+    assert count(FeatureUsage, second_id) == 2 and count(Invoice, second_id) == 1
+    with current_app.db_manager.get_read_session() as session:
+        assert sketches.distinct_count(session, "feature", second_id) == 2
+        assert sketches.distinct_count(session, "api_endpoint", first_id) == 1
+    health = client.get(f'/api/customers/{first_id}/health').get_json()
+    assert health["windows"]["7d"]["scores"]["logins"] > 0
+
+def test_invalid_batches_are_rejected(client):
+    customer_id = add_customer("Invalid Batch Customer")
+    events = [
+        {"customer_id": customer_id, "event_type": "login", "event_id": "ok", "timestamp": datetime.now().isoformat()},
+        {"customer_id": customer_id, "event_type": "login"},
+        {"customer_id": customer_id, "event_type": "invoice", "issued_at": "2024-01-02", "due_date": "2024-01-01",
+         "amount": 10},
+        {"customer_id": "one", "event_type": "login", "timestamp": "2024-01-01"},
+    ]
+    response = client.post('/api/events/batch', json={"events": events})
+    assert response.status_code == 400
+    assert [e["index"] for e in response.get_json()["errors"]] == [1, 2, 3]
+    assert count(LoginEvent, customer_id) == 0
+
+    missing = client.post('/api/events/batch', json={"events": [
+        {"customer_id": 999999, "event_type": "login", "timestamp": "2024-01-01"}]})
+    assert missing.status_code == 400
+    assert missing.get_json()["errors"] == [{"index": 0, "message": "Customer 999999 does not exist"}]
+    assert client.post('/api/events/batch', json={"events": []}).status_code == 400
@@ -0,0 +1,93 @@
+import time
+from datetime import datetime, timedelta, timezone
+from app import jobs
+from app.models import Customer, Job
+from utils import seed_db
+from utils.bulk_seed import SeedSpec
+
+@jobs.job("test_wait")
+def wait_job(app, job, steps=1000):
+    # Reports progress every 10ms, `steps` times (or until cancelled)
+    for step in range(steps):
+        job.progress(step, steps)
+        time.sleep(0.01)
+    return {"steps": steps}
+
+
+def job_status(client, job_id):
+    return client.get(f'/api/jobs/{job_id}').get_json()["status"]
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+def test_seed_returns_a_job(snapshot_app, wait_for_job, monkeypatch):
+    monkeypatch.setattr(seed_db, "NEW_CUSTOMERS", 3)
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=2))
+    client = app.test_client()
+
+    response = client.post('/dashboard/seed', headers={"Accept": "application/json"})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    assert response.headers["Location"].endswith(f"/api/jobs/{job_id}")
+
+    job = wait_for_job(client, response)
+    assert job["status"] == "succeeded"
+    assert job["kind"] == "bulk_seed"
+    assert job["progress"] == {"done": 1, "total": 1}
+    with app.db_manager.get_read_session() as session:
+        assert session.query(Customer).count() == 3
+
+    # Form posts are redirected to the dashboard
+    response = client.post('/dashboard/seed', headers={"Accept": "text/html"})
+    assert response.status_code == 302
+    wait_until(lambda: job_status(client, job_id + 1) == "succeeded")
+
+def test_concurrency_limit_and_cancellation(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=2), JOB_CONCURRENCY=1)
+    client = app.test_client()
+
+    first = client.post('/api/jobs', json={"kind": "test_wait"}).get_json()["job_id"]
+    second = client.post('/api/jobs', json={"kind": "test_wait", "params": {"steps": 5}}).get_json()["job_id"]
+    wait_until(lambda: job_status(client, first) == "running")
+    time.sleep(0.2)
+    # Only one job runs at a time
+    assert job_status(client, second) == "queued"
+
+    # Queued jobs are cancelled at once
+    response = client.post(f'/api/jobs/{second}/cancel')
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "cancelled"
+    assert client.post(f'/api/jobs/{second}/cancel').status_code == 409
+
+    # Running ones at their next progress report
+    assert client.post(f'/api/jobs/{first}/cancel').get_json()["cancel_requested"]
+    wait_until(lambda: job_status(client, first) == "cancelled")
+    job = client.get(f'/api/jobs/{first}').get_json()
+    assert job["progress"]["total"] == 1000 and job["finished_at"]
+
+    # The slot is free again
+    third = client.post('/api/jobs', json={"kind": "test_wait", "params": {"steps": 3}}).get_json()["job_id"]
+    wait_until(lambda: job_status(client, third) == "succeeded")
+    assert [j["id"] for j in client.get('/api/jobs?status=cancelled').get_json()["jobs"]] == [second, first]
+
+def test_job_validation(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=2))
+    client = app.test_client()
+    assert client.post('/api/jobs', json={"kind": "nope"}).status_code == 400
+    assert client.post('/api/jobs', json={"kind": "test_wait", "params": {"unknown": 1}}).status_code == 400
+    assert client.get('/api/jobs/999').status_code == 404
+    assert client.post('/api/jobs/999/cancel').status_code == 404
+
+def test_stale_running_jobs_are_failed(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=2), JOB_RUNNER="")
+    with app.db_manager.get_write_session(shard=0) as session:
+        session.add(Job(kind="test_wait", status="running",
+                        heartbeat_at=datetime.now(timezone.utc) - timedelta(hours=1)))
+    queued = jobs.submit(app, "test_wait", steps=1)
+
+    assert jobs.claim(app, "test", concurrency=1, stale_after=60) == (queued, "test_wait", {"steps": 1})
+    stale = jobs.list_jobs(app, status="failed")
+    assert len(stale) == 1 and "stopped responding" in stale[0]["error"]
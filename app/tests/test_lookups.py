@@ -0,0 +1,86 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, func, select
+from app import reads
+from app.models import ApiUsage, Customer, FeatureName, FeatureUsage, Invoice, SupportTicket, TicketStatus
+from utils.bulk_seed import SeedSpec
+
+
+def test_events_store_lookup_ids(client):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Lookup Customer", segment="Lookups")
+        session.add(customer)
+        session.commit()
+        session.add_all([
+            FeatureUsage(customer_id=customer.id, feature_name="Lookup Reports", timestamp=datetime.now()),
+            FeatureUsage(customer_id=customer.id, feature_name="Lookup Reports", timestamp=datetime.now()),
+            ApiUsage(customer_id=customer.id, api_endpoint="/lookup", timestamp=datetime.now()),
+            SupportTicket(customer_id=customer.id),
+            Invoice(customer_id=customer.id, due_date=datetime.now(), amount=10, status="late"),
+        ])
+        session.commit()
+        customer_id = customer.id
+
+        features = session.query(FeatureUsage).filter_by(customer_id=customer_id).all()
+        assert {f.feature_name for f in features} == {"Lookup Reports"}
+        assert len({f.feature_id for f in features}) == 1
+        assert session.execute(select(func.count()).where(FeatureName.name == "Lookup Reports")).scalar() == 1
+        # Default statuses are encoded too
+        ticket = session.query(SupportTicket).filter_by(customer_id=customer_id).one()
+        assert ticket.status == "open"
+        assert ticket.status_id == session.execute(select(TicketStatus.id).where(TicketStatus.name == "open")).scalar()
+
+        ticket.status = "closed"
+        session.commit()
+        session.expire_all()
+        assert session.query(SupportTicket).filter_by(customer_id=customer_id).one().status == "closed"
+
+    # Core reads give the names back under the model's attribute names
+    with current_app.db_manager.get_read_session(customer_id) as session:
+        invoice = reads.first(session, Invoice, reads.select_rows(Invoice).where(Invoice.customer_id == customer_id))
+        assert invoice.status == "late"
+        api = reads.first(session, ApiUsage, reads.select_rows(ApiUsage).where(ApiUsage.customer_id == customer_id))
+        assert api.api_endpoint == "/lookup"
+
+def test_known_names_need_no_lookup_query(client):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Cached Lookup Customer")
+        session.add(customer)
+        session.commit()
+        session.add(FeatureUsage(customer_id=customer.id, feature_name="Cached Feature", timestamp=datetime.now()))
+        session.commit()
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        engine = session.get_bind()
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            session.add(FeatureUsage(customer_id=customer.id, feature_name="Cached Feature", timestamp=datetime.now()))
+            session.commit()
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert not [s for s in statements if "feature_names" in s]
+
+def test_rolled_back_names_are_not_cached(client):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Rollback Lookup Customer")
+        session.add(customer)
+        session.commit()
+        session.add(FeatureUsage(customer_id=customer.id, feature_name="Rolled Back", timestamp=datetime.now()))
+        session.flush()
+        session.rollback()
+
+        session.add(FeatureUsage(customer_id=customer.id, feature_name="Rolled Back", timestamp=datetime.now()))
+        session.commit()
+        feature = session.query(FeatureUsage).filter_by(customer_id=customer.id).one()
+        assert feature.feature_id == session.execute(
+            select(FeatureName.id).where(FeatureName.name == "Rolled Back")).scalar()
+
+def test_bulk_seed_encodes_names(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=20, events_per_customer=30, seed=4))
+    with app.db_manager.get_read_session() as session:
+        names = set(session.execute(select(FeatureName.name)).scalars())
+        used = {f.feature_name for f in reads.fetch(session, FeatureUsage)}
+        assert used and used <= names
+        assert session.execute(select(func.count()).select_from(FeatureUsage)
+                               .where(FeatureUsage.feature_id.is_(None))).scalar() == 0
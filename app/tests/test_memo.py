@@ -0,0 +1,48 @@
+from flask import g
+from sqlalchemy import event, select, update
+from sqlalchemy.engine import Engine
+from app import memo, reads
+from app.models import Customer
+from utils.bulk_seed import SeedSpec
+
+
+def test_customer_page_loads_the_customer_once(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=5))
+    client = app.test_client()
+    customer_selects = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM customers" in statement:
+            customer_selects.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        response = client.get('/customers/1')
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+
+    assert response.status_code == 200
+    # The view and calculate_customer_health read the same row
+    assert len(customer_selects) == 1
+    assert response.headers["X-Read-Memo"].startswith("hits=1;")
+
+def test_only_read_sessions_are_memoized(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=5))
+    statement = reads.select_rows(Customer).where(Customer.id == 1)
+
+    with app.test_request_context():
+        with app.db_manager.get_read_session(1) as session:
+            first = reads.first(session, Customer, statement)
+            assert reads.first(session, Customer, statement) == first
+            # Different parameters are a different entry
+            assert reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == 2)).id == 2
+        with app.db_manager.get_write_session(1) as session:
+            reads.first(session, Customer, statement)
+            session.execute(update(Customer).where(Customer.id == 1).values(name="Renamed"))
+            assert memo.execute(session, select(Customer.name).where(Customer.id == 1)).scalar() == "Renamed"
+        assert g.read_memo_stats == {"hits": 1, "misses": 2}
+
+        # A new session reads again
+        with app.db_manager.get_read_session(1) as session:
+            assert reads.first(session, Customer, statement).name == "Renamed"
+        assert g.read_memo_stats == {"hits": 1, "misses": 3}
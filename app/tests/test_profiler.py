@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import threading
+import pytest
+from app import create_app
+from app.config import TestConfig
+
+
+def make_profiled_app(tmp_path, **overrides):
+    config = type("ProfiledTestConfig", (TestConfig,), {
+        "SECRET_KEY": "profile-test-secret",
+        "PROFILE_DIR": str(tmp_path),
+        **overrides,
+    })
+    return create_app(config_obj=config)
+
+def test_sampled_requests_are_profiled(app, tmp_path):
+    profiled_app = make_profiled_app(tmp_path, PROFILE_SAMPLE_RATE=1.0)
+
+    response = profiled_app.test_client().get('/customers')
+    assert response.status_code == 200
+
+    metadata_files = [f for f in os.listdir(tmp_path) if f.endswith(".json")]
+    assert len(metadata_files) == 1
+    with open(tmp_path / metadata_files[0]) as f:
+        metadata = json.load(f)
+    assert metadata["route"] == "/customers"
+    assert metadata["trigger"] == "sample"
+    assert metadata["db_queries"] > 0
+    assert os.path.exists(tmp_path / metadata["profile_file"])
+
+def test_signed_header_triggers_profile(app, tmp_path):
+    profiled_app = make_profiled_app(tmp_path, PROFILE_MODE="collapsed")
+    profiler = profiled_app.extensions["profiler"]
+    client = profiled_app.test_client()
+
+    client.get('/dashboard', headers={profiler.header: "not-a-valid-token"})
+    assert profiler.captures() == []
+
+    client.get('/dashboard', headers={profiler.header: profiler.make_token()})
+    captures = profiler.captures()
+    assert len(captures) == 1
+    assert captures[0]["trigger"] == "header"
+    assert captures[0]["profile_file"].endswith(".collapsed")
+
+def test_failing_requests_are_profiled(app, tmp_path):
+    for mode in ["pstats", "collapsed"]:
+        profiled_app = make_profiled_app(tmp_path / mode, PROFILE_SAMPLE_RATE=1.0, PROFILE_MODE=mode)
+        profiled_app.add_url_rule('/failing', 'failing', lambda: 1 / 0)
+        threads = threading.active_count()
+
+        with pytest.raises(ZeroDivisionError):
+            profiled_app.test_client().get('/failing')
+        # The profiler is stopped and the capture stored
+        assert sys.getprofile() is None and threading.active_count() == threads
+        [capture] = profiled_app.extensions["profiler"].captures()
+        assert capture["status"] == 500 and capture["error"] == "ZeroDivisionError"
+
+def test_profiles_are_rotated_and_listed(app, tmp_path):
+    profiled_app = make_profiled_app(tmp_path, PROFILE_SAMPLE_RATE=1.0, PROFILE_MAX_FILES=2)
+    client = profiled_app.test_client()
+
+    for _ in range(4):
+        client.get('/dashboard')
+
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".json")]) == 2
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".prof")]) == 2
+
+    response = client.get('/admin/profiles')
+    assert response.status_code == 200
+    assert b'Request Profiles' in response.data
+    assert b'/dashboard' in response.data
+
+def test_admin_pages_need_a_token_outside_tests(tmp_path):
+    # Config's default FLASK_ENV is "development"; admin pages are only open when TESTING
+    admin_app = make_profiled_app(tmp_path, TESTING=False, FLASK_ENV="development")
+    client = admin_app.test_client()
+    for path in ['/admin/profiles', '/api/jobs']:
+        assert client.get(path).status_code == 403
+
+    profiler = admin_app.extensions["profiler"]
+    assert client.get('/admin/profiles', headers={profiler.header: profiler.make_token()}).status_code == 200
@@ -0,0 +1,45 @@
+import re
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from utils.bulk_seed import SeedSpec
+
+# Tables that hot queries must only read through an index (customers are listed in full by the
+# dashboard, lookup tables are tiny)
+INDEXED_TABLES = {"logins", "feature_usage", "api_usage", "support_tickets", "invoices", "sketches"}
+HOT_PATHS = ["/customers/{id}", "/customers/{id}/async", "/customers/{id}/health", "/dashboard", "/dashboard/async",
+             "/api/customers/{id}/timeline?metric=api_calls", "/api/customers/{id}/timeline?metric=invoices&bucket=month"]
+
+
+def captured_statements(app, paths):
+    # Distinct (SQL, parameters) executed by the app while serving `paths`, on any engine
+    statements = {}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.setdefault(statement, tuple(parameters))
+
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        client = app.test_client()
+        for path in paths:
+            assert client.get(path).status_code == 200, path
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+    return statements
+
+def full_scans(connection, statement, parameters):
+    # Tables of INDEXED_TABLES read without an index in SQLite's plan of the statement
+    plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    scans = [re.match(r"SCAN (\w+)(.*)", detail) for _, _, _, detail in plan]
+    return [scan.group(1) for scan in scans
+            if scan and scan.group(1) in INDEXED_TABLES and "INDEX" not in scan.group(2)]
+
+def test_hot_queries_use_indexes(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=200, events_per_customer=100, seed=7))
+    statements = captured_statements(app, [path.format(id=42) for path in HOT_PATHS])
+    assert len(statements) > 10
+
+    with app.db_manager.shard_for(42).write_engine.connect() as connection:
+        regressions = {statement: tables for statement, parameters in statements.items()
+                       if (tables := full_scans(connection, statement, parameters))}
+    assert not regressions, "\n\n".join(f"{tables}: {statement}" for statement, tables in regressions.items())
@@ -0,0 +1,55 @@
+from sqlalchemy import event, select
+from sqlalchemy.orm import Mapper
+from app import reads, scoring
+from app.models import ApiUsage, Customer, FeatureUsage, Invoice, LoginEvent, SupportTicket
+from app.routes.dashboard import latest_actions
+from utils.bulk_seed import SeedSpec
+
+
+def test_rows_serialize_like_the_models(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=10, events_per_customer=20, seed=6))
+    with app.db_manager.get_read_session() as session:
+        for model in (Customer, LoginEvent, FeatureUsage, SupportTicket, Invoice, ApiUsage):
+            statement = reads.select_rows(model).order_by(model.id).limit(50)
+            records = reads.fetch(session, model, statement)
+            objects = session.query(model).order_by(model.id).limit(50).all()
+            assert records and len(records) == len(objects)
+            assert reads.as_dicts(records) == [o.to_dict() for o in objects]
+            # Same attribute names as the models, no identity map involved
+            assert [r.id for r in records] == [o.id for o in objects]
+            assert not hasattr(records[0], "__dict__")
+
+        assert reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == 3)).id == 3
+        assert reads.first(session, Customer, reads.select_rows(Customer).where(Customer.id == 999)) is None
+    assert reads.as_dicts([]) == []
+
+def test_dashboard_latest_actions_from_rows(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=10, events_per_customer=20, seed=6))
+    with app.app_context():
+        latest = latest_actions()
+    with app.db_manager.get_read_session() as session:
+        newest = session.query(Invoice).order_by(Invoice.issued_at.desc()).limit(5).all()
+        assert latest["invoices"] == [i.to_dict() for i in newest]
+
+def test_customer_reads_load_no_orm_objects(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=10, events_per_customer=20, seed=6))
+    client = app.test_client()
+    with app.db_manager.get_read_session() as session:
+        customer_id = session.execute(select(Invoice.customer_id).limit(1)).scalar()
+    loaded = []
+
+    def on_load(target, context):
+        loaded.append(target)
+
+    event.listen(Mapper, "load", on_load)
+    try:
+        assert client.get(f'/customers/{customer_id}').status_code == 200
+        assert client.get(f'/api/customers/{customer_id}/diversity').status_code == 200
+        score = client.get(f'/api/customers/{customer_id}/health').get_json()["scores"]["invoices"]
+    finally:
+        event.remove(Mapper, "load", on_load)
+    assert loaded == []
+
+    with app.db_manager.get_read_session() as session:
+        invoices = session.query(Invoice).filter_by(customer_id=customer_id).all()
+    assert invoices and score == scoring.invoice_score(len(invoices), sum(i.status == "unpaid" for i in invoices))
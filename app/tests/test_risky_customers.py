@@ -0,0 +1,46 @@
+from app import scoring
+from app.constants import Constants
+from app.models import Customer
+from app.routes import dashboard
+from utils.bulk_seed import SeedSpec
+
+
+def test_at_risk_customers_are_ranked_and_paginated(snapshot_app, monkeypatch):
+    monkeypatch.setattr(dashboard, "RISKY_BATCH_SIZE", 7)  # several batches per shard
+    app = snapshot_app(SeedSpec(customers=200, events_per_customer=5, seed=8))
+    client = app.test_client()
+
+    with app.app_context(), app.db_manager.get_read_session() as session:
+        ids = [c.id for c in session.query(Customer)]
+        health = scoring.bulk_customer_health(session, ids)
+    expected = sorted((h["health_score"], customer_id) for customer_id, h in health.items()
+                      if h["health_score"] <= Constants.AT_RISK_THRESHOLD)
+    assert len(expected) > 25
+
+    first = client.get('/api/customers/at-risk?per_page=10').get_json()
+    assert first["total"] == len(expected)
+    assert [(c["health_score"], c["id"]) for c in first["customers"]] == expected[:10]
+    third = client.get('/api/customers/at-risk?per_page=10&page=3').get_json()
+    assert [(c["health_score"], c["id"]) for c in third["customers"]] == expected[20:30]
+    beyond = client.get(f'/api/customers/at-risk?per_page=10&page={len(expected) // 10 + 2}').get_json()
+    assert beyond["customers"] == [] and beyond["total"] == len(expected)
+
+    # Pages past the live ranks come from the stored scores, merged across shards in the same order
+    with app.app_context():
+        scoring.rescore(app.db_manager)
+    with monkeypatch.context() as m:
+        m.setattr(dashboard, "RISKY_LIVE_RANKS", 15)
+        assert client.get('/api/customers/at-risk?per_page=10&page=3').get_json() == third
+
+    # The dashboards render one page and the total
+    for path in ['/dashboard', '/dashboard/async']:
+        page = client.get(f'{path}?risk_page=2').get_data(as_text=True)
+        assert f"{len(expected)} customers at risk" in page
+        assert page.count('<tr class="table-danger">') == min(dashboard.RISKY_PER_PAGE, len(expected) - dashboard.RISKY_PER_PAGE)
+        assert "?risk_page=1" in page
+    with monkeypatch.context() as m:
+        m.setattr(dashboard, "RISKY_LIVE_RANKS", 15)
+        for path in ['/dashboard', '/dashboard/async']:
+            page = client.get(f'{path}?risk_page=2').get_data(as_text=True)
+            assert f"{len(expected)} customers at risk" in page
+            assert page.count('<tr class="table-danger">') == min(dashboard.RISKY_PER_PAGE, len(expected) - dashboard.RISKY_PER_PAGE)
@@ -0,0 +1,77 @@
+import json
+import os
+from sqlalchemy import delete
+from app import scoring, weights
+from app.constants import Constants
+from app.models import CustomerHealthScore
+from utils.bulk_seed import SeedSpec
+
+
+def write_settings(path, data, mtime):
+    with open(path, "w") as f:
+        f.write(data if isinstance(data, str) else json.dumps(data))
+    os.utime(path, (mtime, mtime))
+
+def test_settings_are_reloaded_when_the_file_changes(snapshot_app, tmp_path):
+    path = str(tmp_path / "scoring.json")
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=10, seed=2), SCORING_SETTINGS_PATH=path)
+    client = app.test_client()
+
+    assert client.get('/api/scoring/settings').get_json()["weights"]["logins"] == Constants.LOGIN_WEIGHT
+
+    write_settings(path, {"weights": {"logins": 1, "feature_adoption": 0, "support_tickets": 0,
+                                      "invoices": 0, "api_usage": 0}, "thresholds": {"at_risk": 40}}, 1_000_000)
+    settings = client.get('/api/scoring/settings').get_json()
+    assert settings["weights"]["logins"] == 1
+    assert settings["thresholds"] == {"at_risk": 40, "moderate_risk": Constants.MODERATE_RISK_THRESHOLD,
+                                      "not_at_risk": Constants.NOT_AT_RISK_THRESHOLD}
+    with app.app_context():
+        assert scoring.health_from_scores(1, 70, 100, 100, 100, 100)["health_score"] == 70
+
+    # Invalid edits are ignored, the last good settings stay in effect
+    write_settings(path, {"weights": {"logins": -1}}, 2_000_000)
+    assert client.get('/api/scoring/settings').get_json()["weights"]["logins"] == 1
+    write_settings(path, "{not json", 3_000_000)
+    assert client.get('/api/scoring/settings').get_json()["thresholds"]["at_risk"] == 40
+
+    os.remove(path)
+    assert client.get('/api/scoring/settings').get_json() == weights.as_dict(weights.DEFAULTS)
+
+def test_simulate_over_stored_components(snapshot_app, wait_for_job):
+    app = snapshot_app(SeedSpec(customers=40, events_per_customer=30, seed=9))
+    client = app.test_client()
+    # Snapshots come scored, start without stored scores
+    with app.db_manager.get_write_session() as session:
+        session.execute(delete(CustomerHealthScore))
+    assert client.post('/api/scoring/simulate', json={"weights": {"logins": 0.5}}).status_code == 409
+
+    wait_for_job(client, client.post('/api/segments/health/refresh'))
+    with app.db_manager.get_read_session() as session:
+        stored = {s.customer_id: s.health_score for s in session.query(CustomerHealthScore)}
+    baseline_at_risk = sum(1 for score in stored.values() if score <= Constants.AT_RISK_THRESHOLD)
+
+    response = client.post('/api/scoring/simulate', json={"candidates": [
+        {},
+        {"thresholds": {"at_risk": 100}},
+        {"weights": {"logins": 0, "feature_adoption": 0, "support_tickets": 0, "invoices": 0, "api_usage": 0}},
+    ], "limit": 5})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["customers"] == 40
+    assert result["baseline"]["at_risk"] == baseline_at_risk
+    assert result["baseline"]["health_score"]["mean"] == round(sum(stored.values()) / 40, 2)
+    assert sum(result["baseline"]["health_score"]["histogram"]) == 40
+
+    unchanged, everyone, zeroed = result["candidates"]
+    assert unchanged["at_risk_changes"] == {"added_count": 0, "removed_count": 0, "added": [], "removed": []}
+    assert everyone["at_risk"] == 40
+    assert everyone["at_risk_changes"]["added_count"] == 40 - baseline_at_risk
+    assert len(everyone["at_risk_changes"]["added"]) == min(5, 40 - baseline_at_risk)
+    assert zeroed["health_score"]["p90"] == 0
+
+def test_simulate_rejects_invalid_candidates(client):
+    assert client.post('/api/scoring/simulate', data="nope").status_code == 400
+    assert client.post('/api/scoring/simulate', json={"weights": {"karma": 1}}).status_code == 400
+    assert client.post('/api/scoring/simulate', json={"weights": {"logins": "high"}}).status_code == 400
+    assert client.post('/api/scoring/simulate', json={"candidates": []}).status_code == 400
+    assert client.post('/api/scoring/simulate', json={"candidates": [{}] * 201}).status_code == 400
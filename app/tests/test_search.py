@@ -0,0 +1,53 @@
+from sqlalchemy import event
+from app import scoring
+from app.search import NameIndex, similarity, trigrams
+from app.models import Customer, CustomerHealthScore
+from utils.bulk_seed import SeedSpec
+
+
+def test_trigrams_match_pg_trgm():
+    assert trigrams("Cat") == {"  c", " ca", "cat", "at "}
+    assert trigrams("a-b") == {"  a", " a ", "  b", " b "}
+    assert similarity(trigrams("word"), trigrams("word")) == 1.0
+    assert similarity(trigrams("word"), trigrams("two words")) == 4 / 11
+
+def test_name_index_ranks_prefix_then_fuzzy():
+    index = NameIndex([(1, "Acme Corp"), (2, "Acme Corporation"), (3, "Acne Corp"), (4, "Globex"), (5, "acmeville")])
+    assert index.prefix("acme", 10) == [1, 2, 5]
+    assert index.prefix("ACME C", 1) == [1]
+    assert index.prefix("zzz", 10) == []
+
+    results = index.search("Acme Corp", 10)
+    assert [customer_id for customer_id, _, _ in results] == [1, 2, 3]
+    assert [is_prefix for _, is_prefix, _ in results] == [True, True, False]
+    assert results[0][2] == 1.0
+    assert index.search("Glbex", 10) == [(4, False, similarity(trigrams("Glbex"), trigrams("Globex")))]
+
+def test_search_endpoint(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=50, events_per_customer=5, seed=12))
+    client = app.test_client()
+    with app.app_context():
+        scoring.rescore(app.db_manager)
+    with app.db_manager.get_read_session() as session:
+        customer = session.get(Customer, 7)
+        name, health = customer.name, session.get(CustomerHealthScore, 7).health_score
+        engine = session.get_bind()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        results = client.get('/customers/search', query_string={"q": name}).get_json()["results"]
+        typo = client.get('/customers/search', query_string={"q": name[:3] + name[4:], "limit": 3}).get_json()["results"]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert results[0] == {"id": 7, "name": name, "segment": customer.segment, "health_score": health,
+                          "match": "prefix", "similarity": 1.0}
+    assert 7 in [r["id"] for r in typo] and len(typo) <= 3
+    # Only the customers and stored scores are read
+    tables = ("logins", "feature_usage", "support_tickets", "invoices", "api_usage", "sketches")
+    assert statements and not any(f" {table}" in statement for statement in statements for table in tables)
+
+    assert client.get('/customers/search?q=%20').status_code == 400
+    assert client.get('/customers/search?q=zzzzzzzzzz').get_json()["results"] == []
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from sqlalchemy import delete
+from app import scoring
+from app.constants import Constants
+from app.models import Customer, SegmentHealth, SupportTicket
+from utils.bulk_seed import SeedSpec
+
+
+def test_percentile_from_counts():
+    counts = {10.0: 1, 20.0: 2, 90.0: 1}
+    assert scoring.percentile_from_counts(counts, 10) == 10.0
+    assert scoring.percentile_from_counts(counts, 50) == 20.0
+    assert scoring.percentile_from_counts(counts, 90) == 90.0
+    assert scoring.percentile_from_counts({}, 50) is None
+
+def test_segment_health_is_precomputed_on_rescore(snapshot_app, wait_for_job):
+    app = snapshot_app(SeedSpec(customers=60, events_per_customer=20, seed=5))
+    client = app.test_client()
+    # Snapshots come scored, start without aggregates
+    with app.db_manager.get_write_session() as session:
+        session.execute(delete(SegmentHealth))
+    assert client.get('/api/segments/health').get_json() == {"segments": [], "computed_at": None}
+
+    response = client.post('/api/segments/health/refresh')
+    assert response.status_code == 202
+    assert wait_for_job(client, response)["result"] == {"scored": 60}
+
+    data = client.get('/api/segments/health').get_json()
+    segments = {s["segment"]: s for s in data["segments"]}
+    assert sum(s["customers"] for s in segments.values()) == 60
+    assert data["computed_at"]
+
+    # Same numbers as scoring every customer of the segment directly
+    segment = next(iter(segments))
+    with app.db_manager.get_read_session() as session:
+        ids = [c.id for c in session.query(Customer).filter_by(segment=segment)]
+        health = scoring.bulk_customer_health(session, ids, datetime.now())
+    scores = sorted(h["health_score"] for h in health.values())
+    stats = segments[segment]
+    assert stats["customers"] == len(ids)
+    assert stats["health_score"]["mean"] == round(sum(scores) / len(scores), 2)
+    assert stats["health_score"]["p10"] <= stats["health_score"]["p50"] <= stats["health_score"]["p90"]
+    assert stats["health_score"]["p50"] in scores
+    assert stats["at_risk"] == sum(1 for s in scores if s <= Constants.AT_RISK_THRESHOLD)
+    assert set(stats["scores"]) == set(scoring.SCORE_COMPONENTS)
+
+def test_rescore_refreshes_segment_health(snapshot_app, wait_for_job):
+    app = snapshot_app(SeedSpec(customers=10, events_per_customer=5, seed=6))
+    client = app.test_client()
+    wait_for_job(client, client.post('/api/segments/health/refresh'))
+    before = {s["segment"]: s for s in client.get('/api/segments/health').get_json()["segments"]}
+
+    with app.db_manager.get_write_session() as session:
+        customer = Customer(name="New Segment Customer", segment="Nonprofit")
+        session.add(customer)
+        session.flush()
+        for _ in range(10):
+            session.add(SupportTicket(customer_id=customer.id, status="open", created_at=datetime.now(timezone.utc)))
+
+    # Stored aggregates only change on rescore
+    assert "Nonprofit" not in {s["segment"] for s in client.get('/api/segments/health').get_json()["segments"]}
+    scoring.rescore(app.db_manager)
+    after = {s["segment"]: s for s in client.get('/api/segments/health').get_json()["segments"]}
+    assert after["Nonprofit"]["customers"] == 1
+    assert after["Nonprofit"]["at_risk"] == 1
+    assert {k: v["customers"] for k, v in before.items()} == \
+        {k: v["customers"] for k, v in after.items() if k != "Nonprofit"}
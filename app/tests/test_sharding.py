@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+import pytest
+from app import create_app, ingest
+from app.config import TestConfig
+from app.db_manager import shard_layout, sqlite_shard_path
+from app.models import db, Customer, LoginEvent, SupportTicket
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    path = str(tmp_path / "sharded.db")
+    config = type("ShardedConfig", (TestConfig,), {
+        "TEST_DB": path,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "SHARD_COUNT": 2,
+    })
+    app = create_app(config_obj=config)
+    for shard in app.db_manager.shards:
+        db.metadata.create_all(bind=shard.write_engine)
+    yield app
+    for shard in app.db_manager.shards:
+        shard.write_engine.dispose()
+
+def add_customer(app, customer_id, name, open_tickets=0):
+    with app.db_manager.get_write_session(customer_id) as session:
+        session.add(Customer(id=customer_id, name=name, segment="SMB"))
+        session.flush()
+        session.add(LoginEvent(customer_id=customer_id, timestamp=datetime.now(timezone.utc)))
+        for _ in range(open_tickets):
+            session.add(SupportTicket(customer_id=customer_id, status="open", created_at=datetime.now(timezone.utc)))
+
+def test_shard_layout_from_config():
+    config = type("Config", (TestConfig,), {"SHARDS": "db-1:replica-1,replica-2; db-2:"})
+    assert shard_layout(config) == [("db-1", ["replica-1", "replica-2"]), ("db-2", [])]
+
+    config = type("Config", (TestConfig,), {"SHARDS": "", "POSTGRES_PRIMARY_HOST": "primary",
+                                            "POSTGRES_REPLICA_HOST": "replica", "READING_REPLICAS": 2})
+    assert shard_layout(config) == [("primary", ["replica-1", "replica-2"])]
+
+    assert sqlite_shard_path("/tmp/test.db", 0) == "/tmp/test.db"
+    assert sqlite_shard_path("/tmp/test.db", 3) == "/tmp/test_shard3.db"
+
+def test_sessions_are_routed_by_customer_id(sharded_app):
+    db_manager = sharded_app.db_manager
+    assert db_manager.shard_count == 2
+    ids = db_manager.next_customer_ids(2)
+    for customer_id in ids:
+        add_customer(sharded_app, customer_id, f"Customer {customer_id}")
+
+    for customer_id in ids:
+        shard = db_manager.shard_for(customer_id).index
+        with db_manager.get_read_session(shard=shard) as session:
+            assert session.get(Customer, customer_id) is not None
+        with db_manager.get_read_session(shard=1 - shard) as session:
+            assert session.get(Customer, customer_id) is None
+
+    assert db_manager.next_customer_ids(3, shard=1) == [3, 5, 7]
+    assert sorted(c for counts in db_manager.scatter_gather(
+        lambda session: [c.id for c in session.query(Customer)]) for c in counts) == ids
+
+def test_cross_shard_views(sharded_app):
+    add_customer(sharded_app, 2, "Even Customer")
+    add_customer(sharded_app, 3, "Odd Risky Customer", open_tickets=10)
+    client = sharded_app.test_client()
+
+    customers = client.get('/customers')
+    assert b'Even Customer' in customers.data and b'Odd Risky Customer' in customers.data
+
+    assert b'Odd Risky Customer' in client.get('/customers/3').data
+    assert b'Odd Risky Customer' in client.get('/customers/3/health').data
+
+    for path in ['/dashboard', '/dashboard/async']:
+        dashboard = client.get(path)
+        assert dashboard.status_code == 200
+        assert b'<td>Odd Risky Customer</td>' in dashboard.data
+
+    exported = client.get('/api/export/customers').get_data(as_text=True).splitlines()
+    assert [line.split(",")[0] for line in exported[1:]] == ["2", "3"]
+
+def test_event_batches_report_each_shard(sharded_app, monkeypatch):
+    db_manager = sharded_app.db_manager
+    ids = db_manager.next_customer_ids(2)
+    for customer_id in ids:
+        add_customer(sharded_app, customer_id, f"Customer {customer_id}")
+    failing = db_manager.shard_for(ids[1]).index
+    insert_events = ingest.insert_events
+
+    def fail_on_one_shard(session, model, rows):
+        if any(db_manager.shard_for(row["customer_id"]).index == failing for row in rows):
+            raise RuntimeError("shard unavailable")
+        return insert_events(session, model, rows)
+
+    monkeypatch.setattr(ingest, "insert_events", fail_on_one_shard)
+    timestamp = datetime.now().isoformat()
+    events = [{"customer_id": customer_id, "event_type": "login", "event_id": f"login-{customer_id}",
+               "timestamp": timestamp} for customer_id in ids]
+    response = sharded_app.test_client().post('/api/events/batch', json={"events": events})
+    assert response.status_code == 500
+    body = response.get_json()
+    assert (body["inserted"], body["duplicates"], body["failed"]) == (1, 0, 1)
+    assert sorted((s["shard"], s["status"], s.get("indexes")) for s in body["shards"]) == sorted(
+        [(1 - failing, "recorded", None), (failing, "failed", [1])])
+
+    # The recorded shard kept its events, re-sending the batch records the rest
+    monkeypatch.setattr(ingest, "insert_events", insert_events)
+    resent = sharded_app.test_client().post('/api/events/batch', json={"events": events}).get_json()
+    assert (resent["inserted"], resent["duplicates"], resent["failed"]) == (1, 1, 0)
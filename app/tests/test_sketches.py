@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import Engine
+from app import sketches
+from app.hll import HyperLogLog
+from app.models import db, Customer, FeatureUsage, ApiUsage, Sketch
+from utils.bulk_seed import SeedSpec, bulk_seed
+
+
+def test_hll_estimates_and_merges():
+    small = HyperLogLog().update(["Dashboard", "Reports", "Reports", "Messages"])
+    assert small.count() == 3
+    assert len(small.to_bytes()) < 16  # sparse encoding
+    assert HyperLogLog.from_bytes(small.to_bytes()).registers == small.registers
+
+    large = HyperLogLog().update(range(50000))
+    assert abs(large.count() - 50000) / 50000 < 0.05
+    assert HyperLogLog.from_bytes(large.to_bytes()).count() == large.count()
+
+    overlapping = HyperLogLog().update(range(25000, 75000))
+    assert abs(HyperLogLog.union([large.to_bytes(), overlapping.to_bytes()]).count() - 75000) / 75000 < 0.05
+    assert large.merge(overlapping).count() == HyperLogLog.union([large.to_bytes(), overlapping.to_bytes()]).count()
+
+def test_sketches_follow_ingest(client):
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Sketch Customer", segment="SMB")
+        session.add(customer)
+        session.flush()
+        customer_id = customer.id
+        for days, name in [(0, "Sketching"), (0, "Sketching"), (1, "Tracing"), (40, "Profiling")]:
+            session.add(FeatureUsage(customer_id=customer_id, feature_name=name,
+                                     timestamp=datetime.now() - timedelta(days=days)))
+        session.add(ApiUsage(customer_id=customer_id, api_endpoint="sketch", timestamp=datetime.now()))
+
+    client.post(f'/customers/{customer_id}/events', json={
+        "event_type": "api", "endpoint": "trace", "timestamp": (datetime.now() - timedelta(days=2)).isoformat()})
+
+    with current_app.db_manager.get_read_session() as session:
+        assert sketches.distinct_count(session, "feature", customer_id) == 3
+        assert sketches.distinct_count(session, "feature") == \
+            session.execute(select(func.count(func.distinct(FeatureUsage.feature_id)))).scalar()
+
+    response = client.get(f'/api/customers/{customer_id}/diversity?days=30')
+    assert response.get_json() == {"customer_id": customer_id, "days": 30, "features": 2, "api_endpoints": 2}
+    assert client.get(f'/api/customers/{customer_id}/diversity?days=60').get_json()["features"] == 3
+    assert client.get('/api/customers/99999/diversity').status_code == 404
+
+def test_bulk_seeded_sketches_match_rebuild(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sketches.db'}")
+    db.metadata.create_all(bind=engine)
+    bulk_seed(engine, SeedSpec(customers=30, events_per_customer=40, seed=3, chunk_size=10))
+
+    def stored():
+        with engine.connect() as connection:
+            rows = connection.execute(select(Sketch.kind, Sketch.customer_id, Sketch.day, Sketch.registers)).all()
+        return {(kind, customer_id, day): HyperLogLog.from_bytes(registers).registers
+                for kind, customer_id, day, registers in rows}
+
+    seeded = stored()
+    # One row per (kind, customer, day): the per-chunk all-customers sketches were compacted
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(Sketch)).scalar() == len(seeded)
+        exact = connection.execute(select(func.count(func.distinct(ApiUsage.endpoint_id)))).scalar()
+    assert HyperLogLog.union(
+        HyperLogLog(r).to_bytes() for (kind, c, _), r in seeded.items() if kind == "api_endpoint" and c is None
+    ).count() == exact
+
+    with engine.begin() as connection:
+        sketches.rebuild(connection)
+    assert stored() == seeded
+
+def test_shard_wide_sketches_are_appended_and_compacted(client, monkeypatch):
+    monkeypatch.setattr(sketches, "SHARD_WIDE_MAX_ROWS", 3)
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Shard Wide Sketch Customer", segment="SMB")
+        session.add(customer)
+        session.flush()
+        customer_id = customer.id
+
+    day = datetime.now() - timedelta(days=3)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        for index in range(6):
+            client.post(f'/customers/{customer_id}/events', json={
+                "event_type": "api", "endpoint": f"shard-wide-{index}", "timestamp": day.isoformat()})
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+
+    # Ingests append shard-wide rows without reading them, and merge them past the limit
+    assert not any("sketches.customer_id IS NULL" in s and "GROUP BY" not in s and "ORDER BY" not in s
+                   for s in statements)
+    with current_app.db_manager.get_read_session() as session:
+        rows = session.execute(select(func.count()).select_from(Sketch).where(
+            Sketch.kind == "api_endpoint", Sketch.customer_id.is_(None), Sketch.day == day.date())).scalar()
+        assert 1 <= rows <= 3
+        assert sketches.distinct_count(session, "api_endpoint", customer_id) == 6
+        assert sketches.distinct_count(session, "api_endpoint", since=day) == \
+            session.execute(select(func.count(func.distinct(ApiUsage.endpoint_id))).where(ApiUsage.timestamp >= day.date())).scalar()
+
+def test_old_days_are_rolled_up_by_month(client):
+    month = datetime.combine((sketches.rolled_before() - timedelta(days=40)).replace(day=1), datetime.min.time())
+    with current_app.db_manager.get_write_session() as session:
+        customer = Customer(name="Rolled Up Sketch Customer", segment="SMB")
+        session.add(customer)
+        session.flush()
+        customer_id = customer.id
+        for days, name in [(20, "Rolling"), (17, "Rolling"), (15, "Merging"), (-10, "Archiving")]:
+            session.add(FeatureUsage(customer_id=customer_id, feature_name=name, timestamp=month + timedelta(days=days)))
+        session.add(FeatureUsage(customer_id=customer_id, feature_name="Recent", timestamp=datetime.now()))
+
+    def counts(session):
+        rows = session.execute(select(func.count()).select_from(Sketch).where(Sketch.customer_id == customer_id)).scalar()
+        return (rows, sketches.distinct_count(session, "feature", customer_id),
+                sketches.distinct_count(session, "feature", customer_id, since=month))
+
+    with current_app.db_manager.get_write_session() as session:
+        assert counts(session) == (5, 4, 3)
+        assert sketches.rollup(session.connection()) >= 2
+        # One row per rolled-up month, dated on its first day, and the recent day: the same counts
+        assert counts(session) == (3, 4, 3)
+        assert session.execute(select(Sketch.day).where(Sketch.customer_id == customer_id, Sketch.day < month)).scalar() \
+            == (month - timedelta(days=10)).date().replace(day=1)
+        assert sketches.rollup(session.connection()) == 0
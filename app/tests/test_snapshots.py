@@ -0,0 +1,73 @@
+import os
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+from app.models import Customer, CustomerHealthScore, Invoice, LoginEvent, SegmentHealth, SupportTicket
+from utils.bulk_seed import SeedSpec
+from utils.snapshots import anchor_of, build_snapshot, snapshot_path
+
+SPEC = SeedSpec(customers=30, events_per_customer=20, seed=11)
+
+
+def test_snapshot_is_built_once_per_spec():
+    path = build_snapshot(SPEC)
+    built_at = os.path.getmtime(path)
+
+    assert build_snapshot(SPEC) == path
+    assert os.path.getmtime(path) == built_at
+    assert snapshot_path(SeedSpec(customers=30, events_per_customer=20, seed=12)) != path
+
+def test_snapshot_follows_the_calendar(tmp_path):
+    spec = SeedSpec(customers=20, events_per_customer=20, seed=13)
+    path = build_snapshot(spec, str(tmp_path))
+    assert anchor_of(path) == date.fromisoformat(spec.anchor_date).toordinal()
+
+    # The next day, the same file is moved a day forward instead of a new one being built
+    tomorrow = (date.fromisoformat(spec.anchor_date) + timedelta(days=1)).isoformat()
+    next_day = SeedSpec(customers=20, events_per_customer=20, seed=13)
+    next_day.anchor_date = tomorrow
+    assert build_snapshot(next_day, str(tmp_path)) == path == snapshot_path(spec, str(tmp_path))
+    assert anchor_of(path) == date.fromisoformat(tomorrow).toordinal()
+
+    # Same rows as generated with tomorrow's anchor
+    generated = build_snapshot(SeedSpec(customers=20, events_per_customer=20, seed=13, anchor_date=tomorrow),
+                               str(tmp_path))
+    assert generated != path
+    statements = [select(LoginEvent.customer_id, LoginEvent.timestamp).order_by(LoginEvent.id),
+                  select(Invoice.issued_at, Invoice.due_date, Invoice.paid_date).order_by(Invoice.id),
+                  select(SupportTicket.created_at, SupportTicket.closed_at).order_by(SupportTicket.id)]
+    rows = []
+    for snapshot in [path, generated]:
+        engine = create_engine(f"sqlite:///{snapshot}")
+        with engine.connect() as connection:
+            rows.append([connection.execute(statement).all() for statement in statements])
+        engine.dispose()
+    assert rows[0] == rows[1] and rows[0][0]
+
+def test_snapshot_copy_is_private(snapshot_app):
+    app = snapshot_app(SPEC)
+    with app.db_manager.get_write_session() as session:
+        assert session.query(func.count(Customer.id)).scalar() == 30
+        session.add(Customer(name="Only In This Copy", segment="SMB"))
+
+    fresh = snapshot_app(SPEC)
+    with fresh.db_manager.get_read_session() as session:
+        assert session.query(func.count(Customer.id)).scalar() == 30
+
+def test_read_only_snapshot(snapshot_app):
+    app = snapshot_app(SPEC, read_only=True, SECRET_KEY="snapshot-test")
+
+    response = app.test_client().get('/customers')
+    assert response.status_code == 200
+
+    with pytest.raises(OperationalError):
+        with app.db_manager.get_write_session() as session:
+            session.add(Customer(name="Not Allowed", segment="SMB"))
+
+def test_snapshot_has_stored_scores(snapshot_app):
+    app = snapshot_app(SPEC)
+    with app.db_manager.get_read_session() as session:
+        assert session.query(func.count(CustomerHealthScore.customer_id)).scalar() == 30
+        assert session.query(func.sum(SegmentHealth.customers)).scalar() == 30
+    assert app.test_client().get('/api/segments/health').get_json()
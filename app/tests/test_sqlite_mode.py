@@ -0,0 +1,56 @@
+import threading
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+from app import create_app
+from app.models import Customer
+from benchmarks.sqlite_ingest import mode_app, run_mixed
+from utils.bulk_seed import SeedSpec
+from utils.snapshots import restore_snapshot, snapshot_config
+
+SPEC = SeedSpec(customers=20, events_per_customer=5, seed=9)
+
+
+def single_node_app(tmp_path):
+    path = restore_snapshot(SPEC, str(tmp_path / "single-node.db"))
+    return create_app(snapshot_config(path, SQLITE_PATH=path))
+
+def test_writer_and_read_only_pool(tmp_path):
+    app = single_node_app(tmp_path)
+    db_manager = app.db_manager
+    with db_manager.get_write_session() as session:
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert session.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        session.add(Customer(name="Single Node Customer", segment="SMB"))
+
+    with db_manager.get_read_session() as session:
+        assert session.execute(select(Customer.id).where(Customer.name == "Single Node Customer")).scalar()
+        with pytest.raises(OperationalError, match="readonly"):
+            session.execute(text("DELETE FROM customers"))
+    assert db_manager.write_engine.pool.size() == 1
+
+def test_reads_are_not_blocked_by_writes(tmp_path):
+    app = single_node_app(tmp_path)
+    db_manager = app.db_manager
+    counted = []
+
+    def read():
+        with db_manager.get_read_session() as session:
+            counted.append(session.execute(select(func.count(Customer.id))).scalar())
+
+    with db_manager.get_write_session() as session:
+        session.add(Customer(name="Uncommitted Customer", segment="SMB"))
+        session.flush()  # the write lock is held until commit
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(timeout=5)
+        assert counted == [SPEC.customers]
+    read()
+    assert counted[-1] == SPEC.customers + 1
+
+def test_ingest_benchmark_reports_both_modes(tmp_path):
+    for mode in ["default", "single-node"]:
+        app = mode_app(mode, restore_snapshot(SPEC, str(tmp_path / f"{mode}.db")))
+        result = run_mixed(app, SPEC.customers, readers=2, writers=1, batch_size=5, duration=0.3)
+        assert result["read_latency_ms"]["count"] > 0 and result["events_per_second"] > 0
+        assert result["errors"] == {}
@@ -0,0 +1,35 @@
+import os
+from app import create_app
+from app.config import TestConfig
+from sqlalchemy import text
+from app.db_manager import DatabaseManager
+
+
+def test_engines_are_created_on_first_use(tmp_path):
+    config = type("LazyConfig", (TestConfig,), {"TEST_DB": str(tmp_path / "lazy.db"), "SHARD_COUNT": 2})
+    app = create_app(config)
+    shards = app.db_manager.shards
+    assert all(not shard._engines for shard in shards)
+
+    with app.db_manager.get_read_session(shard=1) as session:
+        session.execute(text("select 1"))
+    assert not shards[0]._engines and len(shards[1]._engines) == 1
+    # The SQLite file is both primary and replica of its shard: one engine
+    assert shards[1].write_engine is shards[1].read_engines[0]
+
+def test_forked_children_drop_inherited_connections(tmp_path):
+    config = type("ForkConfig", (TestConfig,), {"TEST_DB": str(tmp_path / "fork.db")})
+    db_manager = DatabaseManager(config)
+    engine = db_manager.write_engine
+    with engine.connect():
+        pass
+    assert engine.pool.checkedin() == 1
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, str(engine.pool.checkedin()).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 16) == b"0"
+    assert engine.pool.checkedin() == 1  # the parent keeps its pool
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from app import create_app
+from app.models import ApiUsage, Customer, LoginEvent
+from utils.bulk_seed import SeedSpec
+from utils.snapshots import snapshot_config
+
+
+def add_customer(app, logins=(), api_calls=()):
+    with app.db_manager.get_write_session() as session:
+        customer = Customer(name="Timeline Customer", segment="SMB")
+        session.add(customer)
+        session.flush()
+        session.add_all([LoginEvent(customer_id=customer.id, timestamp=ts) for ts in logins])
+        session.add_all([ApiUsage(customer_id=customer.id, api_endpoint="timeline", timestamp=ts) for ts in api_calls])
+        return customer.id
+
+def test_counts_per_bucket(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=6))
+    client = app.test_client()
+    # 2024-01-01 is a Monday
+    customer_id = add_customer(app, logins=[
+        datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 18), datetime(2024, 1, 3, 12),
+        datetime(2024, 1, 9, 8), datetime(2024, 2, 14, 10), datetime(2023, 12, 31, 23),
+    ])
+    url = f'/api/customers/{customer_id}/timeline?metric=logins'
+
+    daily = client.get(f'{url}&bucket=day&from=2024-01-01&to=2024-01-05').get_json()
+    assert daily == {"customer_id": customer_id, "metric": "logins", "bucket": "day",
+                     "start": "2024-01-01", "counts": [2, 0, 1, 0]}
+
+    # Whole weeks (from Monday) and months covering the range
+    weekly = client.get(f'{url}&bucket=week&from=2024-01-02&to=2024-01-16').get_json()
+    assert weekly["start"] == "2024-01-01" and weekly["counts"] == [3, 1, 0]
+    monthly = client.get(f'{url}&bucket=month&from=2023-12-15&to=2024-03-01').get_json()
+    assert monthly["start"] == "2023-12-01" and monthly["counts"] == [1, 4, 1]
+
+    # Defaults: daily logins of the last 30 days
+    recent = client.get(f'/api/customers/{customer_id}/timeline').get_json()
+    assert len(recent["counts"]) == 31 and sum(recent["counts"]) == 0
+
+def test_daily_counts_from_window_counters(snapshot_app, tmp_path):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=6))
+    now = datetime.now()
+    customer_id = add_customer(app, api_calls=[now - timedelta(days=d, minutes=1) for d in (0, 0, 2, 5)])
+    url = f'/api/customers/{customer_id}/timeline?metric=api_calls&bucket=day'
+    expected = app.test_client().get(url).get_json()
+    assert sum(expected["counts"]) == 4
+
+    # Same database, with window counters
+    counted = create_app(snapshot_config(app.config["TEST_DB"], WINDOW_COUNTERS_PATH=str(tmp_path / "counters.bin")))
+    assert counted.test_client().get(url).get_json() == expected
+    daily = counted.extensions["window_counters"].daily(customer_id, "api", now - timedelta(days=6))
+    assert sorted(daily.values()) == [1, 1, 2]
+
+def test_invalid_requests(snapshot_app):
+    app = snapshot_app(SeedSpec(customers=5, events_per_customer=5, seed=6))
+    client = app.test_client()
+    assert client.get('/api/customers/1/timeline?metric=nope').status_code == 400
+    assert client.get('/api/customers/1/timeline?bucket=hour').status_code == 400
+    assert client.get('/api/customers/1/timeline?from=yesterday').status_code == 400
+    assert client.get('/api/customers/1/timeline?from=2024-02-01&to=2024-01-01').status_code == 400
+    assert client.get('/api/customers/1/timeline?from=2000-01-01&to=2024-01-01').status_code == 400
+    assert client.get('/api/customers/999999/timeline').status_code == 404
@@ -0,0 +1,85 @@
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, select
+from app import counters
+from .models import ApiUsage, FeatureUsage, Invoice, LoginEvent, SupportTicket
+
+# Activity timelines: a customer's events of one kind counted per day, week (from Monday) or
+# calendar month, grouped by the database over the (customer_id, time) index range, so the
+# cost is one small aggregate query whatever the number of events. Recent daily logins and API
+# calls come from the window counters (app/counters.py) when enabled.
+
+# metric -> (model, time column, window counter kind)
+METRICS = {
+    "logins": (LoginEvent, LoginEvent.timestamp, "login"),
+    "api_calls": (ApiUsage, ApiUsage.timestamp, "api"),
+    "features": (FeatureUsage, FeatureUsage.timestamp, None),
+    "tickets": (SupportTicket, SupportTicket.created_at, None),
+    "invoices": (Invoice, Invoice.issued_at, None),
+}
+DEFAULT_SPANS = {"day": timedelta(days=30), "week": timedelta(weeks=26), "month": timedelta(days=365)}
+MAX_BUCKETS = 1000
+
+
+def bucket_start(day, bucket):
+    # First day of the bucket holding `day`
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(day, bucket):
+    if bucket == "week":
+        return day + timedelta(weeks=1)
+    if bucket == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+def buckets(start, end, bucket):
+    # Start days of the buckets covering [start, end)
+    days, day = [], bucket_start(start.date(), bucket)
+    while datetime.combine(day, time.min) < end:
+        days.append(day)
+        day = next_bucket(day, bucket)
+    return days
+
+def bucket_expression(dialect, column, bucket):
+    if dialect == "postgresql":
+        return func.date_trunc(bucket, column)
+    if bucket == "week":
+        return func.date(column, "weekday 0", "-6 days")  # Monday of the week
+    if bucket == "month":
+        return func.strftime("%Y-%m-01", column)
+    return func.date(column)
+
+def _as_date(value):
+    # Bucket values are strings on SQLite and datetimes on Postgres
+    return date.fromisoformat(value) if isinstance(value, str) else value.date()
+
+def timeline(session, customer_id, metric, bucket, start, end):
+    # (bucket start days, event counts per bucket) of the customer's `metric` events, in the whole
+    # buckets covering [start, end)
+    model, column, kind = METRICS[metric]
+    days = buckets(start, end, bucket)
+    counts = dict.fromkeys(days, 0)
+    start = datetime.combine(days[0], time.min)
+    end = datetime.combine(next_bucket(days[-1], bucket), time.min)
+
+    daily = counters.window_daily(customer_id, kind, days[0]) if kind and bucket == "day" else None
+    if daily is not None:
+        for day, count in daily.items():
+            if day in counts:
+                counts[day] = count
+        return days, list(counts.values())
+
+    grouped = bucket_expression(session.get_bind().dialect.name, column, bucket)
+    rows = session.execute(
+        select(grouped, func.count())
+        .where(model.customer_id == customer_id, column >= start, column < end)
+        .group_by(grouped)
+    )
+    for value, count in rows:
+        day = _as_date(value)
+        if day in counts:
+            counts[day] = count
+    return days, list(counts.values())
@@ -0,0 +1,71 @@
+import json
+import os
+from types import SimpleNamespace
+from flask import current_app, has_app_context
+from app.constants import Constants
+
+# Scoring weights and risk thresholds at runtime: the Constants defaults, overridden by the JSON
+# file at SCORING_SETTINGS_PATH, e.g. {"weights": {"logins": 0.3}, "thresholds": {"at_risk": 45}}.
+# The file is re-read whenever its mtime changes, so edits apply without a deploy.
+# current() returns an object with the same attribute names as Constants.
+WEIGHTS = {
+    "logins": "LOGIN_WEIGHT",
+    "feature_adoption": "FEATURE_ADOPTION_WEIGHT",
+    "support_tickets": "SUPPORT_TICKET_WEIGHT",
+    "invoices": "INVOICE_WEIGHT",
+    "api_usage": "API_USAGE_WEIGHT",
+}
+THRESHOLDS = {
+    "at_risk": "AT_RISK_THRESHOLD",
+    "moderate_risk": "MODERATE_RISK_THRESHOLD",
+    "not_at_risk": "NOT_AT_RISK_THRESHOLD",
+}
+DEFAULTS = SimpleNamespace(**{name: getattr(Constants, name) for name in [*WEIGHTS.values(), *THRESHOLDS.values()]})
+
+_loaded = {}  # path -> (mtime, settings)
+
+
+def parse(data, base=DEFAULTS):
+    # Settings of `base` overridden by {"weights": {...}, "thresholds": {...}}, ValueError when invalid
+    if not isinstance(data, dict):
+        raise ValueError("Settings must be a JSON object")
+    values = vars(base).copy()
+    for section, names in (("weights", WEIGHTS), ("thresholds", THRESHOLDS)):
+        entries = data.get(section) or {}
+        if not isinstance(entries, dict):
+            raise ValueError(f"{section} must be an object")
+        for key, value in entries.items():
+            if key not in names:
+                raise ValueError(f"Unknown {section[:-1]}: {key}")
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"{key} must be a non-negative number")
+            values[names[key]] = value
+    return SimpleNamespace(**values)
+
+def as_dict(settings):
+    return {
+        "weights": {key: getattr(settings, name) for key, name in WEIGHTS.items()},
+        "thresholds": {key: getattr(settings, name) for key, name in THRESHOLDS.items()},
+    }
+
+def current():
+    path = current_app.config.get("SCORING_SETTINGS_PATH") if has_app_context() else None
+    if not path:
+        return DEFAULTS
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return DEFAULTS
+
+    cached = _loaded.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path) as f:
+            settings = parse(json.load(f))
+    except ValueError as e:
+        # Keep scoring with the last good settings until the file is fixed
+        current_app.logger.warning(f"Ignoring invalid scoring settings in {path}: {e}")
+        settings = cached[1] if cached else DEFAULTS
+    _loaded[path] = (mtime, settings)
+    return settings
@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import create_app
+from app.config import Config, TestConfig
+from utils.bulk_seed import SeedSpec, bulk_seed
+from utils.snapshots import restore_snapshot, snapshot_config
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+DEFAULT_SCALES = [1000, 10000, 100000]
+DEFAULT_EVENTS_PER_CUSTOMER = 50
+DEFAULT_SEED = 42
+
+
+def percentiles(samples_ms):
+    # Latency summary in milliseconds (nearest-rank percentiles)
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "min": round(ordered[0], 3),
+        "p50": round(rank(50), 3),
+        "p90": round(rank(90), 3),
+        "p95": round(rank(95), 3),
+        "p99": round(rank(99), 3),
+        "max": round(ordered[-1], 3),
+        "mean": round(sum(ordered) / len(ordered), 3),
+    }
+
+
+class QueryCounter:
+    # Counts statements sent to any engine while active, from every thread: async views run
+    # their queries on the async engines' loop thread and scatter_gather() on pool threads.
+    # Process-wide, so requests are measured one at a time (benchmarks/endpoints.py).
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        event.listen(Engine, "before_cursor_execute", self._count_statement)
+
+    def _count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self._count += 1
+
+    def reset(self):
+        with self._lock:
+            self._count = 0
+
+    @property
+    def count(self):
+        return self._count
+
+    def close(self):
+        event.remove(Engine, "before_cursor_execute", self._count_statement)
+
+
+def run_metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "started_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def benchmark_app(customers, seed=DEFAULT_SEED, events_per_customer=DEFAULT_EVENTS_PER_CUSTOMER, backend="sqlite"):
+    # App bound to a deterministic dataset of `customers` customers. SQLite datasets come
+    # from the snapshot cache (utils/snapshots.py); "postgres" reseeds the database from Config (.env).
+    spec = SeedSpec(customers=customers, events_per_customer=events_per_customer, seed=seed)
+
+    if backend == "postgres":
+        app = create_app(type("BenchmarkConfig", (Config,), {"SECRET_KEY": Config.SECRET_KEY or "benchmark"}))
+        bulk_seed(app.db_manager.shard_write_engines, spec, truncate_first=True)
+        return app, spec
+
+    # Run against a private copy of the cached snapshot, ingestion must not change it
+    os.makedirs(DATA_DIR, exist_ok=True)
+    working_copy = restore_snapshot(spec, os.path.join(DATA_DIR, "run.db"))
+    config = snapshot_config(working_copy, SECRET_KEY=TestConfig.SECRET_KEY or "benchmark", FLASK_ENV="production")
+    return create_app(config), spec
@@ -0,0 +1,111 @@
+import argparse
+import json
+import time
+from datetime import datetime
+from random import Random
+from benchmarks.common import (DEFAULT_EVENTS_PER_CUSTOMER, DEFAULT_SCALES, DEFAULT_SEED, QueryCounter,
+                               benchmark_app, percentiles, run_metadata)
+
+
+def endpoint_cases(customers, rng):
+    # (name, method, path factory, json body factory) for every benchmarked endpoint
+    last_page = max(1, (customers + 19) // 20)
+
+    def customer_id():
+        return rng.randint(1, customers)
+
+    def login_event():
+        return {"event_type": "login", "timestamp": datetime.now().isoformat()}
+
+    return [
+        ("dashboard", "GET", lambda: "/dashboard", None),
+        ("dashboard_async", "GET", lambda: "/dashboard/async", None),
+        ("customers_by_name", "GET", lambda: "/customers?sort_by=name&order=asc", None),
+        ("customers_by_health", "GET", lambda: "/customers?sort_by=health_score&order=desc", None),
+        ("customers_by_name_last_page", "GET", lambda: f"/customers?sort_by=name&order=asc&page={last_page}", None),
+        ("customers_by_health_last_page", "GET",
+         lambda: f"/customers?sort_by=health_score&order=desc&page={last_page}", None),
+        ("customer_detail", "GET", lambda: f"/customers/{customer_id()}", None),
+        ("customer_detail_async", "GET", lambda: f"/customers/{customer_id()}/async", None),
+        ("customer_health", "GET", lambda: f"/customers/{customer_id()}/health", None),
+        ("ingest_login_event", "POST", lambda: f"/customers/{customer_id()}/events", login_event),
+    ]
+
+
+def benchmark_endpoints(app, customers, iterations, warmup=1, only=None, seed=DEFAULT_SEED):
+    # Latency percentiles and queries per request for every endpoint, measured in-process
+    rng = Random(seed)
+    client = app.test_client()
+    counter = QueryCounter()
+    results = {}
+    try:
+        for name, method, path, body in endpoint_cases(customers, rng):
+            if only and name not in only:
+                continue
+            latencies, queries, statuses = [], [], {}
+            for i in range(warmup + iterations):
+                counter.reset()
+                started = time.perf_counter()
+                response = client.open(path(), method=method, json=body() if body else None)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if i < warmup:
+                    continue
+                latencies.append(elapsed_ms)
+                queries.append(counter.count)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            results[name] = {
+                "latency_ms": percentiles(latencies),
+                "queries_per_request": round(sum(queries) / len(queries), 1),
+                "statuses": statuses,
+            }
+            print(f"  {name}: p50={results[name]['latency_ms']['p50']}ms "
+                  f"queries={results[name]['queries_per_request']}", flush=True)
+    finally:
+        counter.close()
+    return results
+
+
+def compare(baseline, current):
+    # p50 ratio (current / baseline) for every scale and endpoint present in both runs
+    for scale, endpoints in current["scales"].items():
+        for name, result in endpoints.items():
+            before = baseline.get("scales", {}).get(scale, {}).get(name)
+            if not before:
+                continue
+            ratio = result["latency_ms"]["p50"] / before["latency_ms"]["p50"] if before["latency_ms"]["p50"] else 0
+            print(f"{scale:>7} {name:<32} p50 {before['latency_ms']['p50']:>10.2f} -> "
+                  f"{result['latency_ms']['p50']:>10.2f} ms (x{ratio:.2f}), queries "
+                  f"{before['queries_per_request']} -> {result['queries_per_request']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark endpoint latency and query counts at several data scales")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="comma separated customer counts")
+    parser.add_argument("--events-per-customer", type=int, default=DEFAULT_EVENTS_PER_CUSTOMER)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--endpoints", help="comma separated subset of endpoint names")
+    parser.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="previous JSON output to compare against")
+    args = parser.parse_args()
+
+    report = {**run_metadata(), "backend": args.backend, "seed": args.seed,
+              "events_per_customer": args.events_per_customer, "scales": {}}
+    for customers in [int(s) for s in args.scales.split(",")]:
+        print(f"{customers} customers", flush=True)
+        app, spec = benchmark_app(customers, seed=args.seed, events_per_customer=args.events_per_customer,
+                                  backend=args.backend)
+        report["scales"][str(customers)] = benchmark_endpoints(
+            app, customers, args.iterations, warmup=args.warmup,
+            only=args.endpoints.split(",") if args.endpoints else None, seed=args.seed)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), report)
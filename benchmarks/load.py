@@ -0,0 +1,109 @@
+import argparse
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from werkzeug.serving import make_server
+from benchmarks.common import DEFAULT_EVENTS_PER_CUSTOMER, DEFAULT_SEED, benchmark_app, percentiles, run_metadata
+
+# Relative weights of the request mix, {customer_id} is replaced per request
+DEFAULT_MIX = {
+    "/dashboard": 2,
+    "/customers?sort_by=name&order=asc": 2,
+    "/customers?sort_by=health_score&order=desc": 1,
+    "/customers/{customer_id}": 4,
+    "/customers/{customer_id}/health": 4,
+}
+
+
+def serve_in_background(app, host="127.0.0.1"):
+    # Threaded werkzeug server on a free port, returns (server, base url)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(host, 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def run_load(base_url, customers, concurrency=8, duration=30.0, mix=None, seed=DEFAULT_SEED, timeout=60.0):
+    # Closed-loop load: `concurrency` clients send requests back to back for `duration` seconds
+    mix = mix or DEFAULT_MIX
+    paths, weights = list(mix.keys()), list(mix.values())
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    latencies, errors = {path: [] for path in paths}, {}
+
+    def client(index):
+        rng = Random(f"{seed}:{index}")
+        while time.monotonic() < deadline:
+            path = rng.choices(paths, weights)[0]
+            url = base_url + path.format(customer_id=rng.randint(1, customers))
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    response.read()
+                error = None
+            except urllib.error.HTTPError as e:
+                error = str(e.code)
+            except (urllib.error.URLError, OSError) as e:
+                error = type(e).__name__
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+                else:
+                    latencies[path].append(elapsed_ms)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    completed = sum(len(samples) for samples in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": completed,
+        "throughput_rps": round(completed / elapsed, 2),
+        "errors": errors,
+        "latency_ms": percentiles([sample for samples in latencies.values() for sample in samples]),
+        "paths": {path: percentiles(samples) for path, samples in latencies.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load driver for a local Auditale instance")
+    parser.add_argument("--url", help="base url of a running instance, e.g. http://127.0.0.1:8000 "
+                                      "(default: serve a seeded app in-process)")
+    parser.add_argument("--customers", type=int, default=1000,
+                        help="dataset scale to seed (in-process) or customer id range of --url")
+    parser.add_argument("--events-per-customer", type=int, default=DEFAULT_EVENTS_PER_CUSTOMER)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--output", default="load_output.json")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        app, _ = benchmark_app(args.customers, seed=args.seed, events_per_customer=args.events_per_customer,
+                               backend=args.backend)
+        server, base_url = serve_in_background(app)
+
+    try:
+        report = {**run_metadata(), "url": base_url, "customers": args.customers,
+                  **run_load(base_url, args.customers, args.concurrency, args.duration, seed=args.seed)}
+    finally:
+        if server:
+            server.shutdown()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"{report['requests']} requests, {report['throughput_rps']} req/s, "
+          f"p50={report['latency_ms'].get('p50')}ms p99={report['latency_ms'].get('p99')}ms, errors={report['errors']}")
+    print(f"Results written to {args.output}")
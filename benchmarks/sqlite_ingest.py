@@ -0,0 +1,167 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from random import Random
+from app import create_app
+from app.config import TestConfig
+from benchmarks.common import DATA_DIR, DEFAULT_EVENTS_PER_CUSTOMER, DEFAULT_SEED, percentiles, run_metadata
+from utils.bulk_seed import SeedSpec
+from utils.snapshots import restore_snapshot, snapshot_config
+
+# Reads during ingestion on SQLite: reader processes request customer pages while writer
+# processes post event batches, once with the default SQLite setup (one engine, rollback journal)
+# and once in the single-node mode (SQLITE_PATH: WAL, one writer connection, read-only pool), on
+# copies of the same snapshot.
+MODES = ["default", "single-node"]
+READ_PATHS = ["/customers/{customer_id}", "/api/customers/{customer_id}/health"]
+
+
+def mode_app(mode, database):
+    overrides = {"SECRET_KEY": TestConfig.SECRET_KEY or "benchmark", "FLASK_ENV": "production"}
+    if mode == "single-node":
+        overrides["SQLITE_PATH"] = database
+    return create_app(snapshot_config(database, **overrides))
+
+
+def event_batch(rng, customers, size):
+    timestamp = (datetime.now() - timedelta(minutes=1)).isoformat()
+    events = []
+    for _ in range(size):
+        event = {"customer_id": rng.randint(1, customers), "event_type": rng.choice(["login", "api", "feature"]),
+                 "timestamp": timestamp}
+        if event["event_type"] == "api":
+            event["endpoint"] = rng.choice(["/v1/orders", "/v1/users", "/v1/reports"])
+        elif event["event_type"] == "feature":
+            event["feature_name"] = rng.choice(["Dashboard", "Reports", "Exports"])
+        events.append(event)
+    return events
+
+
+def _run_mixed(app, customers, readers, writers, batch_size, duration, seed, index=0, start_at=None):
+    # Closed loop: every reader/writer thread sends requests back to back for `duration` seconds
+    # (from `start_at`, a time.time(), so that processes start together). Returns raw samples.
+    if start_at:
+        time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    samples = {"reads": [], "writes": [], "inserted": 0, "errors": {}}
+
+    def record(kind, elapsed_ms, error):
+        with lock:
+            if error:
+                samples["errors"][error] = samples["errors"].get(error, 0) + 1
+            else:
+                samples[kind].append(elapsed_ms)
+
+    def reader(thread):
+        rng, client = Random(f"{seed}:read:{index}:{thread}"), app.test_client()
+        while time.monotonic() < deadline:
+            path = rng.choice(READ_PATHS).format(customer_id=rng.randint(1, customers))
+            started = time.perf_counter()
+            try:
+                status = client.get(path).status_code
+                error = None if status == 200 else str(status)
+            except Exception as e:
+                error = type(e).__name__
+            record("reads", (time.perf_counter() - started) * 1000, error)
+
+    def writer(thread):
+        rng, client = Random(f"{seed}:write:{index}:{thread}"), app.test_client()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = client.post("/api/events/batch", json={"events": event_batch(rng, customers, batch_size)})
+                error = None if response.status_code == 200 else str(response.status_code)
+                if not error:
+                    with lock:
+                        samples["inserted"] += response.get_json()["inserted"]
+            except Exception as e:
+                error = type(e).__name__
+            record("writes", (time.perf_counter() - started) * 1000, error)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    samples["elapsed"] = time.monotonic() - started
+    return samples
+
+
+def summarize(runs):
+    # Report of the raw samples of concurrent runs (threads or processes)
+    reads = [ms for run in runs for ms in run["reads"]]
+    writes = [ms for run in runs for ms in run["writes"]]
+    elapsed = max(run["elapsed"] for run in runs)
+    errors = {}
+    for run in runs:
+        for error, count in run["errors"].items():
+            errors[error] = errors.get(error, 0) + count
+    return {
+        "read_latency_ms": percentiles(reads),
+        "reads_per_second": round(len(reads) / elapsed, 1),
+        "batch_latency_ms": percentiles(writes),
+        "events_per_second": round(sum(run["inserted"] for run in runs) / elapsed, 1),
+        "errors": errors,
+    }
+
+
+def run_mixed(app, customers, readers=8, writers=2, batch_size=50, duration=10.0, seed=DEFAULT_SEED):
+    # Readers and writers as threads of one worker
+    return summarize([_run_mixed(app, customers, readers, writers, batch_size, duration, seed)])
+
+
+def _process(mode, database, customers, readers, writers, batch_size, duration, seed, index, start_at):
+    return _run_mixed(mode_app(mode, database), customers, readers, writers, batch_size, duration, seed, index, start_at)
+
+
+def run_processes(mode, database, customers, processes=4, readers=2, writers=1, batch_size=50, duration=10.0,
+                  seed=DEFAULT_SEED):
+    # Like gunicorn workers sharing the file: `processes` processes of `readers` reader threads
+    # and `writers` processes of one writer thread, each with its own app
+    roles = [(readers, 0)] * processes + [(0, 1)] * writers
+    start_at = time.time() + 5.0  # after every process imported and created its app
+    with multiprocessing.get_context("spawn").Pool(len(roles)) as pool:
+        runs = pool.starmap(_process, [
+            (mode, database, customers, r, w, batch_size, duration, seed, index, start_at)
+            for index, (r, w) in enumerate(roles)
+        ])
+    return summarize(runs)
+
+
+def benchmark_sqlite_ingest(customers, processes=4, readers=2, writers=1, batch_size=50, duration=10.0, modes=MODES):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    spec = SeedSpec(customers=customers, events_per_customer=DEFAULT_EVENTS_PER_CUSTOMER, seed=DEFAULT_SEED)
+    results = {}
+    for mode in modes:
+        database = restore_snapshot(spec, os.path.join(DATA_DIR, f"sqlite-{mode}.db"))
+        results[mode] = run_processes(mode, database, customers, processes, readers, writers, batch_size, duration)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reads during ingestion, default SQLite vs single-node mode")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=4, help="reader processes")
+    parser.add_argument("--readers", type=int, default=2, help="reader threads per reader process")
+    parser.add_argument("--writers", type=int, default=1, help="writer processes")
+    parser.add_argument("--batch-size", type=int, default=50, help="events per POST /api/events/batch")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--output", default="sqlite_ingest_output.json")
+    args = parser.parse_args()
+
+    results = benchmark_sqlite_ingest(args.customers, args.processes, args.readers, args.writers, args.batch_size,
+                                      args.duration)
+    for mode, result in results.items():
+        print(f"{mode:<12} reads p50={result['read_latency_ms'].get('p50')}ms p99={result['read_latency_ms'].get('p99')}ms "
+              f"({result['reads_per_second']}/s), {result['events_per_second']} events/s, errors: {result['errors'] or 'none'}")
+    with open(args.output, "w") as f:
+        json.dump({**run_metadata(), "customers": args.customers, "processes": args.processes, "readers": args.readers,
+                   "writers": args.writers, "batch_size": args.batch_size, "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
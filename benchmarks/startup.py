@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Worker startup cost: every run is a fresh interpreter that imports the app, creates it and
+# serves its first requests, like a gunicorn worker booting (without --preload).
+# Only the standard library is imported at module level, the child measures the app imports itself.
+HEAVY_MODULES = ["faker", "alembic", "flask_migrate", "sqlalchemy.ext.asyncio", "psycopg2"]
+
+
+def child(database, path):
+    started = time.perf_counter()
+    from app import create_app
+    from app.config import TestConfig
+    imported = time.perf_counter()
+
+    config = type("StartupConfig", (TestConfig,), {
+        "TEST_DB": database,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}",
+        "SQLITE_READ_ONLY": True,
+        "SECRET_KEY": TestConfig.SECRET_KEY or "benchmark",
+        "FLASK_ENV": "production",
+    })
+    app = create_app(config)
+    created = time.perf_counter()
+    engines_at_boot = sum(len(shard._engines) for shard in app.db_manager.shards)
+
+    client = app.test_client()
+    status = client.get(path).status_code
+    first = time.perf_counter()
+    client.get(path)
+    second = time.perf_counter()
+
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "create_app_ms": (created - imported) * 1000,
+        "first_request_ms": (first - created) * 1000,
+        "second_request_ms": (second - first) * 1000,
+        "status": status,
+        "engines_at_boot": engines_at_boot,
+        "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def benchmark_startup(customers, runs, path):
+    from benchmarks.common import DATA_DIR, DEFAULT_EVENTS_PER_CUSTOMER, DEFAULT_SEED, percentiles
+    from utils.bulk_seed import SeedSpec
+    from utils.snapshots import restore_snapshot
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    spec = SeedSpec(customers=customers, events_per_customer=DEFAULT_EVENTS_PER_CUSTOMER, seed=DEFAULT_SEED)
+    database = restore_snapshot(spec, os.path.join(DATA_DIR, "startup.db"))
+
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child", database, "--path", path],
+                                capture_output=True, text=True, check=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample["process_ms"] = (time.perf_counter() - started) * 1000
+        samples.append(sample)
+
+    metrics = ["import_ms", "create_app_ms", "first_request_ms", "second_request_ms", "process_ms"]
+    return {
+        "path": path,
+        "customers": customers,
+        **{metric: percentiles([s[metric] for s in samples]) for metric in metrics},
+        "statuses": sorted({s["status"] for s in samples}),
+        "engines_at_boot": samples[-1]["engines_at_boot"],
+        "heavy_modules": samples[-1]["heavy_modules"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark app import, creation and first-request latency")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/customers/1", help="endpoint of the first requests")
+    parser.add_argument("--output", default="startup_output.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.path)
+        sys.exit()
+
+    from benchmarks.common import run_metadata
+    report = {**run_metadata(), **benchmark_startup(args.customers, args.runs, args.path)}
+    for metric in ["import_ms", "create_app_ms", "first_request_ms", "second_request_ms", "process_ms"]:
+        print(f"{metric:<18} p50={report[metric]['p50']}ms max={report[metric]['max']}ms")
+    print(f"engines at boot: {report['engines_at_boot']}, heavy modules loaded: {report['heavy_modules'] or 'none'}")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
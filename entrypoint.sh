@@ -11,4 +11,4 @@ echo "Database is up, running migrations..."
 flask db upgrade
 
 echo "Starting the web server..."
-exec gunicorn -b 0.0.0.0:8000 "run:app"
+exec gunicorn --preload -b 0.0.0.0:8000 "run:app"
@@ -1,16 +1,16 @@
 import os
 from app import create_app, db
 from app.config import Config, TestConfig
-from utils.seed_db import seed
 
 env = os.getenv("FLASK_ENV", "development")  # "development", "testing", "production"
 
 if env == "testing":
+    # Start from a copy of the cached seeded dataset instead of re-seeding on every start
+    from utils.bulk_seed import SeedSpec
+    from utils.seed_db import NEW_CUSTOMERS
+    from utils.snapshots import restore_snapshot
+    restore_snapshot(SeedSpec(customers=NEW_CUSTOMERS), TestConfig.TEST_DB)
     app = create_app(TestConfig)
-    with app.app_context():
-        from app.models import db
-        db.create_all()
-        seed(app)
 else:
     app = create_app(Config)
 
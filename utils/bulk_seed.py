@@ -0,0 +1,293 @@
+import argparse
+import csv
+import io
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import chain, repeat
+from multiprocessing import get_context
+from random import Random
+from sqlalchemy import create_engine, func, insert, select, text
+from app.models import (ApiUsage, Invoice, SupportTicket, Customer, CustomerHealthScore, LoginEvent, FeatureUsage, Sketch,
+                        FeatureName, ApiEndpoint, TicketStatus, InvoiceStatus)
+from app import lookups, sketches
+from utils.seed_db import DAYS_HISTORY, FEATURE_NAMES, SEGMENTS, API_ENDPOINTS
+
+# Average events per customer, split across event types like utils/seed_db.py maximums
+EVENT_MIX = {
+    "logins": 150,
+    "features": 200,
+    "tickets": 50,
+    "invoices": 50,
+    "api_calls": 200,
+}
+CHUNK_SIZE = 1000  # customers generated and written per transaction
+GENERATOR_VERSION = 3  # bump when generate_chunk() output changes, it invalidates cached snapshots
+TABLES = [Sketch, CustomerHealthScore, ApiUsage, FeatureUsage, Invoice, LoginEvent, SupportTicket, Customer,
+          FeatureName, ApiEndpoint, TicketStatus, InvoiceStatus]
+
+
+class SeedSpec:
+    # Describes a synthetic dataset. The same spec always generates the same rows:
+    # every chunk draws from its own Random seeded by (seed, chunk index) and all
+    # timestamps fall in the days_history days before anchor_date's midnight (UTC),
+    # anchor_date being the seeding day by default, so none is in the future.
+    def __init__(self, customers=1000, events_per_customer=sum(EVENT_MIX.values()) // 2,
+                 seed=0, days_history=DAYS_HISTORY, anchor_date=None, chunk_size=CHUNK_SIZE):
+        self.customers = customers
+        self.events_per_customer = events_per_customer
+        self.seed = seed
+        self.days_history = days_history
+        # Without an explicit anchor_date the dataset follows the calendar: same rows, moved by days
+        self.follows_today = anchor_date is None
+        self.anchor_date = anchor_date or datetime.now(timezone.utc).date().isoformat()
+        self.chunk_size = chunk_size
+
+    def as_dict(self):
+        return {
+            "customers": self.customers,
+            "events_per_customer": self.events_per_customer,
+            "seed": self.seed,
+            "days_history": self.days_history,
+            "anchor_date": self.anchor_date,
+            "chunk_size": self.chunk_size,
+        }
+
+    def chunks(self, first_id=1, shard_count=1):
+        # (chunk index, customer ids, shard) for every chunk. Chunks go round-robin to the shards,
+        # each taking the next ids from first_id that belong to its shard (id % shard_count)
+        next_ids = [first_id + (shard - first_id) % shard_count for shard in range(shard_count)]
+        for index, offset in enumerate(range(0, self.customers, self.chunk_size)):
+            count, shard = min(self.chunk_size, self.customers - offset), index % shard_count
+            ids = range(next_ids[shard], next_ids[shard] + count * shard_count, shard_count)
+            next_ids[shard] = ids.stop
+            yield index, ids, shard
+
+
+def generate_chunk(spec, chunk_index, ids):
+    # Builds every row of one chunk column by column, returns {table: [row dicts]}
+    rng = Random(f"{spec.seed}:{chunk_index}")
+    from faker import Faker
+    fake = Faker()
+    fake.seed_instance(spec.seed * 1_000_003 + chunk_index)
+
+    anchor = datetime.fromisoformat(spec.anchor_date)
+    span = spec.days_history * 86400
+    mix_total = sum(EVENT_MIX.values())
+
+    def per_customer(kind):
+        # Uniform 0..2*mean events of this kind per customer, as a flat customer_id column
+        mean = spec.events_per_customer * EVENT_MIX[kind] / mix_total
+        counts = [rng.randint(0, int(2 * mean)) for _ in ids]
+        return list(chain.from_iterable(repeat(cid, n) for cid, n in zip(ids, counts)))
+
+    def timestamps(n):
+        return [anchor - timedelta(seconds=s) for s in (rng.random() * span for _ in range(n))]
+
+    rows = {}
+    rows[Customer] = [
+        {"id": cid, "name": fake.company(), "segment": rng.choice(SEGMENTS)} for cid in ids
+    ]
+
+    customer_ids = per_customer("logins")
+    rows[LoginEvent] = [
+        {"customer_id": cid, "timestamp": ts} for cid, ts in zip(customer_ids, timestamps(len(customer_ids)))
+    ]
+
+    customer_ids = per_customer("features")
+    names = [rng.choice(FEATURE_NAMES) for _ in customer_ids]
+    rows[FeatureUsage] = [
+        {"customer_id": cid, "feature_name": name, "timestamp": ts}
+        for cid, name, ts in zip(customer_ids, names, timestamps(len(customer_ids)))
+    ]
+
+    customer_ids = per_customer("api_calls")
+    endpoints = [rng.choice(API_ENDPOINTS) for _ in customer_ids]
+    rows[ApiUsage] = [
+        {"customer_id": cid, "api_endpoint": endpoint, "timestamp": ts}
+        for cid, endpoint, ts in zip(customer_ids, endpoints, timestamps(len(customer_ids)))
+    ]
+
+    customer_ids = per_customer("tickets")
+    created = timestamps(len(customer_ids))
+    closed = [rng.random() < 0.5 for _ in customer_ids]
+    rows[SupportTicket] = [
+        {
+            "customer_id": cid,
+            "status": "closed" if is_closed else "open",
+            "created_at": ts,
+            "closed_at": ts + (anchor - ts) * rng.random() if is_closed else None,
+        }
+        for cid, ts, is_closed in zip(customer_ids, created, closed)
+    ]
+
+    customer_ids = per_customer("invoices")
+    issued = timestamps(len(customer_ids))
+    statuses = [rng.choice(["unpaid", "paid", "late"]) for _ in customer_ids]
+    invoices = []
+    for cid, ts, status in zip(customer_ids, issued, statuses):
+        due_date = ts + timedelta(seconds=rng.randint(0, 360000))  # due date within ~4 days
+        # Recent invoices can be due after the anchor, but not paid after it: one that would be
+        # paid late isn't paid yet
+        if status == "late" and due_date >= anchor:
+            status = "unpaid"
+        if status == "paid":
+            paid_date = min(due_date, anchor)
+        elif status == "late":
+            paid_date = min(due_date + (anchor - due_date) * rng.random(), anchor)
+        else:
+            paid_date = None
+        invoices.append({
+            "customer_id": cid,
+            "issued_at": ts,
+            "due_date": due_date,
+            "paid_date": paid_date,
+            "amount": round(rng.uniform(1, 1000), 2),
+            "status": status,
+        })
+    rows[Invoice] = invoices
+
+    # Daily distinct-count sketches of the chunk's features and endpoints (see app/sketches.py)
+    rows[Sketch] = sketches.rows_from_events(rows)
+
+    return rows
+
+
+def _copy_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return "\\x" + value.hex()  # bytea hex format
+    return value
+
+
+def _copy_rows(connection, model, rows):
+    # Postgres COPY ... FROM STDIN (csv) through the raw psycopg2 connection
+    columns = list(rows[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[c]) for c in columns])
+    buffer.seek(0)
+    cursor = connection.connection.driver_connection.cursor()
+    cursor.copy_expert(
+        f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+
+def write_chunk(engine, rows, use_copy=False):
+    pending = {}
+    with engine.begin() as connection:
+        # Customers first so event foreign keys resolve
+        for model in [Customer, LoginEvent, FeatureUsage, SupportTicket, Invoice, ApiUsage, Sketch]:
+            if not rows[model]:
+                continue
+            # Feature names, endpoints and statuses are stored as lookup table ids
+            encoded = lookups.encode(connection, model, rows[model], pending)
+            if use_copy:
+                _copy_rows(connection, model, encoded)
+            else:
+                connection.execute(insert(model.__table__), encoded)
+    lookups.publish(pending)
+    return sum(len(r) for r in rows.values())
+
+
+_worker_engines = {}
+
+def _seed_chunk(args):
+    # multiprocessing entry point; each worker process builds its own engine (per shard) once
+    url, spec, (index, ids), use_copy = args
+    if url not in _worker_engines:
+        _worker_engines[url] = create_engine(url, connect_args={"timeout": 60} if url.startswith("sqlite") else {})
+    return write_chunk(_worker_engines[url], generate_chunk(spec, index, ids), use_copy)
+
+
+def truncate(engine):
+    with engine.begin() as connection:
+        for model in TABLES:
+            connection.execute(model.__table__.delete())
+    lookups.forget(engine)
+
+
+def bulk_seed(engine, spec, workers=1, use_copy=None, truncate_first=False, progress=None):
+    # Seeds spec.customers new customers (ids continue after the current max id) and
+    # their events into the database behind `engine`, or into the shards behind a list of
+    # engines (DatabaseManager.shard_write_engines): every chunk is written to one shard, with
+    # ids of that shard. Returns the number of rows written.
+    engines = list(engine) if isinstance(engine, (list, tuple)) else [engine]
+    if use_copy is None:
+        use_copy = engines[0].dialect.name == "postgresql"
+    if truncate_first:
+        for shard_engine in engines:
+            truncate(shard_engine)
+
+    first_id = 1
+    for shard_engine in engines:
+        with shard_engine.connect() as connection:
+            first_id = max(first_id, (connection.execute(select(func.max(Customer.id))).scalar() or 0) + 1)
+
+    chunks = list(spec.chunks(first_id, len(engines)))
+    written = 0
+    if workers > 1:
+        urls = [shard_engine.url.render_as_string(hide_password=False) for shard_engine in engines]
+        tasks = [(urls[shard], spec, (index, ids), use_copy) for index, ids, shard in chunks]
+        with get_context("spawn").Pool(workers) as pool:
+            for done, rows in enumerate(pool.imap_unordered(_seed_chunk, tasks), 1):
+                written += rows
+                if progress:
+                    progress(done, len(chunks))
+    else:
+        for done, (index, ids, shard) in enumerate(chunks, 1):
+            written += write_chunk(engines[shard], generate_chunk(spec, index, ids), use_copy)
+            if progress:
+                progress(done, len(chunks))
+
+    for shard_engine in engines:
+        # Every chunk wrote its own all-customers sketches, merge them per day, then roll old days up
+        with shard_engine.begin() as connection:
+            sketches.compact(connection)
+            sketches.rollup(connection)
+
+        if shard_engine.dialect.name == "postgresql":
+            # Explicit ids were inserted, move the serial sequence past them
+            with shard_engine.begin() as connection:
+                connection.execute(text(
+                    "SELECT setval(pg_get_serial_sequence('customers', 'id'), (SELECT MAX(id) FROM customers))"
+                ))
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a large reproducible synthetic dataset")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--events-per-customer", type=int, default=SeedSpec().events_per_customer)
+    parser.add_argument("--seed", type=int, default=0, help="random seed, same seed => same dataset")
+    parser.add_argument("--days-history", type=int, default=DAYS_HISTORY)
+    parser.add_argument("--anchor-date", help="ISO date all timestamps are relative to (default: today)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (keep 1 for SQLite)")
+    parser.add_argument("--no-copy", action="store_true", help="use multi-row INSERT instead of COPY on Postgres")
+    parser.add_argument("--truncate", action="store_true", help="delete existing customers and events first")
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.config import Config, TestConfig
+    from app.models import db
+
+    app = create_app(TestConfig if os.getenv("FLASK_ENV") == "testing" else Config)
+    engines = app.db_manager.shard_write_engines
+    for engine in engines:
+        if engine.dialect.name == "sqlite":
+            db.metadata.create_all(bind=engine)
+
+    spec = SeedSpec(customers=args.customers, events_per_customer=args.events_per_customer, seed=args.seed,
+                    days_history=args.days_history, anchor_date=args.anchor_date, chunk_size=args.chunk_size)
+    started = time.perf_counter()
+    rows = bulk_seed(engines, spec, workers=args.workers, use_copy=False if args.no_copy else None,
+                     truncate_first=args.truncate,
+                     progress=lambda done, total: print(f"chunk {done}/{total}", flush=True))
+    elapsed = time.perf_counter() - started
+    print(f"Seeded {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s).")
+
+    from app.scoring import rescore
+    print(f"Rescored {rescore(app.db_manager)} customers.")
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from datetime import date
+from sqlalchemy import Date, DateTime, create_engine, func
+from sqlalchemy.schema import CreateIndex, CreateTable
+from app import sketches
+from app.config import TestConfig
+from app.models import db
+from utils.bulk_seed import GENERATOR_VERSION, bulk_seed
+
+SNAPSHOT_DIR = os.path.abspath(os.getenv("SNAPSHOT_DIR", ".snapshots"))
+
+
+def schema_fingerprint(metadata=db.metadata):
+    # Hash of the SQLite DDL of every table and index, so model changes invalidate snapshots
+    dialect = create_engine("sqlite://").dialect
+    ddl = []
+    for table in metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        ddl.extend(str(CreateIndex(index).compile(dialect=dialect)) for index in sorted(table.indexes, key=lambda i: i.name))
+    return hashlib.sha256("\n".join(ddl).encode()).hexdigest()
+
+
+def snapshot_path(spec, directory=SNAPSHOT_DIR):
+    # Specs following today (no explicit anchor_date) are keyed without their anchor: one file,
+    # moved to the current day by build_snapshot() instead of a new file every day
+    fields = {**spec.as_dict(), "anchor_date": None} if spec.follows_today else spec.as_dict()
+    key = hashlib.sha256(
+        f"{schema_fingerprint()}:{GENERATOR_VERSION}:{json.dumps(fields, sort_keys=True)}".encode()).hexdigest()
+    return os.path.join(directory, f"{spec.customers}-{spec.seed}-{key[:16]}.db")
+
+
+def build_snapshot(spec, directory=SNAPSHOT_DIR):
+    # Seeded SQLite file for `spec`, built on first use and reused afterwards. Stored health
+    # scores and segment aggregates are computed too, like after `flask rescore`. The file's
+    # anchor day is kept in its user_version: a file following today built on an earlier day
+    # is moved to today's anchor rather than rebuilt.
+    path = snapshot_path(spec, directory)
+    anchor = date.fromisoformat(spec.anchor_date).toordinal()
+    stored = anchor_of(path) if os.path.exists(path) else None
+    if stored == anchor or (stored is not None and not spec.follows_today):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    building = f"{path}.{os.getpid()}.tmp"
+    if stored:
+        shutil.copyfile(path, building)
+        shift_snapshot(building, anchor - stored)
+    else:
+        engine = create_engine(f"sqlite:///{building}")
+        try:
+            db.metadata.create_all(bind=engine)
+            bulk_seed(engine, spec)
+        finally:
+            engine.dispose()
+        rescore_snapshot(building)
+    connection = sqlite3.connect(building)
+    try:
+        connection.execute(f"PRAGMA user_version = {anchor}")
+    finally:
+        connection.close()
+    # Atomic rename: concurrent builders (e.g. xdist workers) never see a partial file
+    os.replace(building, path)
+    return path
+
+
+def anchor_of(path):
+    # Ordinal of the snapshot's anchor day, 0 when unknown
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def shift_snapshot(path, days):
+    # Moves every date and time of the snapshot by `days` days (stored scores stay valid: they
+    # move with the data), then rolls up the sketches of the days now past sketches.DAILY_DAYS
+    engine = create_engine(f"sqlite:///{path}")
+    modifier = f"{days:+d} days"
+    try:
+        with engine.begin() as connection:
+            for table in db.metadata.sorted_tables:
+                values = {}
+                for column in table.columns:
+                    if isinstance(column.type, DateTime):
+                        # Stored as "YYYY-MM-DD HH:MM:SS.ffffff": keep the microseconds
+                        values[column.name] = func.strftime("%Y-%m-%d %H:%M:%S", column, modifier) \
+                            .concat(func.substr(column, 20))
+                    elif isinstance(column.type, Date):
+                        values[column.name] = func.date(column, modifier)
+                if values:
+                    connection.execute(table.update().values(values))
+            sketches.rollup(connection)
+    finally:
+        engine.dispose()
+
+
+def rescore_snapshot(path):
+    from app import create_app
+    from app.scoring import rescore
+    app = create_app(snapshot_config(path))
+    try:
+        with app.app_context():
+            rescore(app.db_manager)
+    finally:
+        for shard in app.db_manager.shards:
+            shard.dispose()
+
+
+def restore_snapshot(spec, destination, directory=SNAPSHOT_DIR):
+    # Writable private copy of the snapshot at `destination`. WAL files left by a previous copy
+    # (single-node SQLite mode) would be replayed into the new one, so they go first.
+    for stale in (f"{destination}-wal", f"{destination}-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    shutil.copyfile(build_snapshot(spec, directory), destination)
+    return destination
+
+
+def snapshot_config(path, read_only=False, base=TestConfig, **overrides):
+    # Config class pointing the app at a snapshot file; read_only opens the shared cached
+    # file itself as an immutable, memory-mapped database instead of a copy
+    return type("SnapshotConfig", (base,), {
+        "TEST_DB": path,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "SQLITE_READ_ONLY": read_only,
+        **overrides,
+    })